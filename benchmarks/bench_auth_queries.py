@@ -0,0 +1,126 @@
+"""Time the per-call overhead of hot authorization and lookup queries.
+
+Compares building a new ORM ``Query`` per call, as dservercore did before,
+with executing the prebuilt statements of :mod:`dservercore.sql_statements`
+as done by :mod:`dservercore.utils` and :mod:`dservercore.utils_auth`.
+
+Usage::
+
+    python benchmarks/bench_auth_queries.py --calls 10000
+
+The benchmark runs on a temporary SQLite database unless ``--sql-uri``
+points to another database, e.g. ``postgresql://user@localhost/bench``.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from dservercore import sql_db
+from dservercore.sql_models import BaseURI, Dataset, User
+from dservercore.utils import _get_base_uri_obj, _get_dataset_obj, _get_user_obj
+from dservercore.utils_auth import has_admin_rights, may_search, user_exists
+
+
+BASE_URIS = ["s3://bucket-{}".format(i) for i in range(20)]
+URI = BASE_URIS[7] + "/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+
+
+def populate():
+    base_uris = [BaseURI(base_uri=base_uri) for base_uri in BASE_URIS]
+    user = User(username="grumpy", search_base_uris=base_uris,
+                register_base_uris=base_uris[:5])
+    sql_db.session.add_all(base_uris + [user])
+    sql_db.session.flush()
+    sql_db.session.add(Dataset(
+        base_uri_id=base_uris[7].id, uri=URI, uuid=URI.rsplit("/", 1)[1],
+        name="bad-apples", creator_username="queen",
+        frozen_at=sql_db.func.now(), created_at=sql_db.func.now()))
+    sql_db.session.commit()
+
+
+def query_user_exists(username):
+    return User.query.filter_by(username=username).first() is not None
+
+
+def query_has_admin_rights(username):
+    user = User.query.filter_by(username=username).first()
+    return user is not None and user.is_admin
+
+
+def query_may_search(username, base_uri):
+    user = User.query.filter_by(username=username).first()
+    base_uri = BaseURI.query.filter_by(base_uri=base_uri).first()
+    return base_uri in user.search_base_uris
+
+
+CASES = [
+    ("user by name",
+     lambda: User.query.filter_by(username="grumpy").first(),
+     lambda: _get_user_obj("grumpy")),
+    ("base URI by name",
+     lambda: BaseURI.query.filter_by(base_uri=BASE_URIS[7]).first(),
+     lambda: _get_base_uri_obj(BASE_URIS[7])),
+    ("dataset by URI",
+     lambda: Dataset.query.filter_by(uri=URI).first(),
+     lambda: _get_dataset_obj(URI)),
+    ("user exists",
+     lambda: query_user_exists("grumpy"),
+     lambda: user_exists("grumpy")),
+    ("has admin rights",
+     lambda: query_has_admin_rights("grumpy"),
+     lambda: has_admin_rights("grumpy")),
+    ("may search",
+     lambda: query_may_search("grumpy", BASE_URIS[7]),
+     lambda: may_search("grumpy", BASE_URIS[7])),
+]
+
+
+def per_call(func, calls, repeat):
+    """Return best time per call in microseconds, each call in a fresh
+    session as in a request."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+            sql_db.session.remove()
+        timings.append((time.perf_counter() - start) / calls * 1e6)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sql-uri")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = args.sql_uri or (
+            "sqlite:///" + os.path.join(tmp_dir, "auth.sqlite"))
+        sql_db.init_app(app)
+
+        with app.app_context():
+            sql_db.drop_all()
+            sql_db.create_all()
+            populate()
+
+            print("{:<18} {:>12} {:>12} {:>8}".format(
+                "query", "Query [us]", "stmt [us]", "speedup"))
+            for label, legacy, prebuilt in CASES:
+                assert legacy() == prebuilt()
+                before = per_call(legacy, args.calls, args.repeat)
+                after = per_call(prebuilt, args.calls, args.repeat)
+                print("{:<18} {:>12.1f} {:>12.1f} {:>7.2f}x".format(
+                    label, before, after, before / after))
+
+            sql_db.session.remove()
+            sql_db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare manifest validation via Nested(ManifestSchema) and ManifestField.
+
+Usage::
+
+    python benchmarks/bench_manifest_validation.py --items 10000 100000 1000000
+"""
+import argparse
+import time
+
+from marshmallow import Schema
+from marshmallow.fields import Nested
+
+from dservercore.schemas import ManifestField, ManifestSchema
+
+
+class NestedManifestSchema(Schema):
+    manifest = Nested(ManifestSchema)
+
+
+class FastManifestSchema(Schema):
+    manifest = ManifestField()
+
+
+def generate_manifest(number_of_items):
+    items = {}
+    for i in range(number_of_items):
+        items["{:040x}".format(i)] = {
+            "hash": "{:032x}".format(i),
+            "relpath": "data/file_{}.txt".format(i),
+            "size_in_bytes": i,
+            "utc_timestamp": 1716979579.898408 + i,
+        }
+    return {
+        "dtoolcore_version": "3.18.2",
+        "hash_function": "md5sum_hexdigest",
+        "items": items,
+    }
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nested_schema = NestedManifestSchema()
+    fast_schema = FastManifestSchema()
+
+    print("{:>10} {:>12} {:>12} {:>8}".format(
+        "items", "nested [s]", "fast [s]", "speedup"))
+    for number_of_items in args.items:
+        data = {"manifest": generate_manifest(number_of_items)}
+        assert nested_schema.load(data) == fast_schema.load(data)
+        nested = best_of(args.repeat, nested_schema.load, data)
+        fast = best_of(args.repeat, fast_schema.load, data)
+        print("{:>10} {:>12.4f} {:>12.4f} {:>7.1f}x".format(
+            number_of_items, nested, fast, nested / fast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Time deep pages of dataset listings sorted by indexed fields.
+
+Fills the ``dataset`` table with synthetic datasets spread over several base
+URIs and times :func:`dservercore.utils.list_datasets_by_user` for a user
+with search permissions on a single base URI, fetching pages of ten datasets
+at increasing depth. With the ``(base_uri_id, field, id)`` indexes of the
+``Dataset`` model the time per page grows with the page offset only, not
+with a full sort of the base URI's datasets. The query plan of the deepest
+page is printed for each sort order.
+
+Usage::
+
+    python benchmarks/bench_sorted_pages.py --datasets 100000 1000000
+
+The benchmark runs on a temporary SQLite database unless ``--sql-uri``
+points to another database, e.g. ``postgresql://user@localhost/bench``.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import uuid
+
+from flask import Flask
+from flask_smorest.pagination import PaginationParameters
+from sqlalchemy import event, insert
+
+from dservercore import sql_db
+from dservercore.sort import SortParameters
+from dservercore.sql_models import BaseURI, Dataset, User
+from dservercore.utils import list_datasets_by_user
+
+
+BASE_URIS = ["s3://bucket-{}".format(i) for i in range(10)]
+SORTS = ["+frozen_at", "-created_at", "-size_in_bytes", "+number_of_items",
+         "-uploaded_at"]
+PAGES = [1, 10, 100, 1000]
+
+
+def index_datasets(number_of_datasets):
+    base_uris = [BaseURI(base_uri=base_uri) for base_uri in BASE_URIS]
+    user = User(username="bench", search_base_uris=base_uris[:1])
+    sql_db.session.add_all(base_uris + [user])
+    sql_db.session.commit()
+
+    start = datetime.datetime(2024, 1, 1)
+    rows = []
+    for i in range(number_of_datasets):
+        base_uri = base_uris[i % len(base_uris)]
+        dataset_uuid = str(uuid.UUID(int=i))
+        rows.append({
+            "base_uri_id": base_uri.id,
+            "uri": "{}/{}".format(base_uri.base_uri, dataset_uuid),
+            "uuid": dataset_uuid,
+            "name": "dataset-{}".format(i),
+            "creator_username": "user-{}".format(i % 50),
+            # Scramble the order of the values relative to the ids.
+            "frozen_at": start + datetime.timedelta(
+                seconds=(i * 7919) % number_of_datasets),
+            "created_at": start + datetime.timedelta(seconds=i),
+            "number_of_items": (i * 31) % 1000,
+            "size_in_bytes": (i * 104729) % (1 << 40),
+            "uploaded_by": "bench",
+            "uploaded_at": start + datetime.timedelta(seconds=i // 3),
+        })
+        if len(rows) == 10000:
+            sql_db.session.execute(insert(Dataset), rows)
+            rows = []
+    if rows:
+        sql_db.session.execute(insert(Dataset), rows)
+    sql_db.session.commit()
+
+
+class StatementRecorder:
+    """Remember the last sorted SELECT statement sent to the database."""
+
+    def __init__(self, engine):
+        self.statement = None
+        self.parameters = None
+        event.listen(engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context,
+               executemany):
+        if "ORDER BY" in statement:
+            self.statement, self.parameters = statement, parameters
+
+
+def query_plan(statement, parameters):
+    explain = "EXPLAIN "
+    if sql_db.engine.dialect.name == "sqlite":
+        explain = "EXPLAIN QUERY PLAN "
+    connection = sql_db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(explain + statement, parameters)
+        return [str(row[-1]) for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def best_of(repeat, sort, page):
+    timings = []
+    for _ in range(repeat):
+        pagination_parameters = PaginationParameters(page=page, page_size=10)
+        start = time.perf_counter()
+        list_datasets_by_user("bench",
+                              pagination_parameters=pagination_parameters,
+                              sort_parameters=SortParameters([sort]))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--datasets", type=int, nargs="+",
+                        default=[100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sql-uri")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = args.sql_uri or (
+            "sqlite:///" + os.path.join(tmp_dir, "sorted_pages.sqlite"))
+        sql_db.init_app(app)
+
+        with app.app_context():
+            recorder = StatementRecorder(sql_db.engine)
+            print("{:>10} {:<18} {}".format(
+                "datasets", "sort", " ".join(
+                    "{:>11}".format("page {} [s]".format(page))
+                    for page in PAGES)))
+            for number_of_datasets in args.datasets:
+                sql_db.drop_all()
+                sql_db.create_all()
+                index_datasets(number_of_datasets)
+
+                plans = {}
+                for sort in SORTS:
+                    timings = [best_of(args.repeat, sort, page)
+                               for page in PAGES]
+                    plans[sort] = query_plan(
+                        recorder.statement, recorder.parameters)
+                    print("{:>10} {:<18} {}".format(
+                        number_of_datasets, sort, " ".join(
+                            "{:>11.4f}".format(timing)
+                            for timing in timings)))
+
+                for sort, plan in plans.items():
+                    print("\nQuery plan, sorted by {}:".format(sort))
+                    for line in plan:
+                        print("    " + line)
+
+            sql_db.session.remove()
+            sql_db.drop_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Compare the built-in SQL and in-memory search plugins with Mongo search.
+
+Indexes synthetic datasets and times typical search queries, each returning
+the first page of ten hits including the total hit count.
+
+Usage::
+
+    python benchmarks/bench_sql_search.py --datasets 10000 100000 1000000
+
+The SQL search runs on a temporary SQLite database unless ``--sql-uri``
+points to another database, e.g. ``postgresql://user@localhost/bench``.
+The Mongo search plugin is benchmarked as well if ``--mongo-uri`` is given.
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import time
+import types
+import uuid
+
+from flask import Flask
+from flask_smorest.pagination import PaginationParameters
+from sqlalchemy import insert
+
+from dservercore import sql_db
+from dservercore.memory_search import MemoryIndex, MemorySearch
+from dservercore.sort import SortParameters
+from dservercore.sql_search import (
+    SQLSearch,
+    SearchDataset,
+    SearchDatasetTag,
+    _fulltext,
+)
+
+
+BASE_URIS = ["s3://bucket-{}".format(i) for i in range(10)]
+CREATORS = ["user-{}".format(i) for i in range(50)]
+TAGS = ["tag-{}".format(i) for i in range(100)]
+WORDS = ["apple", "banana", "cherry", "damson", "elderberry", "fig",
+         "grape", "huckleberry", "kiwi", "lemon", "mango", "nectarine"]
+
+QUERIES = [
+    ("all, sorted by name", {}, ["+name"]),
+    ("common word", {"free_text": "apple"}, ["+uri"]),
+    ("rare word", {"free_text": "sample-42"}, ["+uri"]),
+    ("two tags", {"tags": ["tag-1", "tag-2"]}, ["+uri"]),
+    ("creator and base URI", {"creator_usernames": ["user-7"],
+                              "base_uris": ["s3://bucket-3"]}, ["-frozen_at"]),
+]
+
+
+def generate_datasets(number_of_datasets):
+    frozen_at = datetime.datetime(2024, 1, 1)
+    for i in range(number_of_datasets):
+        dataset_uuid = str(uuid.UUID(int=i))
+        base_uri = BASE_URIS[i % len(BASE_URIS)]
+        yield {
+            "uri": "{}/{}".format(base_uri, dataset_uuid),
+            "base_uri": base_uri,
+            "uuid": dataset_uuid,
+            "name": "dataset-{}".format(i),
+            "creator_username": CREATORS[i % len(CREATORS)],
+            "frozen_at": frozen_at + datetime.timedelta(seconds=i),
+            "created_at": frozen_at + datetime.timedelta(seconds=i),
+            "number_of_items": i % 1000,
+            "size_in_bytes": i * 1024,
+            "readme": "---\ndescription: {} {} from sample-{}".format(
+                WORDS[i % len(WORDS)], WORDS[i % 7], i),
+            "annotations": {"project": "project-{}".format(i % 20)},
+            "tags": sorted({TAGS[i % 100], TAGS[i % 37], TAGS[i % 11]}),
+        }
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def index_sql(number_of_datasets):
+    offset = 0
+    for chunk in _chunks(generate_datasets(number_of_datasets), 10000):
+        rows, tag_rows = [], []
+        for i, dataset in enumerate(chunk, start=offset + 1):
+            entry = SearchDataset(id=i, **dataset)
+            row = dict(dataset, id=i, fulltext=_fulltext(entry))
+            rows.append(row)
+            tag_rows.extend(
+                {"dataset_id": i, "tag": tag} for tag in dataset["tags"])
+        sql_db.session.execute(insert(SearchDataset), rows)
+        sql_db.session.execute(insert(SearchDatasetTag), tag_rows)
+        sql_db.session.commit()
+        offset += len(chunk)
+
+
+def index_memory(search, number_of_datasets):
+    search._index = MemoryIndex()
+    for dataset in generate_datasets(number_of_datasets):
+        readme = dataset.pop("readme")
+        annotations = dataset.pop("annotations")
+        entry = dict(dataset, uploaded_by=None, uploaded_at=None)
+        search._index.add(entry, readme, annotations)
+    search._synced_at = float("inf")
+
+
+def index_mongo(search, number_of_datasets):
+    for chunk in _chunks(generate_datasets(number_of_datasets), 10000):
+        search.collection.insert_many(chunk)
+
+
+def best_of(repeat, search, query, sort):
+    query = dict(query)
+    query.setdefault("base_uris", BASE_URIS)
+    timings = []
+    for _ in range(repeat):
+        pagination_parameters = PaginationParameters(page=1, page_size=10)
+        start = time.perf_counter()
+        search.search(dict(query),
+                      pagination_parameters=pagination_parameters,
+                      sort_parameters=SortParameters(sort))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def create_mongo_search(mongo_uri):
+    from dserver_search_plugin_mongo.utils_search import MongoSearch
+    search = MongoSearch()
+    search.init_app(types.SimpleNamespace(config={
+        "SEARCH_MONGO_URI": mongo_uri,
+        "SEARCH_MONGO_DB": "dserver_search_benchmark",
+        "SEARCH_MONGO_COLLECTION": "datasets",
+    }))
+    return search
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--datasets", type=int, nargs="+",
+                        default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sql-uri")
+    parser.add_argument("--mongo-uri")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = args.sql_uri or (
+            "sqlite:///" + os.path.join(tmp_dir, "search.sqlite"))
+        sql_db.init_app(app)
+
+        with app.app_context():
+            sql_search = SQLSearch()
+            sql_search.init_app(app)
+            memory_search = MemorySearch()
+            memory_search.init_app(app)
+            mongo_search = None
+            if args.mongo_uri is not None:
+                mongo_search = create_mongo_search(args.mongo_uri)
+
+            print("{:>10} {:<22} {:>10} {:>10} {:>10}".format(
+                "datasets", "query", "sql [s]", "memory [s]", "mongo [s]"))
+            for number_of_datasets in args.datasets:
+                sql_db.drop_all()
+                sql_db.create_all()
+                index_sql(number_of_datasets)
+                print("SQL search uses {}".format(
+                    sql_search._fulltext_backend()))
+                index_memory(memory_search, number_of_datasets)
+
+                if mongo_search is not None:
+                    mongo_search.collection.delete_many({})
+                    index_mongo(mongo_search, number_of_datasets)
+
+                for label, query, sort in QUERIES:
+                    sql = best_of(args.repeat, sql_search, query, sort)
+                    memory = best_of(args.repeat, memory_search, query, sort)
+                    mongo = float("nan")
+                    if mongo_search is not None:
+                        mongo = best_of(args.repeat, mongo_search, query, sort)
+                    print("{:>10} {:<22} {:>10.4f} {:>10.6f} {:>10.4f}".format(
+                        number_of_datasets, label, sql, memory, mongo))
+
+            sql_db.drop_all()
+            if mongo_search is not None:
+                mongo_search.client.drop_database("dserver_search_benchmark")
+
+
+if __name__ == "__main__":
+    main()
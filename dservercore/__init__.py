@@ -1,10 +1,11 @@
 """dserver Flask app"""
+import importlib
 import logging
 import sys
 
 from abc import ABC, abstractmethod
 
-from flask import Flask, request
+from flask import Flask, current_app, request
 from flask_cors import CORS
 from flask_smorest import Api
 from flask_smorest import Blueprint as FlaskSmorestBlueprint
@@ -13,7 +14,9 @@ from flask_migrate import Migrate
 
 from dservercore.blueprint import Blueprint
 from dservercore.config import Config
-from dservercore.extensions import sql_db, jwt, ma
+from dservercore.extensions import sql_db, jwt, ma, compression
+from dservercore.read_replica import READ_REPLICA_BIND_KEY
+from dservercore.sql_engine import engine_options, init_engine
 from dservercore.schemas import SearchDatasetSchema, RegisterDatasetSchema
 from dservercore.sort import SortParameters
 from dservercore.sql_models import DatasetSchema
@@ -74,6 +77,50 @@ class UnknownURIError(KeyError):
     pass
 
 
+def _tags_added(tags, added_tags):
+    return list(tags) + [
+        tag for tag in dict.fromkeys(added_tags) if tag not in tags]
+
+
+def _tags_removed(tags, removed_tags):
+    return [tag for tag in tags if tag not in removed_tags]
+
+
+def _annotation_set(annotations, name, value):
+    annotations = dict(annotations)
+    annotations[name] = value
+    return annotations
+
+
+def _annotation_deleted(annotations, name):
+    annotations = dict(annotations)
+    annotations.pop(name, None)
+    return annotations
+
+
+def _update_tags_one_by_one(plugin, uris, add_tags, remove_tags):
+    for uri in uris:
+        try:
+            if add_tags:
+                plugin.add_tags(uri, add_tags)
+            if remove_tags:
+                plugin.remove_tags(uri, remove_tags)
+        except UnknownURIError:
+            logger.warning(f"{type(plugin).__name__} does not know {uri}")
+
+
+def _update_annotations_one_by_one(plugin, uris, set_annotations,
+                                   delete_annotations):
+    for uri in uris:
+        try:
+            for name, value in set_annotations.items():
+                plugin.set_annotation(uri, name, value)
+            for name in delete_annotations:
+                plugin.delete_annotation(uri, name)
+        except UnknownURIError:
+            logger.warning(f"{type(plugin).__name__} does not know {uri}")
+
+
 class PluginABC(ABC):
     """Common base class for all plugins.
 
@@ -116,7 +163,22 @@ class PluginABC(ABC):
 
 
 class SearchABC(PluginABC):
-    """Any search plugin must inherit from this base class."""
+    """Any search plugin must inherit from this base class.
+
+    A search plugin MAY implement ``facets(query, fields)`` returning, per
+    requested field out of "base_uri", "creator_username", "tags" and
+    "uploaded_by", a dictionary mapping values to the number of datasets
+    matching the query. It is not called for queries comprising criteria
+    the core applies in SQL, see utils.plan_search_query. Otherwise, and
+    without such a method, the core computes facets itself.
+
+    A search plugin MAY apply any of the optional query keys "uploaded_by"
+    and the range bounds in schemas.RANGE_QUERY_KEYS and SHOULD then list
+    them in ``optional_query_keys``. These keys are forwarded to the plugin,
+    the others are applied in SQL to the plugin's hits.
+    """
+
+    optional_query_keys = frozenset()
 
     @abstractmethod
     def search(self, query : SearchDatasetSchema,
@@ -154,11 +216,65 @@ class SearchABC(PluginABC):
         "base_uris" and "creator_usernames" lists, but use "AND" logic for
         filtering the search based on the items in the tags list.
 
+        Inclusive bounds "<field>_min" and "<field>_max" on the dates
+        "created_at", "frozen_at" and "uploaded_at" and on "number_of_items"
+        and "size_in_bytes", see schemas.RANGE_QUERY_KEYS, as well as
+        "uploaded_by" are only sent to the plugin if listed in
+        ``optional_query_keys``. Otherwise, they are applied in SQL, see
+        utils.plan_search_query.
+
         If pagination and sorting parameters are supplied, the plugin SHOULD
         provide the desired subset of datasets.
         """
         pass
 
+    # Metadata updates. A plugin SHOULD implement set_tags and
+    # set_annotations if it indexes tags and annotations. The single tag and
+    # annotation updates default to reading the dataset's current tags or
+    # annotations from the retrieve plugin, applying the change and writing
+    # them back via set_tags or set_annotations. A plugin SHOULD override
+    # them if it can apply the change alone, and the batched updates of many
+    # datasets if it can apply them at once.
+
+    def set_tags(self, uri, tags):
+        """Replace the tags of a dataset."""
+        logger.warning("Search plugin has no method 'set_tags'")
+
+    def set_annotations(self, uri, annotations):
+        """Replace the annotations of a dataset."""
+        logger.warning("Search plugin has no method 'set_annotations'")
+
+    def add_tags(self, uri, tags):
+        """Add tags to a dataset, keeping existing ones."""
+        self.set_tags(
+            uri, _tags_added(current_app.retrieve.get_tags(uri), tags))
+
+    def remove_tags(self, uri, tags):
+        """Remove tags from a dataset, keeping all others."""
+        self.set_tags(
+            uri, _tags_removed(current_app.retrieve.get_tags(uri), tags))
+
+    def set_annotation(self, uri, name, value):
+        """Set a single annotation of a dataset."""
+        self.set_annotations(uri, _annotation_set(
+            current_app.retrieve.get_annotations(uri), name, value))
+
+    def delete_annotation(self, uri, name):
+        """Delete a single annotation of a dataset."""
+        self.set_annotations(uri, _annotation_deleted(
+            current_app.retrieve.get_annotations(uri), name))
+
+    def update_tags_by_uris(self, uris, add_tags, remove_tags):
+        """Add and remove tags of many datasets, one by one by default."""
+        _update_tags_one_by_one(self, uris, add_tags, remove_tags)
+
+    def update_annotations_by_uris(self, uris, set_annotations,
+                                   delete_annotations):
+        """Set and delete annotations of many datasets, one by one by
+        default."""
+        _update_annotations_one_by_one(
+            self, uris, set_annotations, delete_annotations)
+
 
 class RetrieveABC(ABC):
     """Any retrieve plugin must inherit from this base class."""
@@ -199,6 +315,121 @@ class RetrieveABC(ABC):
         """
         pass
 
+    def get_manifest_summary(self, uri):
+        """Return summary of the dataset manifest.
+
+        The summary comprises the manifest's ``hash_function`` and
+        ``dtoolcore_version`` as well as the ``number_of_items`` and their
+        total ``size_in_bytes``. A plugin SHOULD override this method if it
+        can provide the summary without loading the full manifest.
+
+        It is assumed that preflight checks have been made to ensure that the
+        user has permissions to access the URI.
+        """
+        manifest = self.get_manifest(uri)
+        items = manifest.get("items", {})
+        return {
+            "hash_function": manifest.get("hash_function"),
+            "dtoolcore_version": manifest.get("dtoolcore_version"),
+            "number_of_items": len(items),
+            "size_in_bytes": sum(
+                item.get("size_in_bytes", 0) for item in items.values()),
+        }
+
+    def get_manifest_items(self, uri, offset=0, limit=None):
+        """Return range of the dataset manifest's items.
+
+        Returns a dictionary of at most ``limit`` items, starting at item
+        ``offset`` in the order of the manifest. A plugin SHOULD override
+        this method if it can provide the range without loading the full
+        manifest.
+
+        It is assumed that preflight checks have been made to ensure that the
+        user has permissions to access the URI.
+        """
+        items = list(self.get_manifest(uri).get("items", {}).items())
+        end = None if limit is None else offset + limit
+        return dict(items[offset:end])
+
+    # Batched retrieval. A plugin SHOULD override these methods if it can
+    # serve many datasets at once more efficiently than one by one. Each
+    # returns a dictionary mapping URIs to the requested content and omits
+    # URIs unknown to the plugin. It is assumed that preflight checks have
+    # been made to ensure that the user has permissions to access the URIs.
+
+    def _get_by_uris(self, getter, uris):
+        content = {}
+        for uri in uris:
+            try:
+                content[uri] = getter(uri)
+            except UnknownURIError:
+                continue
+        return content
+
+    def get_readmes_by_uris(self, uris):
+        """Return dictionary of dataset readmes by URI."""
+        return self._get_by_uris(self.get_readme, uris)
+
+    def get_annotations_by_uris(self, uris):
+        """Return dictionary of dataset annotations by URI."""
+        return self._get_by_uris(self.get_annotations, uris)
+
+    def get_tags_by_uris(self, uris):
+        """Return dictionary of dataset tags by URI."""
+        return self._get_by_uris(self.get_tags, uris)
+
+    # Metadata updates. A plugin SHOULD implement set_tags and
+    # set_annotations if it stores tags and annotations. The single tag and
+    # annotation updates default to reading the dataset's current tags or
+    # annotations via get_tags or get_annotations, applying the change and
+    # writing them back via set_tags or set_annotations. A plugin SHOULD
+    # override them if it can apply the change alone, and the batched updates
+    # of many datasets if it can apply them at once. The single updates
+    # return the updated tags or annotations.
+
+    def set_tags(self, uri, tags):
+        """Replace the tags of a dataset."""
+        logger.warning("Retrieve plugin has no method 'set_tags'")
+
+    def set_annotations(self, uri, annotations):
+        """Replace the annotations of a dataset."""
+        logger.warning("Retrieve plugin has no method 'set_annotations'")
+
+    def add_tags(self, uri, tags):
+        """Add tags to a dataset, keeping existing ones."""
+        tags = _tags_added(self.get_tags(uri), tags)
+        self.set_tags(uri, tags)
+        return tags
+
+    def remove_tags(self, uri, tags):
+        """Remove tags from a dataset, keeping all others."""
+        tags = _tags_removed(self.get_tags(uri), tags)
+        self.set_tags(uri, tags)
+        return tags
+
+    def set_annotation(self, uri, name, value):
+        """Set a single annotation of a dataset."""
+        annotations = _annotation_set(self.get_annotations(uri), name, value)
+        self.set_annotations(uri, annotations)
+        return annotations
+
+    def delete_annotation(self, uri, name):
+        """Delete a single annotation of a dataset."""
+        annotations = _annotation_deleted(self.get_annotations(uri), name)
+        self.set_annotations(uri, annotations)
+        return annotations
+
+    def update_tags_by_uris(self, uris, add_tags, remove_tags):
+        """Add and remove tags of many datasets, one by one by default."""
+        _update_tags_one_by_one(self, uris, add_tags, remove_tags)
+
+    def update_annotations_by_uris(self, uris, set_annotations,
+                                   delete_annotations):
+        """Set and delete annotations of many datasets, one by one by
+        default."""
+        _update_annotations_one_by_one(
+            self, uris, set_annotations, delete_annotations)
+
 
 class ExtensionABC(ABC):
     """Any extension plugin must inherit from this base class.
@@ -233,6 +464,22 @@ class ExtensionABC(ABC):
         pass
 
 
+# Search plugins shipped with dservercore, used if no other is installed.
+BUILTIN_SEARCH_PLUGINS = {
+    "sql": "dservercore.sql_search:SQLSearch",
+    "memory": "dservercore.memory_search:MemorySearch",
+}
+
+
+def _builtin_search_plugin(name):
+    try:
+        module_name, class_name = BUILTIN_SEARCH_PLUGINS[name].split(":")
+    except KeyError:
+        raise (RuntimeError("Unknown built-in search plugin '{}'".format(name)))
+    logger.info("No search plugin installed, using built-in %s search", name)
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
 def create_app(test_config=None):
     app = Flask(__name__)
 
@@ -242,11 +489,13 @@ def create_app(test_config=None):
     for entrypoint in search_entrypoints_iterator:
         logger.info("Discovered search plugin entrypoint %s", entrypoint)
         search_entrypoints.append(entrypoint.load())
-    if len(search_entrypoints) < 1:
-        raise (RuntimeError("Please install a search plugin"))
-    elif len(search_entrypoints) > 1:
+    if len(search_entrypoints) > 1:
         raise (RuntimeError("Too many search plugins; there can be only one"))
-    app.search = search_entrypoints[0]()
+    # Without any search plugin installed, one of the built-in plugins is
+    # picked below according to the config.
+    app.search = None
+    if len(search_entrypoints) == 1:
+        app.search = search_entrypoints[0]()
 
     # Load the retrieve plugin.
     retrieve_entrypoints = []
@@ -254,7 +503,9 @@ def create_app(test_config=None):
         logger.info("Discovered retrieve plugin entrypoint %s", entrypoint)
         retrieve_entrypoints.append(entrypoint.load())
     if len(retrieve_entrypoints) < 1:
-        raise (RuntimeError("Please install a retrieve plugin"))
+        from dservercore.sql_retrieve import SQLRetrieve
+        logger.info("No retrieve plugin installed, using built-in SQL retrieve")
+        retrieve_entrypoints.append(SQLRetrieve)
     elif len(retrieve_entrypoints) > 1:
         raise (RuntimeError("Too many retrieve plugins; there can be only one"))
     app.retrieve = retrieve_entrypoints[0]()
@@ -268,7 +519,9 @@ def create_app(test_config=None):
 
     # For certain aspects below, search plugin, retrieve plugin, and other extension
     # plugins can be treated on the same level
-    app.plugins = [app.search, app.retrieve, *app.custom_extensions]
+    app.plugins = [plugin for plugin in
+                   [app.search, app.retrieve, *app.custom_extensions]
+                   if plugin is not None]
 
     if test_config is None:
         # load the instance config, if it exists, when not testing
@@ -285,6 +538,11 @@ def create_app(test_config=None):
         # load the test config if passed in
         app.config.from_mapping(test_config)
 
+    if app.search is None:
+        app.search = _builtin_search_plugin(
+            app.config.get("BUILTIN_SEARCH_PLUGIN", "sql"))
+        app.plugins.insert(0, app.search)
+
     CORS(app)
 
     for plugin in app.plugins:
@@ -293,10 +551,50 @@ def create_app(test_config=None):
     app.retrieve.init_app(app)
     app.search.init_app(app)
 
+    replica_uri = app.config.get("SQLALCHEMY_READ_REPLICA_URI")
+    if replica_uri:
+        app.config["SQLALCHEMY_BINDS"] = dict(
+            app.config.get("SQLALCHEMY_BINDS") or {})
+        app.config["SQLALCHEMY_BINDS"].setdefault(
+            READ_REPLICA_BIND_KEY, replica_uri)
+
+    # Pool options from config, explicit engine options take precedence.
+    if app.config.get("SQLALCHEMY_DATABASE_URI"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(
+            engine_options(app.config, app.config["SQLALCHEMY_DATABASE_URI"]),
+            **(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}))
+    binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+    for key, bind in binds.items():
+        if isinstance(bind, dict):
+            binds[key] = dict(engine_options(app.config, bind["url"]), **bind)
+        else:
+            binds[key] = dict(engine_options(app.config, bind), url=bind)
+    if binds:
+        app.config["SQLALCHEMY_BINDS"] = binds
+
     sql_db.init_app(app)
+    from dservercore.sql_search import SQLSearch
+    with app.app_context():
+        for engine in sql_db.engines.values():
+            init_engine(engine, app.config)
+        # Tables created by migrations lack the built-in search plugin's
+        # full-text index.
+        if isinstance(app.search, SQLSearch):
+            app.search.init_db()
     Migrate(app, sql_db)
     ma.init_app(app)
     jwt.init_app(app)
+    compression.init_app(app)
+
+    from dservercore.storage_writes import StorageWriteQueue
+    from dservercore.utils import apply_storage_write
+    app.storage_writes = StorageWriteQueue(app, apply_storage_write)
+
+    from dservercore.search_cache import SearchResultCache
+    app.search_cache = SearchResultCache()
+
+    from dservercore.events import EventHub
+    app.events = EventHub(app)
 
     api = Api(app)
 
@@ -311,6 +609,9 @@ def create_app(test_config=None):
         readme_routes,
         annotations_routes,
         tags_routes,
+        storage_write_routes,
+        change_routes,
+        event_routes,
     )
 
     api.register_blueprint(config_routes.bp)
@@ -323,6 +624,9 @@ def create_app(test_config=None):
     api.register_blueprint(readme_routes.bp)
     api.register_blueprint(annotations_routes.bp)
     api.register_blueprint(tags_routes.bp)
+    api.register_blueprint(storage_write_routes.bp)
+    api.register_blueprint(change_routes.bp)
+    api.register_blueprint(event_routes.bp)
 
     # Load dserver extension plugin blueprints.
     for ex in app.custom_extensions:
@@ -10,13 +10,22 @@ from dservercore.utils_auth import (
     get_jwt_identity,
 )
 
-from dservercore import UnknownURIError, AuthorizationError
+from dservercore import UnknownURIError, AuthorizationError, ValidationError
 from dservercore.blueprint import Blueprint
-from dservercore.schemas import AnnotationSchema, SingleAnnotationSchema
+from dservercore.schemas import (
+    AnnotationSchema,
+    AnnotationsByURISchema,
+    BulkAnnotationsSchema,
+    BulkUpdateResultSchema,
+    SingleAnnotationSchema,
+    URIListSchema,
+)
 import dservercore.utils_auth
 from dservercore.utils import (
     url_suffix_to_uri,
+    bulk_update_annotations_by_user,
     get_annotations_from_uri_by_user,
+    get_annotations_from_uris_by_user,
     set_annotations_for_uri_by_user,
     set_annotation_for_uri_by_user,
     delete_annotation_for_uri_by_user
@@ -25,6 +34,62 @@ from dservercore.utils import (
 bp = Blueprint("annotations", __name__, url_prefix="/annotations")
 
 
+@bp.route("/batch", methods=["POST"])
+@bp.arguments(URIListSchema)
+@bp.response(200, AnnotationsByURISchema)
+@bp.alt_response(400, description="Too many URIs")
+@bp.alt_response(401, description="Unauthorized")
+@jwt_required()
+def annotations_batch(data):
+    """Request the annotations of many datasets at once.
+
+    URIs the user has no permissions on or that are unknown are omitted.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        abort(401)
+
+    if len(data["uris"]) > current_app.config.get("MAX_BATCH_SIZE", 1000):
+        abort(400, "Too many URIs in batch request.")
+
+    uris = [url_suffix_to_uri(uri) for uri in data["uris"]]
+    annotations = get_annotations_from_uris_by_user(username, uris)
+
+    return {"annotations": annotations}
+
+
+@bp.route("/bulk", methods=["POST"])
+@bp.arguments(BulkAnnotationsSchema)
+@bp.response(200, BulkUpdateResultSchema)
+@bp.alt_response(400, description="Too many URIs or datasets")
+@bp.alt_response(401, description="Unauthorized")
+@jwt_required()
+def annotations_bulk(data):
+    """Set and delete annotations of many datasets at once.
+
+    Datasets are selected either by a list of ``uris`` or by a search
+    ``query``. Datasets in base URIs the user has got no register
+    permissions on are reported as ``forbidden`` and left untouched.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        abort(401)
+
+    uris = None
+    if "uris" in data:
+        if len(data["uris"]) > current_app.config.get("MAX_BATCH_SIZE", 1000):
+            abort(400, "Too many URIs in bulk request.")
+        uris = [url_suffix_to_uri(uri) for uri in data["uris"]]
+
+    try:
+        return bulk_update_annotations_by_user(
+            username, set_annotations=data["set"],
+            delete_annotations=data["delete"], uris=uris,
+            query=data.get("query"))
+    except ValidationError as message:
+        abort(400, str(message))
+
+
 @bp.route("/<path:uri>", methods=["GET"])
 @bp.response(200, AnnotationSchema)
 @bp.alt_response(401, description="Unauthorized")
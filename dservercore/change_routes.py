@@ -0,0 +1,36 @@
+"""Routes for synchronizing incrementally with the change log"""
+from flask import abort
+from dservercore.utils_auth import (
+    jwt_required,
+    get_jwt_identity,
+)
+
+import dservercore.utils_auth
+
+from dservercore.blueprint import Blueprint
+from dservercore.schemas import ChangesQuerySchema
+from dservercore.sql_models import ChangeSchema
+from dservercore.utils import list_changes_by_user
+
+
+bp = Blueprint("changes", __name__, url_prefix="/changes")
+
+
+@bp.route("", methods=["GET"])
+@bp.arguments(ChangesQuerySchema, location="query")
+@bp.response(200, ChangeSchema(many=True))
+@bp.alt_response(401, description="Not registered")
+@jwt_required()
+def changes_get(query: ChangesQuerySchema):
+    """List changes to datasets the user has access to after ``since``.
+
+    Changes are ordered by their sequence number ``seq``. To continue,
+    request the changes since the ``seq`` of the last change received.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        # Unregistered users should see 401.
+        abort(401)
+
+    return list_changes_by_user(
+        username, since=query["since"], limit=query["limit"])
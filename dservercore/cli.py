@@ -9,6 +9,7 @@ import dtoolcore.utils
 from flask import Flask, current_app
 from flask.cli import AppGroup
 from flask_jwt_extended import create_access_token
+from marshmallow import ValidationError as SchemaValidationError
 
 from dtoolcore import iter_datasets_in_base_uri, DataSet
 import dservercore
@@ -28,6 +29,7 @@ from dservercore.utils import (
     versions_to_dict
 )
 from dservercore.config import CONFIG_EXCLUSIONS
+from dservercore.schemas import load_manifest
 
 app = Flask(__name__)
 
@@ -204,8 +206,9 @@ def index_base_uri(base_uri):
             continue
 
         try:
+            dataset_info["manifest"] = load_manifest(dataset_info["manifest"])
             r = register_dataset(dataset_info)
-        except dservercore.ValidationError as message:
+        except (dservercore.ValidationError, SchemaValidationError) as message:
             click.secho(
                 "Failed to register: {} {}".format(dataset.name, dataset.uri), fg="red"
             )
@@ -0,0 +1,322 @@
+"""Negotiated compression of response and request bodies
+
+Large JSON payloads like manifests or long pages of ``/uris`` listings
+compress very well. The :class:`Compression` extension hooks into the
+Flask app and compresses responses according to the client's
+``Accept-Encoding`` header. ``gzip`` is always available, ``zstd`` and
+``br`` are offered if the optional ``zstandard`` and ``brotli`` packages
+are installed.
+
+In the other direction, request bodies sent with ``Content-Encoding: gzip``
+or ``zstd``, e.g. dataset registrations carrying large manifests, are
+decompressed before any route parses them.
+"""
+import gzip
+import hashlib
+import io
+import logging
+import threading
+import zlib
+
+from collections import OrderedDict
+
+from flask import abort, current_app, request
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Encodings in order of server preference, used to break ties between
+# encodings the client accepts with equal quality.
+ENCODING_PREFERENCE = ("zstd", "br", "gzip")
+
+
+def available_encodings():
+    """Return list of content encodings supported by this installation."""
+    encodings = []
+    for encoding in ENCODING_PREFERENCE:
+        if encoding == "zstd" and zstandard is None:
+            continue
+        if encoding == "br" and brotli is None:
+            continue
+        encodings.append(encoding)
+    return encodings
+
+
+def available_request_encodings():
+    """Return list of content encodings accepted on request bodies."""
+    encodings = ["gzip"]
+    if zstandard is not None:
+        encodings.append("zstd")
+    return encodings
+
+
+def _level(config, encoding):
+    if encoding == "zstd":
+        return config.get("COMPRESSION_ZSTD_LEVEL", 3)
+    elif encoding == "br":
+        return config.get("COMPRESSION_BROTLI_LEVEL", 4)
+    return config.get("COMPRESSION_GZIP_LEVEL", 6)
+
+
+def compress(data, encoding, level):
+    """Compress bytes in one go."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    elif encoding == "br":
+        return brotli.compress(data, quality=level)
+    elif encoding == "gzip":
+        # Fixed mtime renders the output deterministic for identical bodies.
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    raise ValueError("Unsupported content encoding '{}'".format(encoding))
+
+
+def decompress(data, encoding):
+    """Decompress bytes compressed by :func:`compress` in one go."""
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "br":
+        return brotli.decompress(data)
+    elif encoding == "gzip":
+        return gzip.decompress(data)
+    raise ValueError("Unsupported content encoding '{}'".format(encoding))
+
+
+def decompressing_reader(stream, encoding):
+    """Return file-like object yielding the decompressed content of stream."""
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    elif encoding == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(
+            stream, read_across_frames=True)
+    raise ValueError("Unsupported content encoding '{}'".format(encoding))
+
+
+def decompress_bounded(stream, encoding, max_size, chunk_size=1024 * 1024):
+    """Decompress stream into bytes, reading at most max_size bytes.
+
+    Decompression happens chunk-wise, hence a highly compressed body never
+    occupies more than max_size bytes of memory.
+
+    :raises OverflowError: if the decompressed content exceeds max_size.
+    :raises ValueError: if the content is not validly encoded.
+    """
+    reader = decompressing_reader(stream, encoding)
+    buffer = io.BytesIO()
+    try:
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            if buffer.tell() + len(chunk) > max_size:
+                raise OverflowError(
+                    "Decompressed request body exceeds {} bytes".format(max_size))
+            buffer.write(chunk)
+    except (OSError, EOFError, zlib.error) as exc:
+        raise ValueError("Invalid {} content: {}".format(encoding, exc))
+    except Exception as exc:
+        if zstandard is not None and isinstance(exc, zstandard.ZstdError):
+            raise ValueError("Invalid {} content: {}".format(encoding, exc))
+        raise
+    return buffer.getvalue()
+
+
+class _BrotliStream:
+    """Adapt brotli.Compressor to the compressobj interface."""
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def compressobj(encoding, level):
+    """Return incremental compressor with compress(chunk) and flush()."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    elif encoding == "br":
+        return _BrotliStream(level)
+    elif encoding == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    raise ValueError("Unsupported content encoding '{}'".format(encoding))
+
+
+def iter_compressed(chunks, encoding, level):
+    """Compress an iterable of byte or str chunks on the fly."""
+    compressor = compressobj(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    tail = compressor.flush()
+    if tail:
+        yield tail
+
+
+class CompressedBodyCache:
+    """Thread-safe LRU cache of compressed bodies bounded by total size.
+
+    Entries are keyed by the digest of the uncompressed body and the
+    content encoding. Repeatedly served payloads, e.g. the manifest of a
+    popular dataset, are hence compressed only once.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(data, encoding):
+        return (hashlib.blake2b(data, digest_size=20).digest(), encoding)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class Compression:
+    """Flask extension compressing responses via Accept-Encoding negotiation.
+
+    Also decompresses request bodies sent with a Content-Encoding header.
+    Configured by the ``COMPRESSION_*`` and ``MAX_DECOMPRESSED_REQUEST_SIZE``
+    parameters in :class:`dservercore.config.Config`.
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache = CompressedBodyCache(
+            app.config.get("COMPRESSION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        app.before_request(self.decompress_request)
+        app.after_request(self.compress_response)
+
+    @staticmethod
+    def decompress_request():
+        """Replace a compressed request body by its decompressed content."""
+        encoding = request.headers.get("Content-Encoding", "").strip().lower()
+        if encoding in ("", "identity"):
+            return None
+
+        if encoding not in available_request_encodings():
+            abort(415, "Unsupported Content-Encoding '{}'".format(encoding))
+
+        max_size = current_app.config.get(
+            "MAX_DECOMPRESSED_REQUEST_SIZE", 512 * 1024 * 1024)
+        try:
+            data = decompress_bounded(request.stream, encoding, max_size)
+        except OverflowError as message:
+            abort(413, str(message))
+        except ValueError as message:
+            abort(400, str(message))
+
+        logger.debug("Decompressed %s request body to %d bytes",
+                     encoding, len(data))
+
+        # Hand the plain body to the WSGI layer and drop the request's
+        # cached views on the original one, so that any subsequent parsing
+        # sees the decompressed content.
+        environ = request.environ
+        environ["wsgi.input"] = io.BytesIO(data)
+        environ["CONTENT_LENGTH"] = str(len(data))
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+        for attr in ("stream", "content_length"):
+            request.__dict__.pop(attr, None)
+        return None
+
+    @staticmethod
+    def _should_skip(response):
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return True
+        if request.method == "HEAD":
+            return True
+        if "Content-Encoding" in response.headers:
+            return True
+        if response.direct_passthrough:
+            return True
+        if "no-transform" in response.headers.get("Cache-Control", ""):
+            return True
+        mimetypes = current_app.config.get(
+            "COMPRESSION_MIMETYPES", ["application/json"])
+        if response.mimetype not in mimetypes:
+            return True
+        return False
+
+    def compress_response(self, response):
+        """Compress the response body if negotiated with the client."""
+        config = current_app.config
+        if not config.get("COMPRESSION_ENABLED", False):
+            return response
+
+        if self._should_skip(response):
+            return response
+
+        encoding = request.accept_encodings.best_match(available_encodings())
+        response.vary.add("Accept-Encoding")
+        if encoding is None:
+            return response
+
+        level = _level(config, encoding)
+
+        if response.is_streamed:
+            response.response = iter_compressed(
+                response.response, encoding, level)
+            response.headers.pop("Content-Length", None)
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+        data = response.get_data()
+        if len(data) < config.get("COMPRESSION_MIN_SIZE", 1024):
+            return response
+
+        key = self.cache.key(data, encoding)
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = compress(data, encoding, level)
+            self.cache.put(key, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        logger.debug("Compressed response from %d to %d bytes with %s",
+                     len(data), len(compressed), encoding)
+        return response
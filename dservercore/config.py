@@ -11,6 +11,8 @@ CONFIG_EXCLUSIONS = [
                         "JWT_PRIVATE_KEY",
                         "SECRET_KEY",
                         "SQLALCHEMY_DATABASE_URI",
+                        "SQLALCHEMY_READ_REPLICA_URI",
+                        "SQLALCHEMY_BINDS",
                     ]
 
 
@@ -23,6 +25,13 @@ def _get_file_content(key, default=""):
     return content
 
 
+def _get_bool(key, default=False):
+    value = os.environ.get(key)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
 class Config(object):
     CONFIG_SECRETS_TO_OBFUSCATE = CONFIG_EXCLUSIONS
 
@@ -33,6 +42,33 @@ class Config(object):
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Optional read replica of the SQL database queried by read-only
+    # endpoints, see dservercore.read_replica. Alternatively, configure the
+    # "read_replica" bind in SQLALCHEMY_BINDS.
+    SQLALCHEMY_READ_REPLICA_URI = os.environ.get("SQLALCHEMY_READ_REPLICA_URI")
+
+    # Connection pools of the primary database and the read replica, see
+    # dservercore.sql_engine.
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get("SQLALCHEMY_POOL_SIZE", 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get("SQLALCHEMY_MAX_OVERFLOW", 10))
+    # Seconds to wait for a connection before giving up.
+    SQLALCHEMY_POOL_TIMEOUT = float(
+        os.environ.get("SQLALCHEMY_POOL_TIMEOUT", 30.0))
+    # Seconds after which connections are replaced, e.g. to stay below the
+    # database server's idle timeout, -1 never replaces them.
+    SQLALCHEMY_POOL_RECYCLE = int(
+        os.environ.get("SQLALCHEMY_POOL_RECYCLE", -1))
+    # Test connections for liveness on checkout.
+    SQLALCHEMY_POOL_PRE_PING = _get_bool("SQLALCHEMY_POOL_PRE_PING", True)
+
+    # Pragmas set on each connection to a file-based SQLite database.
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    # Milliseconds to wait for locks held by other connections.
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    # Bytes of the database file to memory-map, 0 disables.
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 268435456))
+
     JWT_ALGORITHM = "RS256"
     JWT_TOKEN_LOCATION = "headers"
     JWT_HEADER_NAME = "Authorization"
@@ -69,7 +105,128 @@ class Config(object):
     #     https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Access-Control-Expose-Headers
     # With flask, this is achieved by configuring flask-cors as follows, see
     #     https://flask-cors.readthedocs.io/en/latest/configuration.html#configuration-options
-    CORS_EXPOSE_HEADERS = ["X-Pagination"]
+    CORS_EXPOSE_HEADERS = ["X-Pagination", "X-Facets"]
+
+    # Negotiated compression of response bodies based on the client's
+    # Accept-Encoding header, see dservercore.compression. gzip is always
+    # available, zstd and br require the optional zstandard and brotli
+    # packages. Responses smaller than COMPRESSION_MIN_SIZE bytes are sent
+    # uncompressed. Compressed bodies are cached in memory up to a total of
+    # COMPRESSION_CACHE_MAX_BYTES.
+    COMPRESSION_ENABLED = _get_bool("COMPRESSION_ENABLED", True)
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+    COMPRESSION_ZSTD_LEVEL = int(os.environ.get("COMPRESSION_ZSTD_LEVEL", 3))
+    COMPRESSION_BROTLI_LEVEL = int(os.environ.get("COMPRESSION_BROTLI_LEVEL", 4))
+    COMPRESSION_MIMETYPES = ["application/json"]
+    COMPRESSION_CACHE_MAX_BYTES = int(
+        os.environ.get("COMPRESSION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+    # Request bodies sent with Content-Encoding gzip or zstd are decompressed
+    # before parsing. Bodies decompressing to more than this many bytes are
+    # rejected with 413.
+    MAX_DECOMPRESSED_REQUEST_SIZE = int(
+        os.environ.get("MAX_DECOMPRESSED_REQUEST_SIZE", 512 * 1024 * 1024))
+
+    # Maximum number of URIs accepted by the POST /<resource>/batch routes.
+    MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+
+    # Number of UUIDs resolved per SQL query by POST /uuids.
+    UUID_LOOKUP_BATCH_SIZE = int(os.environ.get("UUID_LOOKUP_BATCH_SIZE", 500))
+
+    # Number of datasets handed to the plugins at once by the
+    # POST /<resource>/bulk routes.
+    BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 500))
+
+    # Answer search queries without free text and tags from the SQL database.
+    # Queries combining them with uploader or range criteria the search plugin
+    # does not support are answered by filtering its hits in SQL, fetched in
+    # pages of SEARCH_QUERY_PLANNER_MAX_HITS; more matches than that are
+    # rejected, as are more than SEARCH_QUERY_PLANNER_MAX_SCAN plugin hits.
+    SEARCH_QUERY_PLANNER = _get_bool("SEARCH_QUERY_PLANNER", True)
+    SEARCH_QUERY_PLANNER_MAX_HITS = int(
+        os.environ.get("SEARCH_QUERY_PLANNER_MAX_HITS", 10000))
+    SEARCH_QUERY_PLANNER_MAX_SCAN = int(
+        os.environ.get("SEARCH_QUERY_PLANNER_MAX_SCAN", 100000))
+
+    # Results of up to SEARCH_CACHE_SIZE recent searches are reused for
+    # SEARCH_CACHE_TTL seconds unless datasets change in between; a size of
+    # 0 disables the cache.
+    SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 256))
+    SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 30.0))
+
+    # Number of most frequent values reported per facet field.
+    SEARCH_FACETS_MAX_BUCKETS = int(
+        os.environ.get("SEARCH_FACETS_MAX_BUCKETS", 20))
+
+    # Record registrations, deletions and metadata updates in the change log
+    # served by GET /changes, at most CHANGES_MAX_PAGE_SIZE entries at once.
+    # Entries are served once older than CHANGES_VISIBILITY_DELAY seconds,
+    # the longest time a transaction may take to commit after writing one.
+    CHANGE_LOG_ENABLED = _get_bool("CHANGE_LOG_ENABLED", True)
+    CHANGES_MAX_PAGE_SIZE = int(os.environ.get("CHANGES_MAX_PAGE_SIZE", 1000))
+    CHANGES_VISIBILITY_DELAY = float(
+        os.environ.get("CHANGES_VISIBILITY_DELAY", 1.0))
+
+    # GET /events streams change log entries as server-sent events. The
+    # change log is polled every EVENTS_POLL_INTERVAL seconds and the most
+    # recent EVENTS_BUFFER_SIZE entries are kept in memory. Streams send a
+    # comment every EVENTS_HEARTBEAT_INTERVAL seconds without changes and
+    # end after EVENTS_STREAM_TIMEOUT seconds. The subscriber's permissions
+    # are re-checked every EVENTS_PERMISSIONS_INTERVAL seconds.
+    EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", 1.0))
+    EVENTS_BUFFER_SIZE = int(os.environ.get("EVENTS_BUFFER_SIZE", 1000))
+    EVENTS_HEARTBEAT_INTERVAL = float(
+        os.environ.get("EVENTS_HEARTBEAT_INTERVAL", 15.0))
+    EVENTS_STREAM_TIMEOUT = float(
+        os.environ.get("EVENTS_STREAM_TIMEOUT", 600.0))
+    EVENTS_PERMISSIONS_INTERVAL = float(
+        os.environ.get("EVENTS_PERMISSIONS_INTERVAL", 30.0))
+
+    # Write tag, annotation and readme updates back to the dataset storage
+    # asynchronously via a queue drained by background workers.
+    STORAGE_WRITE_BEHIND = _get_bool("STORAGE_WRITE_BEHIND", True)
+    STORAGE_WRITE_WORKERS = int(os.environ.get("STORAGE_WRITE_WORKERS", 2))
+    STORAGE_WRITE_MAX_ATTEMPTS = int(
+        os.environ.get("STORAGE_WRITE_MAX_ATTEMPTS", 8))
+    # Seconds to wait before the first retry, doubled with every attempt.
+    STORAGE_WRITE_RETRY_BACKOFF = float(
+        os.environ.get("STORAGE_WRITE_RETRY_BACKOFF", 2.0))
+    STORAGE_WRITE_MAX_BACKOFF = float(
+        os.environ.get("STORAGE_WRITE_MAX_BACKOFF", 600.0))
+    STORAGE_WRITE_POLL_INTERVAL = float(
+        os.environ.get("STORAGE_WRITE_POLL_INTERVAL", 1.0))
+    # Seconds after which writes claimed by a vanished worker are released.
+    STORAGE_WRITE_PROCESSING_TIMEOUT = float(
+        os.environ.get("STORAGE_WRITE_PROCESSING_TIMEOUT", 600.0))
+
+    # Opened datasets are reused by storage writes for up to
+    # DATASET_HANDLE_CACHE_TTL seconds; a size of 0 disables the cache.
+    DATASET_HANDLE_CACHE_SIZE = int(
+        os.environ.get("DATASET_HANDLE_CACHE_SIZE", 128))
+    DATASET_HANDLE_CACHE_TTL = float(
+        os.environ.get("DATASET_HANDLE_CACHE_TTL", 300.0))
+
+    # Built-in SQL retrieve plugin, used if no other retrieve plugin is
+    # installed. Manifest items are stored compressed in chunks of this size.
+    RETRIEVE_SQL_MANIFEST_CHUNK_SIZE = int(
+        os.environ.get("RETRIEVE_SQL_MANIFEST_CHUNK_SIZE", 1000))
+    RETRIEVE_SQL_ZSTD_LEVEL = int(os.environ.get("RETRIEVE_SQL_ZSTD_LEVEL", 9))
+    RETRIEVE_SQL_GZIP_LEVEL = int(os.environ.get("RETRIEVE_SQL_GZIP_LEVEL", 9))
+
+    # Built-in search plugin used if no other search plugin is installed,
+    # "sql" or "memory".
+    BUILTIN_SEARCH_PLUGIN = os.environ.get("BUILTIN_SEARCH_PLUGIN", "sql")
+
+    # The in-memory search plugin catches up with datasets registered by
+    # other worker processes every MEMORY_SEARCH_SYNC_INTERVAL seconds and
+    # saves its index to MEMORY_SEARCH_SNAPSHOT, if set, at most every
+    # MEMORY_SEARCH_SNAPSHOT_INTERVAL seconds.
+    MEMORY_SEARCH_SYNC_INTERVAL = float(
+        os.environ.get("MEMORY_SEARCH_SYNC_INTERVAL", 10.0))
+    MEMORY_SEARCH_SNAPSHOT = os.environ.get("MEMORY_SEARCH_SNAPSHOT")
+    MEMORY_SEARCH_SNAPSHOT_INTERVAL = float(
+        os.environ.get("MEMORY_SEARCH_SNAPSHOT_INTERVAL", 60.0))
 
     OPENAPI_VERSION = "3.0.2"
     OPENAPI_URL_PREFIX = os.environ.get("OPENAPI_URL_PREFIX", "/doc")
@@ -13,7 +13,14 @@ from dservercore.utils_auth import (
 import dservercore
 import dservercore.utils_auth
 from dservercore.blueprint import Blueprint
-from dservercore.schemas import ConfigSchema, HealthSchema, VersionSchema
+from dservercore import sql_db
+from dservercore.schemas import (
+    ConfigSchema,
+    DatabasePoolSchema,
+    HealthSchema,
+    VersionSchema,
+)
+from dservercore.sql_engine import pool_status
 from dservercore.utils import versions_to_dict, obj_to_lowercase_key_dict
 
 
@@ -56,3 +63,26 @@ def health():
     This does not require authorization."""
 
     return jsonify({"status": "healthy"}), 200
+
+
+@bp.route("/database-pools", methods=["GET"])
+@bp.response(200, DatabasePoolSchema(many=True))
+@bp.alt_response(401, description="Not registered")
+@bp.alt_response(403, description="No permissions")
+@jwt_required()
+def database_pools():
+    """Return the state of the SQL connection pools.
+
+    Lists one pool per bind, the primary database's bind being null, with
+    the number of checkouts and the time spent waiting for connections.
+    The user in the Authorization token needs to be admin.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        abort(401)
+
+    if not dservercore.utils_auth.has_admin_rights(username):
+        abort(403)
+
+    return [dict(pool_status(engine), bind=key)
+            for key, engine in sql_db.engines.items()]
@@ -0,0 +1,63 @@
+"""Route streaming server-sent events of dataset changes"""
+from flask import (
+    abort,
+    current_app,
+    request,
+    Response,
+    stream_with_context,
+)
+from dservercore.utils_auth import (
+    jwt_required,
+    get_jwt_identity,
+)
+
+import dservercore.utils_auth
+
+from dservercore.blueprint import Blueprint
+
+
+bp = Blueprint("events", __name__, url_prefix="/events")
+
+
+def _search_base_uris(username):
+    """Return base URIs the user may search, None if the user is gone."""
+    if not dservercore.utils_auth.user_exists(username):
+        return None
+    return dservercore.utils_auth.list_search_base_uris(username)
+
+
+@bp.route("", methods=["GET"])
+@bp.response(200, content_type="text/event-stream")
+@bp.alt_response(401, description="Not registered")
+@jwt_required()
+def events_get():
+    """Stream registrations, deletions and metadata updates as server-sent
+    events.
+
+    Only changes to datasets in base URIs the user has search permissions on
+    are sent. Event ids are the sequence numbers of the change log, clients
+    reconnecting with a ``Last-Event-ID`` header receive missed changes.
+    Permissions are re-checked every ``EVENTS_PERMISSIONS_INTERVAL`` seconds,
+    the stream ends if the user has been deleted.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        # Unregistered users should see 401.
+        abort(401)
+
+    last_event_id = request.headers.get("Last-Event-ID")
+    try:
+        last_event_id = int(last_event_id)
+    except (TypeError, ValueError):
+        last_event_id = None
+
+    events = current_app.events.subscribe(
+        _search_base_uris(username),
+        last_event_id=last_event_id,
+        timeout=current_app.config.get("EVENTS_STREAM_TIMEOUT", 600.0),
+        refresh_base_uris=lambda: _search_base_uris(username))
+
+    return Response(stream_with_context(events),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache",
+                             "X-Accel-Buffering": "no"})
@@ -0,0 +1,253 @@
+"""Server-sent events of dataset changes
+
+Dashboards subscribe to ``GET /events`` to be notified of registrations,
+deletions and metadata updates as they happen instead of polling. Events are
+the entries of the change log (see :class:`dservercore.sql_models.Change`),
+hence changes made via any worker process are delivered, and clients
+reconnecting with a ``Last-Event-ID`` header receive the changes they have
+missed. Subscribers falling behind the buffer are sent the changes dropped
+from it out of the change log, and their permissions are re-checked every
+``EVENTS_PERMISSIONS_INTERVAL`` seconds.
+
+A single poller thread per process tails the change log and appends new
+entries to a bounded in-memory buffer. Subscribers do not poll themselves,
+they wait on a shared condition and read the buffer from their own cursor,
+so idle subscribers cost neither queries nor per-subscriber queues. Run the
+app with a gevent or eventlet worker class to serve many subscribers
+without a thread each.
+"""
+import json
+import logging
+import threading
+import time
+
+from collections import deque
+
+from dservercore import sql_db
+from dservercore.sql_models import Change, ChangeSchema
+from dservercore.utils import last_visible_seq, visible_changes
+
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(seq, kind, data):
+    """Return a server-sent event message."""
+    return "id: {}\nevent: {}\ndata: {}\n\n".format(
+        seq, kind, json.dumps(data))
+
+
+class EventHub:
+    """Fan-out of change log entries to server-sent event subscribers.
+
+    Configured by the ``EVENTS_*`` parameters in
+    :class:`dservercore.config.Config`. The poller thread is started with
+    the first subscription.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.poller = None
+        self.last_seq = 0
+        # Sequence number of the last change dropped from the buffer.
+        self.dropped_seq = 0
+        self._events = deque()
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    @property
+    def config(self):
+        return self.app.config
+
+    def start_poller(self):
+        """Start tailing the change log from its visible end, once.
+
+        Changes within ``CHANGES_VISIBILITY_DELAY`` are left to the poller,
+        as in :meth:`poll_once`, changes of transactions committing later
+        with a lower sequence number are not skipped.
+        """
+        if self.poller is not None:
+            return
+        with self._lock:
+            if self.poller is not None:
+                return
+            self.last_seq = last_visible_seq()
+            self.poller = threading.Thread(
+                target=self._poll, name="event-hub", daemon=True)
+            self.poller.start()
+
+    def stop_poller(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self.poller is not None:
+            self.poller.join(timeout)
+        self.poller = None
+        self._stop.clear()
+
+    def notify(self):
+        """Make the poller look for new changes right away."""
+        self._wakeup.set()
+
+    def _poll(self):
+        poll_interval = self.config.get("EVENTS_POLL_INTERVAL", 1.0)
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.poll_once()
+            except Exception as e:
+                logger.exception(f"Event hub failed to poll change log: {e}")
+            self._wakeup.wait(poll_interval)
+            self._wakeup.clear()
+
+    def poll_once(self):
+        """Buffer changes after the last one seen and wake up subscribers.
+
+        Returns the number of new changes.
+        """
+        buffer_size = self.config.get("EVENTS_BUFFER_SIZE", 1000)
+        changes = visible_changes(Change.query
+                                  .filter(Change.seq > self.last_seq)
+                                  .order_by(Change.seq)
+                                  .limit(buffer_size)
+                                  .all())
+        if len(changes) == 0:
+            return 0
+
+        schema = ChangeSchema()
+        with self._condition:
+            for change in changes:
+                self._events.append(
+                    (change.seq, change.base_uri, schema.dump(change)))
+            while len(self._events) > buffer_size:
+                self.dropped_seq = self._events.popleft()[0]
+            self.last_seq = changes[-1].seq
+            self._condition.notify_all()
+        return len(changes)
+
+    def _events_after(self, seq):
+        events = []
+        for event in reversed(self._events):
+            if event[0] <= seq:
+                break
+            events.append(event)
+        events.reverse()
+        return events
+
+    def _missed_events(self, base_uris, since, until):
+        """Yield messages of changes in base_uris after since up to until.
+
+        Changes are read from the change log in pages of
+        ``CHANGES_MAX_PAGE_SIZE``, the database connection is released
+        between pages.
+        """
+        page_size = self.config.get("CHANGES_MAX_PAGE_SIZE", 1000)
+        schema = ChangeSchema()
+        while since < until:
+            changes = (Change.query
+                       .filter(Change.base_uri.in_(base_uris))
+                       .filter(Change.seq > since)
+                       .filter(Change.seq <= until)
+                       .order_by(Change.seq)
+                       .limit(page_size)
+                       .all())
+            messages = [
+                format_event(change.seq, change.kind, schema.dump(change))
+                for change in changes]
+            sql_db.session.remove()
+            if len(changes) < page_size:
+                until = since
+            else:
+                since = changes[-1].seq
+            yield from messages
+
+    def subscribe(self, base_uris, last_event_id=None, timeout=None,
+                  refresh_base_uris=None):
+        """Return iterator over server-sent event messages of changes.
+
+        Only changes in base_uris are delivered. Changes after
+        last_event_id are replayed from the change log first. Comments are
+        sent every ``EVENTS_HEARTBEAT_INTERVAL`` seconds without changes to
+        keep the connection alive. The iterator ends after timeout seconds,
+        clients are expected to reconnect.
+
+        If given, refresh_base_uris is called every
+        ``EVENTS_PERMISSIONS_INTERVAL`` seconds to update base_uris, e.g.
+        after permissions have been revoked. The iterator ends if it returns
+        None.
+        """
+        self.start_poller()
+        base_uris = set(base_uris)
+        with self._condition:
+            cursor = self.last_seq
+
+        return self._stream(base_uris, cursor, last_event_id, timeout,
+                            refresh_base_uris)
+
+    def _stream(self, base_uris, cursor, last_event_id, timeout,
+                refresh_base_uris=None):
+        heartbeat = self.config.get("EVENTS_HEARTBEAT_INTERVAL", 15.0)
+        permissions_interval = self.config.get(
+            "EVENTS_PERMISSIONS_INTERVAL", 30.0)
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        # Do not hold on to a database connection while streaming.
+        sql_db.session.remove()
+
+        if last_event_id is not None and last_event_id < cursor:
+            yield from self._missed_events(base_uris, last_event_id, cursor)
+        last_sent = time.monotonic()
+        last_refresh = time.monotonic()
+
+        while True:
+            wait = heartbeat
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+
+            with self._condition:
+                events = self._events_after(cursor)
+                if len(events) == 0:
+                    self._condition.wait(wait)
+                    events = self._events_after(cursor)
+                dropped_seq = self.dropped_seq
+
+            if (refresh_base_uris is not None and
+                    time.monotonic() - last_refresh >= permissions_interval):
+                base_uris = refresh_base_uris()
+                sql_db.session.remove()
+                if base_uris is None:
+                    return
+                base_uris = set(base_uris)
+                last_refresh = time.monotonic()
+
+            if cursor < dropped_seq:
+                # Changes up to dropped_seq have left the buffer before
+                # this subscriber got to them, send them from the change log.
+                for message in self._missed_events(
+                        base_uris, cursor, dropped_seq):
+                    yield message
+                    last_sent = time.monotonic()
+                cursor = dropped_seq
+                events = [event for event in events if event[0] > cursor]
+
+            if len(events) > 0:
+                cursor = events[-1][0]
+            for seq, base_uri, data in events:
+                if base_uri in base_uris:
+                    yield format_event(seq, data["kind"], data)
+                    last_sent = time.monotonic()
+
+            if time.monotonic() - last_sent >= heartbeat:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return
@@ -3,6 +3,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_jwt_extended import JWTManager
 
-sql_db = SQLAlchemy()
+from dservercore.compression import Compression
+from dservercore.read_replica import RoutingSession
+
+sql_db = SQLAlchemy(session_options={"class_": RoutingSession})
 jwt = JWTManager()
-ma = Marshmallow()
\ No newline at end of file
+ma = Marshmallow()
+compression = Compression()
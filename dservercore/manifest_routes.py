@@ -11,23 +11,29 @@ from dservercore.utils_auth import (
 
 from dservercore import UnknownURIError
 from dservercore.blueprint import Blueprint
-from dservercore.schemas import ManifestSchema
+from dservercore.schemas import ManifestRangeSchema, ManifestSchema
 import dservercore.utils_auth
 from dservercore.utils import (
     url_suffix_to_uri,
-    get_manifest_from_uri_by_user
+    get_manifest_from_uri_by_user,
+    get_manifest_items_from_uri_by_user
 )
 
 bp = Blueprint("manifests", __name__, url_prefix="/manifests")
 
 @bp.route("/<path:uri>", methods=["GET"])
+@bp.arguments(ManifestRangeSchema, location="query")
 @bp.response(200, ManifestSchema)
 @bp.alt_response(401, description="Not registered")
 @bp.alt_response(403, description="No permissions")
 @bp.alt_response(404, description="Not found")
 @jwt_required()
-def manifest(uri):
-    """Request the dataset manifest."""
+def manifest(manifest_range, uri):
+    """Request the dataset manifest.
+
+    With ``offset`` or ``limit`` given, only the ``items`` within that range
+    of the manifest are returned.
+    """
     username = get_jwt_identity()
     if not dservercore.utils_auth.user_exists(username):
         # Unregistered users should see 401.
@@ -39,7 +45,12 @@ def manifest(uri):
         abort(403)
 
     try:
-        manifest_ = get_manifest_from_uri_by_user(username, uri)
+        if manifest_range["offset"] == 0 and manifest_range["limit"] is None:
+            manifest_ = get_manifest_from_uri_by_user(username, uri)
+        else:
+            manifest_ = {"items": get_manifest_items_from_uri_by_user(
+                username, uri, offset=manifest_range["offset"],
+                limit=manifest_range["limit"])}
     except UnknownURIError:
         current_app.logger.info("UnknownURIError")
         abort(404)
@@ -0,0 +1,917 @@
+"""Built-in in-memory search plugin for small deployments
+
+Selected with ``BUILTIN_SEARCH_PLUGIN = "memory"`` whenever no other
+``dservercore.search`` plugin is installed. Each worker process keeps
+inverted indexes of all datasets in memory, hence searches neither leave
+the process nor touch the database:
+
+- postings mapping each word of the datasets' names, readmes and
+  annotations to the sorted array of matching dataset ids,
+- postings for tags and the exact-match fields base URI, creator, UUID and
+  uploader,
+- per-field rank arrays, i.e. the dataset ids' positions in sorted order,
+  built lazily for sorting by creators, base URIs, dates and so on.
+
+The index is built from the ``dataset`` table and the retrieve plugin on
+first use and kept up to date through the search plugin hooks. Datasets
+registered or deleted by other worker processes are picked up by comparing
+against the ``dataset`` table at most every
+``MEMORY_SEARCH_SYNC_INTERVAL`` seconds. Changes of tags, annotations or
+readmes applied by other workers only show once the dataset is registered
+anew, run a single worker if that matters.
+
+If ``MEMORY_SEARCH_SNAPSHOT`` names a file, the index is saved there by a
+background thread and memory-mapped at start-up instead of being rebuilt
+from scratch. Postings
+are stored as contiguous arrays of unsigned 32-bit integers behind a JSON
+header and used in place until modified. Readmes and annotations follow
+separately and are decoded on access only.
+"""
+import array
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+import dtoolcore.utils
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from dservercore import (
+    SearchABC,
+    PaginationParameters,
+    SortParameters,
+    sql_db as db,
+)
+from dservercore.date_utils import (
+    _naive_utc_from_timestamp,
+    extract_created_at_as_datetime,
+    extract_frozen_at_as_datetime,
+)
+from dservercore.schemas import (
+    RANGE_QUERY_KEYS,
+    SearchDatasetSchema,
+    range_filters,
+)
+from dservercore.search_text import dataset_fulltext, readme_as_string
+from dservercore.sort import DESCENDING
+from dservercore.sql_models import Dataset, DatasetSchema
+
+
+logger = logging.getLogger(__name__)
+
+
+SNAPSHOT_MAGIC = b"DSMS"
+SNAPSHOT_VERSION = 2
+
+# Query keys and the dataset fields they select by exact value.
+FILTERS = {
+    "base_uris": "base_uri",
+    "creator_usernames": "creator_username",
+    "uuids": "uuid",
+    "uploaded_by": "uploaded_by",
+}
+
+DATE_FIELDS = ("frozen_at", "created_at", "uploaded_at")
+
+# Number of datasets fetched from the retrieve plugin at once.
+CHUNK_SIZE = 1000
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Return set of lower case words within text.
+
+    Plurals are folded crudely, "apples" matches "apple" and vice versa.
+    """
+    tokens = set()
+    for token in _WORD.findall(text.lower()):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.add(token)
+    return tokens
+
+
+def _entry_from_dataset_info(dataset_info):
+    """Return search hit for dataset registration."""
+    return {
+        "base_uri": dataset_info["base_uri"],
+        "uri": dataset_info["uri"],
+        "uuid": str(dataset_info["uuid"]),
+        "name": dataset_info["name"],
+        "creator_username": dataset_info["creator_username"],
+        "frozen_at": extract_frozen_at_as_datetime(dataset_info),
+        "created_at": extract_created_at_as_datetime(dataset_info),
+        "number_of_items": dataset_info.get("number_of_items"),
+        "size_in_bytes": dataset_info.get("size_in_bytes"),
+        "uploaded_by": dataset_info.get("uploaded_by"),
+        "uploaded_at": dataset_info.get("uploaded_at"),
+        "tags": list(dict.fromkeys(dataset_info.get("tags", []))),
+    }
+
+
+def _entry_from_dataset(dataset, tags):
+    """Return search hit for row of the dataset table."""
+    entry = {field: getattr(dataset, field)
+             for field in DatasetSchema.Meta.fields}
+    entry["base_uri"] = dataset.base_uri.base_uri
+    entry["tags"] = list(dict.fromkeys(tags))
+    return entry
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _contains(ids, dataset_id):
+    """Return whether the sorted ids contain dataset_id."""
+    position = bisect.bisect_left(ids, dataset_id)
+    return position < len(ids) and ids[position] == dataset_id
+
+
+def _retain(matched, ids):
+    """Return the set of ids in matched also within the sorted ids."""
+    if len(matched) * 8 < len(ids):
+        return {dataset_id for dataset_id in matched
+                if _contains(ids, dataset_id)}
+    return matched.intersection(ids)
+
+
+def _insert(postings, key, dataset_id):
+    """Insert dataset_id into the sorted ids postings[key]."""
+    ids = postings.get(key)
+    if ids is None:
+        postings[key] = array.array("I", [dataset_id])
+        return
+    position = bisect.bisect_left(ids, dataset_id)
+    if position < len(ids) and ids[position] == dataset_id:
+        return
+    if not isinstance(ids, array.array):
+        # Postings memory-mapped from a snapshot are copied on change.
+        ids = postings[key] = array.array("I", ids.tobytes())
+    ids.insert(position, dataset_id)
+
+
+def _discard(postings, key, dataset_id):
+    """Remove dataset_id from the sorted ids postings[key] if present."""
+    ids = postings.get(key)
+    if ids is None or not _contains(ids, dataset_id):
+        return
+    if len(ids) == 1:
+        del postings[key]
+        return
+    if not isinstance(ids, array.array):
+        ids = postings[key] = array.array("I", ids.tobytes())
+    del ids[bisect.bisect_left(ids, dataset_id)]
+
+
+class _Documents:
+    """Readmes and annotations by dataset id.
+
+    Documents of a snapshot stay JSON encoded in the memory-mapped file and
+    are decoded on access, documents set later on are kept in a dict.
+    """
+
+    def __init__(self, offsets=None, data=None):
+        self._offsets = offsets
+        self._data = data
+        self._length = 0 if offsets is None else len(offsets) - 1
+        self._documents = {}
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, dataset_id):
+        if dataset_id in self._documents:
+            return self._documents[dataset_id]
+        encoded = self.encoded(dataset_id)
+        return json.loads(encoded) if encoded else None
+
+    def __setitem__(self, dataset_id, document):
+        if not 0 <= dataset_id < self._length:
+            raise IndexError(dataset_id)
+        self._documents[dataset_id] = document
+
+    def append(self, document):
+        self._documents[self._length] = document
+        self._length += 1
+
+    def copy(self):
+        """Return copy sharing the mapped and the immutable documents."""
+        documents = _Documents(self._offsets, self._data)
+        documents._length = self._length
+        documents._documents = dict(self._documents)
+        return documents
+
+    def encoded(self, dataset_id):
+        """Return JSON encoded document, empty if None."""
+        if dataset_id in self._documents:
+            document = self._documents[dataset_id]
+            if document is None:
+                return b""
+            return json.dumps(document).encode("utf-8")
+        if not 0 <= dataset_id < self._length:
+            raise IndexError(dataset_id)
+        return self._data[self._offsets[dataset_id]:
+                          self._offsets[dataset_id + 1]].tobytes()
+
+
+class MemoryIndex:
+    """Inverted indexes over all searchable datasets.
+
+    Datasets are identified by dense integer ids, ids of deleted datasets
+    are reused. Postings are sorted arrays of ids, memory-mapped read-only
+    views if loaded from a snapshot. Not thread-safe, :class:`MemorySearch`
+    serializes access.
+    """
+
+    def __init__(self):
+        self.entries = []  # id -> search hit, None if free
+        self.documents = _Documents()  # id -> readme and annotations
+        self.ids = {}  # URI -> id
+        self.words = {}
+        self.tags = {}
+        self.values = {field: {} for field in FILTERS.values()}
+        # Highest id of the dataset table reflected in the index.
+        self.max_dataset_id = 0
+        self._free_ids = []
+        self._ranks = {}
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, uri):
+        return uri in self.ids
+
+    def _words(self, dataset_id):
+        document = self.documents[dataset_id]
+        return tokenize(dataset_fulltext(
+            self.entries[dataset_id]["name"],
+            document["readme"],
+            document["annotations"]))
+
+    def add(self, entry, readme, annotations):
+        """Index search hit entry, replacing any entry with the same URI."""
+        self.remove(entry["uri"])
+        if self._free_ids:
+            dataset_id = self._free_ids.pop()
+            self.entries[dataset_id] = entry
+        else:
+            dataset_id = len(self.entries)
+            self.entries.append(entry)
+            self.documents.append(None)
+        self.documents[dataset_id] = {
+            "readme": readme_as_string(readme),
+            "annotations": dict(annotations),
+        }
+        self.ids[entry["uri"]] = dataset_id
+
+        for field, postings in self.values.items():
+            if entry[field] is not None:
+                _insert(postings, entry[field], dataset_id)
+        for tag in entry["tags"]:
+            _insert(self.tags, tag, dataset_id)
+        for word in self._words(dataset_id):
+            _insert(self.words, word, dataset_id)
+        self._invalidate_orders()
+
+    def remove(self, uri):
+        dataset_id = self.ids.pop(uri, None)
+        if dataset_id is None:
+            return
+        entry = self.entries[dataset_id]
+        for field, postings in self.values.items():
+            _discard(postings, entry[field], dataset_id)
+        for tag in entry["tags"]:
+            _discard(self.tags, tag, dataset_id)
+        for word in self._words(dataset_id):
+            _discard(self.words, word, dataset_id)
+        self.entries[dataset_id] = None
+        self.documents[dataset_id] = None
+        self._free_ids.append(dataset_id)
+        self._invalidate_orders()
+
+    def _invalidate_orders(self):
+        self._ranks.clear()
+        self._orders.clear()
+
+    def get_tags(self, uri):
+        return list(self.entries[self.ids[uri]]["tags"])
+
+    def set_tags(self, uri, tags):
+        dataset_id = self.ids.get(uri)
+        if dataset_id is None:
+            return
+        entry = self.entries[dataset_id]
+        for tag in entry["tags"]:
+            _discard(self.tags, tag, dataset_id)
+        # Entries are replaced rather than modified, see copy().
+        entry = self.entries[dataset_id] = dict(
+            entry, tags=list(dict.fromkeys(tags)))
+        for tag in entry["tags"]:
+            _insert(self.tags, tag, dataset_id)
+
+    def get_annotations(self, uri):
+        return dict(self.documents[self.ids[uri]]["annotations"])
+
+    def update_document(self, uri, **document):
+        """Replace readme and/or annotations of indexed dataset."""
+        dataset_id = self.ids.get(uri)
+        if dataset_id is None:
+            return
+        for word in self._words(dataset_id):
+            _discard(self.words, word, dataset_id)
+        if "readme" in document:
+            document["readme"] = readme_as_string(document["readme"])
+        self.documents[dataset_id] = dict(
+            self.documents[dataset_id], **document)
+        for word in self._words(dataset_id):
+            _insert(self.words, word, dataset_id)
+
+    # Querying
+
+    def _filters(self, query):
+        """Return filters of query, each a list of sorted ids to unite."""
+        filters = []
+        for key, field in FILTERS.items():
+            values = {str(value) for value in query.get(key, [])}
+            if len(values) == 0:
+                continue
+            postings = self.values[field]
+            sets = [postings[value] for value in values if value in postings]
+            # Datasets have a single value per field, hence postings are
+            # disjoint and filters selecting all datasets can be skipped.
+            if sum(map(len, sets)) == len(self.ids):
+                continue
+            filters.append(sets)
+
+        for tag in dict.fromkeys(query.get("tags", [])):
+            filters.append([self.tags.get(tag, ())])
+
+        for field, lower, upper in range_filters(query):
+            filters.append([self._range(field, lower, upper)])
+
+        # Datasets match any term of the free text. Terms made up of several
+        # words, e.g. "sample-42", require all of them.
+        matches = []
+        for term in (query.get("free_text") or "").split():
+            words = sorted((self.words.get(word, ())
+                            for word in tokenize(term)), key=len)
+            if len(words) == 1:
+                matches.append(words[0])
+            elif len(words) > 1:
+                matched = set(words[0])
+                for ids in words[1:]:
+                    matched = _retain(matched, ids)
+                matches.append(array.array("I", sorted(matched)))
+        if len(matches) > 0:
+            filters.append(matches)
+
+        return filters
+
+    def _range(self, field, lower, upper):
+        """Return sorted ids with values of field within bounds."""
+        def key(dataset_id):
+            value = self.entries[dataset_id][field]
+            return (value is not None, value)
+
+        # Datasets without value come first in the order.
+        order = self._order(field)
+        start = bisect.bisect_right(order, (False, None), key=key)
+        if lower is not None:
+            start = bisect.bisect_left(order, (True, lower), lo=start, key=key)
+        end = len(order)
+        if upper is not None:
+            end = bisect.bisect_right(order, (True, upper), lo=start, key=key)
+        return array.array("I", sorted(order[start:end]))
+
+    def match(self, query):
+        """Return set of ids matching search query, None if all match."""
+        filters = sorted(self._filters(query),
+                         key=lambda sets: sum(map(len, sets)))
+        if len(filters) == 0:
+            return None
+
+        # Start from the most selective filter and probe the others.
+        matched = set().union(*filters[0])
+        for sets in filters[1:]:
+            if len(sets) == 1:
+                matched = _retain(matched, sets[0])
+            else:
+                matched = {dataset_id for dataset_id in matched
+                           if any(_contains(ids, dataset_id) for ids in sets)}
+        return matched
+
+    def facets(self, query, fields):
+        """Return number of datasets matching query per value of fields."""
+        matched = self.match(query)
+        facets = {}
+        for field in fields:
+            postings = self.tags if field == "tags" else self.values[field]
+            if matched is None:
+                counts = {value: len(ids) for value, ids in postings.items()}
+            else:
+                counts = {value: len(_retain(matched, ids))
+                          for value, ids in postings.items()}
+            facets[field] = {value: count for value, count in counts.items()
+                             if count > 0}
+        return facets
+
+    def _rank(self, field):
+        """Return array of dense ranks of all ids when sorted by field."""
+        ranks = self._ranks.get(field)
+        if ranks is None:
+            def key(dataset_id):
+                value = self.entries[dataset_id][field]
+                return (value is not None, value)
+
+            ranks = array.array("I", bytes(4 * len(self.entries)))
+            rank, previous = 0, None
+            for dataset_id in sorted(self.ids.values(), key=key):
+                value = key(dataset_id)
+                if value != previous:
+                    rank, previous = rank + 1, value
+                ranks[dataset_id] = rank
+            self._ranks[field] = ranks
+        return ranks
+
+    def _order(self, field=None, descending=False):
+        """Return array of all ids sorted by field, ties sorted by id."""
+        order = self._orders.get((field, descending))
+        if order is None:
+            if field is None:
+                order = array.array("I", sorted(self.ids.values()))
+            else:
+                ranks = self._rank(field)
+                sign = -1 if descending else 1
+                order = array.array("I", sorted(
+                    self.ids.values(),
+                    key=lambda dataset_id: (sign * ranks[dataset_id],
+                                            dataset_id)))
+            self._orders[(field, descending)] = order
+        return order
+
+    def select(self, query, sort_parameters=None, offset=0, limit=None):
+        """Return number of matches and the ids of the requested page.
+
+        Matches are ordered like the SQL search plugin orders them.
+        """
+        orders = []
+        if sort_parameters is not None:
+            orders = [(field, order == DESCENDING)
+                      for field, order in sort_parameters.order.items()
+                      if field in DatasetSchema.Meta.fields]
+
+        matched = self.match(query)
+        count = len(self.ids) if matched is None else len(matched)
+        end = count if limit is None else min(count, offset + limit)
+        if offset >= end:
+            return count, []
+
+        if len(orders) > 1 or (matched is not None
+                               and len(matched) * 16 < len(self.ids)):
+            # Few matches or several sort fields, sort the matches.
+            ranks = [(self._rank(field), -1 if descending else 1)
+                     for field, descending in orders]
+
+            def key(dataset_id):
+                return tuple(sign * rank[dataset_id]
+                             for rank, sign in ranks) + (dataset_id,)
+
+            ids = matched if matched is not None else self.ids.values()
+            return count, sorted(ids, key=key)[offset:end]
+
+        # Many matches, walk the presorted ids until the page is complete.
+        order = self._order(*orders[0]) if orders else self._order()
+        if matched is None:
+            return count, order[offset:end].tolist()
+        page = []
+        position = 0
+        for dataset_id in order:
+            if dataset_id in matched:
+                if position >= offset:
+                    page.append(dataset_id)
+                    if len(page) == end - offset:
+                        break
+                position += 1
+        return count, page
+
+    # Snapshots
+
+    def copy(self):
+        """Return copy of the index to save while this one changes.
+
+        Entries and documents are replaced on change, hence shared. Arrays
+        of ids are copied, views of a snapshot shared.
+        """
+        index = MemoryIndex()
+        index.entries = list(self.entries)
+        index.documents = self.documents.copy()
+        index.ids = dict(self.ids)
+        index.words = {key: ids[:] for key, ids in self.words.items()}
+        index.tags = {key: ids[:] for key, ids in self.tags.items()}
+        index.values = {
+            field: {key: ids[:] for key, ids in postings.items()}
+            for field, postings in self.values.items()}
+        index.max_dataset_id = self.max_dataset_id
+        index._free_ids = list(self._free_ids)
+        return index
+
+    def save(self, path):
+        """Write snapshot of the index to path atomically.
+
+        The JSON header holds the entries and the positions of the postings
+        within the array of ids following it. Readmes and annotations come
+        last, JSON encoded one by one, preceded by their offsets.
+        """
+        entries = []
+        for entry in self.entries:
+            if entry is not None:
+                entry = dict(entry)
+                for field in DATE_FIELDS:
+                    if entry[field] is not None:
+                        entry[field] = dtoolcore.utils.timestamp(entry[field])
+            entries.append(entry)
+
+        blob = array.array("I")
+        postings = {}
+        for name, index in [("words", self.words), ("tags", self.tags),
+                            *self.values.items()]:
+            postings[name] = {}
+            for key, ids in index.items():
+                postings[name][key] = [len(blob), len(ids)]
+                blob.frombytes(memoryview(ids).cast("B"))
+
+        documents = [self.documents.encoded(dataset_id)
+                     for dataset_id in range(len(self.documents))]
+        offsets = array.array("Q", [0])
+        for document in documents:
+            offsets.append(offsets[-1] + len(document))
+
+        # Sections in bytes relative to the end of the header, each aligned
+        # on 8 bytes.
+        postings_size = len(blob) * blob.itemsize
+        postings_padding = -postings_size % 8
+        offsets_start = postings_size + postings_padding
+        offsets_size = len(offsets) * offsets.itemsize
+        sections = {
+            "postings": [0, postings_size],
+            "document_offsets": [offsets_start, offsets_size],
+            "documents": [offsets_start + offsets_size, offsets[-1]],
+        }
+
+        header = json.dumps({
+            "version": SNAPSHOT_VERSION,
+            "byteorder": sys.byteorder,
+            "itemsize": blob.itemsize,
+            "max_dataset_id": self.max_dataset_id,
+            "entries": entries,
+            "postings": postings,
+            "sections": sections,
+        }).encode("utf-8")
+        # Pad the header to align the postings on 8 bytes.
+        header += b" " * (-(len(SNAPSHOT_MAGIC) + 8 + len(header)) % 8)
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(SNAPSHOT_MAGIC)
+                f.write(struct.pack("<Q", len(header)))
+                f.write(header)
+                blob.tofile(f)
+                f.write(b"\0" * postings_padding)
+                offsets.tofile(f)
+                for document in documents:
+                    f.write(document)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Return index read from snapshot at path.
+
+        Postings and documents are used in place from the memory-mapped
+        file, which stays mapped as long as the index refers to them.
+
+        :raises ValueError: if the file is no compatible snapshot.
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError("{} is no search snapshot".format(path))
+            start = len(SNAPSHOT_MAGIC) + 8
+            (header_size,) = struct.unpack(
+                "<Q", mapped[len(SNAPSHOT_MAGIC):start])
+            header = json.loads(mapped[start:start + header_size])
+            if (header.get("version") != SNAPSHOT_VERSION
+                    or header["byteorder"] != sys.byteorder
+                    or header["itemsize"] != array.array("I").itemsize):
+                raise ValueError("Incompatible search snapshot {}".format(path))
+            start += header_size
+            sections = header["sections"]
+            if any(start + offset + size > len(mapped)
+                   for offset, size in sections.values()):
+                raise ValueError("Truncated search snapshot {}".format(path))
+        except BaseException:
+            mapped.close()
+            raise
+
+        data = memoryview(mapped)[start:]
+
+        def section(name, fmt):
+            offset, size = sections[name]
+            return data[offset:offset + size].cast(fmt)
+
+        index = cls()
+        index.max_dataset_id = header["max_dataset_id"]
+        index.documents = _Documents(
+            section("document_offsets", "Q"), section("documents", "B"))
+        for dataset_id, entry in enumerate(header["entries"]):
+            if entry is None:
+                index._free_ids.append(dataset_id)
+            else:
+                for field in DATE_FIELDS:
+                    if entry[field] is not None:
+                        entry[field] = _naive_utc_from_timestamp(entry[field])
+                index.ids[entry["uri"]] = dataset_id
+            index.entries.append(entry)
+
+        blob = section("postings", "I")
+        targets = {"words": index.words, "tags": index.tags, **index.values}
+        for name, postings in header["postings"].items():
+            target = targets[name]
+            for key, (offset, length) in postings.items():
+                target[key] = blob[offset:offset + length]
+        return index
+
+
+class MemorySearch(SearchABC):
+    """Search plugin answering queries from in-process inverted indexes."""
+
+    optional_query_keys = frozenset(["uploaded_by", *RANGE_QUERY_KEYS])
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.RLock()
+        self._synced_at = 0.0
+        self._saved_at = 0.0
+        self._dirty = False
+        # Thread writing the latest snapshot and lock serializing writes.
+        self._saver = None
+        self._save_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.config = app.config
+
+    def get_config(self):
+        return dict()
+
+    def get_config_secrets_to_obfuscate(self):
+        return list()
+
+    @property
+    def _snapshot_path(self):
+        return self.config.get("MEMORY_SEARCH_SNAPSHOT")
+
+    # Loading and synchronization
+
+    def _index_datasets(self, datasets):
+        """Add rows of the dataset table along with retrieve plugin data."""
+        retrieve = current_app.retrieve
+        for chunk in _chunks(datasets, CHUNK_SIZE):
+            uris = [dataset.uri for dataset in chunk]
+            readmes = retrieve.get_readmes_by_uris(uris)
+            annotations = retrieve.get_annotations_by_uris(uris)
+            tags = retrieve.get_tags_by_uris(uris)
+            for dataset in chunk:
+                self._index.add(
+                    _entry_from_dataset(dataset, tags.get(dataset.uri) or []),
+                    readmes.get(dataset.uri),
+                    annotations.get(dataset.uri) or {})
+
+    def _sync(self):
+        """Catch up with datasets registered or deleted by other processes."""
+        index = self._index
+        count, max_dataset_id = db.session.execute(
+            select(func.count(Dataset.id), func.max(Dataset.id))).one()
+        max_dataset_id = max_dataset_id or 0
+
+        changed = False
+        if max_dataset_id > index.max_dataset_id:
+            self._index_datasets(
+                Dataset.query
+                .filter(Dataset.id > index.max_dataset_id)
+                .order_by(Dataset.id)
+                .all())
+            changed = True
+
+        if count != len(index):
+            rows = db.session.execute(select(Dataset.id, Dataset.uri)).all()
+            uris = {uri for _, uri in rows}
+            for uri in [uri for uri in index.ids if uri not in uris]:
+                index.remove(uri)
+            missing = [dataset_id for dataset_id, uri in rows
+                       if uri not in index]
+            if missing:
+                self._index_datasets(
+                    Dataset.query.filter(Dataset.id.in_(missing)).all())
+            changed = True
+
+        index.max_dataset_id = max_dataset_id
+        self._synced_at = time.monotonic()
+        if changed:
+            logger.debug("Synchronized in-memory search index, %d datasets",
+                         len(index))
+            self._dirty = True
+
+    def _load(self):
+        path = self._snapshot_path
+        if path is not None and os.path.exists(path):
+            try:
+                self._index = MemoryIndex.load(path)
+                logger.info("Loaded search snapshot %s with %d datasets",
+                            path, len(self._index))
+            except (OSError, ValueError, KeyError) as message:
+                logger.warning("Ignoring search snapshot %s: %s",
+                               path, message)
+
+        if self._index is None:
+            self._index = MemoryIndex()
+        self._sync()
+
+    def _ensure_loaded(self):
+        if self._index is None:
+            self._load()
+
+    def _ensure_current(self):
+        if self._index is None:
+            self._load()
+        elif (time.monotonic() - self._synced_at
+                >= self.config.get("MEMORY_SEARCH_SYNC_INTERVAL", 10)):
+            self._sync()
+        self._save_if_due()
+
+    def _modified(self):
+        self._dirty = True
+        self._save_if_due()
+
+    def _save_if_due(self):
+        """Save snapshot of a modified index in the background at most
+        every interval."""
+        path = self._snapshot_path
+        if path is None or not self._dirty:
+            return
+        if self._saver is not None and self._saver.is_alive():
+            return
+        interval = self.config.get("MEMORY_SEARCH_SNAPSHOT_INTERVAL", 60)
+        if time.monotonic() - self._saved_at >= interval:
+            self._saver = threading.Thread(
+                target=self._save_in_background,
+                args=(self._copy_for_saving(), path),
+                name="memory-search-snapshot", daemon=True)
+            self._saver.start()
+
+    def _copy_for_saving(self):
+        """Return copy of the index to be saved, call holding the lock."""
+        index = self._index.copy()
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        return index
+
+    def _save(self, index, path):
+        with self._save_lock:
+            index.save(path)
+
+    def _save_in_background(self, index, path):
+        try:
+            self._save(index, path)
+        except Exception:
+            logger.exception("Failed to save search snapshot %s", path)
+            with self._lock:
+                self._dirty = True
+
+    def save_snapshot(self, path=None):
+        """Write the up-to-date index to path or MEMORY_SEARCH_SNAPSHOT."""
+        with self._lock:
+            self._ensure_loaded()
+            self._sync()
+            index = self._copy_for_saving()
+        self._save(index, path or self._snapshot_path)
+
+    # Indexing
+
+    def register_dataset(self, dataset_info):
+        with self._lock:
+            self._ensure_loaded()
+            self._index.add(
+                _entry_from_dataset_info(dataset_info),
+                dataset_info.get("readme"),
+                dataset_info.get("annotations", {}))
+            self._modified()
+        return str(dataset_info["uuid"])
+
+    def delete_dataset(self, uri):
+        with self._lock:
+            self._ensure_loaded()
+            self._index.remove(uri)
+            self._modified()
+
+    def set_tags(self, uri, tags):
+        with self._lock:
+            self._ensure_loaded()
+            self._index.set_tags(uri, tags)
+            self._modified()
+
+    def update_tags_by_uris(self, uris, add_tags, remove_tags):
+        with self._lock:
+            self._ensure_loaded()
+            for uri in uris:
+                if uri in self._index:
+                    self._index.set_tags(uri, [
+                        tag for tag in self._index.get_tags(uri) + list(add_tags)
+                        if tag not in remove_tags])
+            self._modified()
+
+    def add_tags(self, uri, tags):
+        self.update_tags_by_uris([uri], tags, [])
+
+    def remove_tags(self, uri, tags):
+        self.update_tags_by_uris([uri], [], tags)
+
+    def set_annotations(self, uri, annotations):
+        with self._lock:
+            self._ensure_loaded()
+            self._index.update_document(uri, annotations=dict(annotations))
+            self._modified()
+
+    def update_annotations_by_uris(self, uris, set_annotations,
+                                   delete_annotations):
+        with self._lock:
+            self._ensure_loaded()
+            for uri in uris:
+                if uri not in self._index:
+                    continue
+                annotations = self._index.get_annotations(uri)
+                annotations.update(set_annotations)
+                for name in delete_annotations:
+                    annotations.pop(name, None)
+                self._index.update_document(uri, annotations=annotations)
+            self._modified()
+
+    def set_annotation(self, uri, name, value):
+        self.update_annotations_by_uris([uri], {name: value}, [])
+
+    def delete_annotation(self, uri, name):
+        self.update_annotations_by_uris([uri], {}, [name])
+
+    def set_readme(self, uri, readme):
+        with self._lock:
+            self._ensure_loaded()
+            self._index.update_document(uri, readme=readme)
+            self._modified()
+
+    # Searching
+
+    def facets(self, query, fields):
+        with self._lock:
+            self._ensure_current()
+            return self._index.facets(query, fields)
+
+    def search(self, query: SearchDatasetSchema,
+               pagination_parameters: PaginationParameters = None,
+               sort_parameters: SortParameters = None) -> DatasetSchema(many=True):
+
+        # Deal with edge case where a user has no access to any base URIs.
+        if len(query.get("base_uris", [])) == 0:
+            return []
+
+        with self._lock:
+            self._ensure_current()
+            index = self._index
+            offset, limit = 0, None
+            if pagination_parameters is not None:
+                offset = ((pagination_parameters.page - 1)
+                          * pagination_parameters.page_size)
+                limit = pagination_parameters.page_size
+            count, ids = index.select(query, sort_parameters, offset, limit)
+            if pagination_parameters is not None:
+                pagination_parameters.item_count = count
+
+            return [dict(index.entries[dataset_id],
+                         tags=list(index.entries[dataset_id]["tags"]))
+                    for dataset_id in ids]
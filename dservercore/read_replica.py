@@ -0,0 +1,58 @@
+"""Routing of read-only queries to a read replica
+
+Most requests only read from the SQL database. If a read replica is
+configured, either via ``SQLALCHEMY_READ_REPLICA_URI`` or as the
+``read_replica`` bind in ``SQLALCHEMY_BINDS``, the read-only helpers of
+:mod:`dservercore.utils`, marked with :func:`read_replica`, query the replica
+instead of the primary database.
+
+Writes always go to the primary. Once a session has flushed any changes,
+all its further queries go to the primary as well, hence a request reads
+its own writes. Requests reading right after another request has written
+may see the replica lag behind.
+"""
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+
+
+READ_REPLICA_BIND_KEY = "read_replica"
+
+
+class RoutingSession(Session):
+    """Session sending queries within :func:`read_replica` to the replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None
+                and self.info.get("read_replica", 0) > 0
+                and not self.info.get("wrote", False)
+                and not self._flushing
+                and not isinstance(clause, sa.UpdateBase)):
+            engine = self._db.engines.get(READ_REPLICA_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind,
+                                **kwargs)
+
+
+@sa.event.listens_for(RoutingSession, "after_flush")
+def _stick_to_primary(session, flush_context):
+    session.info["wrote"] = True
+
+
+@contextmanager
+def read_replica():
+    """Send the queries of the current session to the read replica.
+
+    Usable as decorator of read-only helper functions. Without replica
+    configured, queries go to the primary database as usual.
+    """
+    info = current_app.extensions["sqlalchemy"].session.info
+    info["read_replica"] = info.get("read_replica", 0) + 1
+    try:
+        yield
+    finally:
+        info["read_replica"] -= 1
@@ -12,17 +12,47 @@ from dservercore.utils_auth import (
 
 from dservercore import AuthorizationError, UnknownURIError
 from dservercore.blueprint import Blueprint
-from dservercore.schemas import ReadmeSchema, ReadmeRequestSchema
+from dservercore.schemas import (
+    ReadmeSchema,
+    ReadmeRequestSchema,
+    ReadmesByURISchema,
+    URIListSchema,
+)
 import dservercore.utils_auth
 from dservercore.utils import (
     url_suffix_to_uri,
     get_readme_from_uri_by_user,
+    get_readmes_from_uris_by_user,
     set_readme_for_uri_by_user,
 )
 
 bp = Blueprint("readmes", __name__, url_prefix="/readmes")
 
 
+@bp.route("/batch", methods=["POST"])
+@bp.arguments(URIListSchema)
+@bp.response(200, ReadmesByURISchema)
+@bp.alt_response(400, description="Too many URIs")
+@bp.alt_response(401, description="Unauthorized")
+@jwt_required()
+def readmes_batch(data):
+    """Request the readmes of many datasets at once.
+
+    URIs the user has no permissions on or that are unknown are omitted.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        abort(401)
+
+    if len(data["uris"]) > current_app.config.get("MAX_BATCH_SIZE", 1000):
+        abort(400, "Too many URIs in batch request.")
+
+    uris = [url_suffix_to_uri(uri) for uri in data["uris"]]
+    readmes = get_readmes_from_uris_by_user(username, uris)
+
+    return {"readmes": readmes}
+
+
 @bp.route("/<path:uri>", methods=["GET"])
 @bp.response(200, ReadmeSchema)
 @bp.alt_response(401, description="Not registered")
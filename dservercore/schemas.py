@@ -1,5 +1,8 @@
 """marshmallow schema for (de-) serialization and validation"""
-from marshmallow import Schema
+import math
+
+from marshmallow import Schema, ValidationError, validates_schema
+from marshmallow.validate import OneOf, Range
 from marshmallow.fields import (
     String,
     UUID,
@@ -11,6 +14,9 @@ from marshmallow.fields import (
     Float,
     Raw
 )
+from webargs.fields import DelimitedList
+
+from dservercore.date_utils import _naive_utc_from_timestamp
 
 
 class UUIDString(UUID):
@@ -38,6 +44,18 @@ class VersionSchema(Schema):
     versions = Dict(keys=String(), values=String())
 
 
+class DatabasePoolSchema(Schema):
+    bind = String(allow_none=True)
+    pool = String()
+    size = Integer(allow_none=True)
+    checked_out = Integer(allow_none=True)
+    overflow = Integer(allow_none=True)
+    checkouts = Integer()
+    checkout_wait_total = Float()
+    checkout_wait_max = Float()
+    checkout_wait_buckets = Dict(keys=String(), values=Integer())
+
+
 class ItemSchema(Schema):
     hash = String()
     relpath = String()
@@ -59,6 +77,91 @@ class ManifestSchema(Schema):
     dtoolcore_version = String()
 
 
+_MANIFEST_KEYS = frozenset(ManifestSchema().fields)
+_ITEM_KEYS = frozenset(ItemSchema().fields)
+
+
+def _fast_load_manifest(manifest):
+    """Return loaded manifest, or None if the fast path does not apply.
+
+    Validating a manifest via Nested(ManifestSchema) runs a full
+    ItemSchema load per item, which dominates registration time for
+    manifests with millions of items. Here, items that already carry
+    plain JSON types are checked in a tight loop and passed through as
+    they are. Items needing type coercion, e.g. a size given as string,
+    are loaded with ItemSchema individually. None is returned as soon as
+    anything does not validate, leaving error reporting to marshmallow.
+    """
+    if type(manifest) is not dict or not manifest.keys() <= _MANIFEST_KEYS:
+        return None
+
+    for key in ("hash_function", "dtoolcore_version"):
+        if key in manifest and type(manifest[key]) is not str:
+            return None
+
+    if "items" not in manifest:
+        return dict(manifest)
+
+    items = manifest["items"]
+    if type(items) is not dict:
+        return None
+
+    item_keys = _ITEM_KEYS
+    isfinite = math.isfinite
+    item_schema = None
+    loaded_items = {}
+    for identifier, item in items.items():
+        if (type(identifier) is str
+                and type(item) is dict
+                and item.keys() <= item_keys
+                and type(item.get("hash", "")) is str
+                and type(item.get("relpath", "")) is str
+                and type(item.get("size_in_bytes", 0)) is int
+                and type(item.get("utc_timestamp", 0.0)) is float
+                and isfinite(item.get("utc_timestamp", 0.0))):
+            loaded_items[identifier] = item
+            continue
+
+        if type(identifier) is not str:
+            return None
+        if item_schema is None:
+            item_schema = ItemSchema()
+        try:
+            loaded_items[identifier] = item_schema.load(item)
+        except ValidationError:
+            return None
+
+    loaded = dict(manifest)
+    loaded["items"] = loaded_items
+    return loaded
+
+
+class ManifestField(Nested):
+    """Nested(ManifestSchema) field with a fast path for large manifests.
+
+    Valid manifests are loaded by :func:`_fast_load_manifest`. Anything
+    else falls back to the regular nested schema load, hence validation
+    errors are reported exactly as by Nested(ManifestSchema).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(ManifestSchema, **kwargs)
+
+    def _deserialize(self, value, attr, data, partial=None, **kwargs):
+        loaded = _fast_load_manifest(value)
+        if loaded is not None:
+            return loaded
+        return super()._deserialize(value, attr, data, partial=partial, **kwargs)
+
+
+def load_manifest(manifest):
+    """Validate and load a manifest.
+
+    :raises marshmallow.ValidationError: if the manifest is invalid.
+    """
+    return ManifestField().deserialize(manifest)
+
+
 # Define a schema for the response
 class AnnotationSchema(Schema):
     annotations = Dict(keys=String(), values=Raw())
@@ -72,6 +175,73 @@ class TagSchema(Schema):
     tags = List(String())
 
 
+class ManifestRangeSchema(Schema):
+    offset = Integer(validate=Range(min=0), load_default=0)
+    limit = Integer(validate=Range(min=1), load_default=None)
+
+
+class ManifestSummarySchema(Schema):
+    hash_function = String()
+    dtoolcore_version = String()
+    number_of_items = Integer()
+    size_in_bytes = Integer()
+
+
+DATASET_INCLUDE_FIELDS = [
+    "annotations",
+    "manifest_summary",
+    "readme",
+    "tags",
+]
+
+
+class DatasetIncludeSchema(Schema):
+    include = DelimitedList(
+        String(validate=OneOf(DATASET_INCLUDE_FIELDS)), load_default=[])
+
+
+FACET_FIELDS = [
+    "base_uri",
+    "creator_username",
+    "tags",
+    "uploaded_by",
+]
+
+
+class FacetsSchema(Schema):
+    facets = DelimitedList(
+        String(validate=OneOf(FACET_FIELDS)), load_default=[])
+
+
+class URIListSchema(Schema):
+    uris = List(String(), required=True)
+
+
+class UUIDListSchema(Schema):
+    uuids = List(UUIDString(), required=True)
+
+
+class ReadmesByURISchema(Schema):
+    readmes = Dict(keys=String(), values=String())
+
+
+class AnnotationsByURISchema(Schema):
+    annotations = Dict(keys=String(), values=Dict(keys=String(), values=Raw()))
+
+
+class TagsByURISchema(Schema):
+    tags = Dict(keys=String(), values=List(String()))
+
+
+class StorageWriteQuerySchema(Schema):
+    status = String(validate=OneOf(["pending", "processing", "failed"]))
+
+
+class ChangesQuerySchema(Schema):
+    since = Integer(validate=Range(min=0), load_default=0)
+    limit = Integer(validate=Range(min=1), load_default=None)
+
+
 class RegisterDatasetSchema(Schema):
     uuid = UUIDString()
     base_uri = String()
@@ -80,7 +250,7 @@ class RegisterDatasetSchema(Schema):
     name = String()
     type = String()
     readme = String()
-    manifest = Nested(ManifestSchema)
+    manifest = ManifestField()
     creator_username = String()
     frozen_at = String()
     created_at = String()
@@ -90,6 +260,41 @@ class RegisterDatasetSchema(Schema):
     size_in_bytes = Integer()
 
 
+# Dataset fields searchable by range via the <field>_min and <field>_max
+# query keys, bounds included. Dates are given as timestamps.
+DATE_RANGE_FIELDS = ["created_at", "frozen_at", "uploaded_at"]
+NUMBER_RANGE_FIELDS = ["number_of_items", "size_in_bytes"]
+RANGE_QUERY_KEYS = [
+    field + suffix
+    for field in DATE_RANGE_FIELDS + NUMBER_RANGE_FIELDS
+    for suffix in ("_min", "_max")
+]
+
+# Timestamps of the dates representable in Python, years 1 to 9999 UTC.
+MIN_TIMESTAMP = -62135596800.0
+MAX_TIMESTAMP = 253402300799.0
+TIMESTAMP_RANGE = Range(min=MIN_TIMESTAMP, max=MAX_TIMESTAMP)
+# Largest integer the SQL database stores.
+MAX_BIGINT = 2**63 - 1
+
+
+def range_filters(query):
+    """Return list of (field, lower, upper) ranges of a search query.
+
+    Missing bounds are None, dates are converted to naive UTC datetimes.
+    """
+    ranges = []
+    for field in DATE_RANGE_FIELDS + NUMBER_RANGE_FIELDS:
+        bounds = [query.get(field + suffix) for suffix in ("_min", "_max")]
+        if bounds == [None, None]:
+            continue
+        if field in DATE_RANGE_FIELDS:
+            bounds = [None if bound is None else _naive_utc_from_timestamp(bound)
+                      for bound in bounds]
+        ranges.append((field, *bounds))
+    return ranges
+
+
 class SearchDatasetSchema(Schema):
     free_text = String()
     creator_usernames = List(String)
@@ -97,6 +302,42 @@ class SearchDatasetSchema(Schema):
     uuids = List(UUIDString)
     tags = List(String)
     uploaded_by = List(String)
+    created_at_min = Float(validate=TIMESTAMP_RANGE)
+    created_at_max = Float(validate=TIMESTAMP_RANGE)
+    frozen_at_min = Float(validate=TIMESTAMP_RANGE)
+    frozen_at_max = Float(validate=TIMESTAMP_RANGE)
+    uploaded_at_min = Float(validate=TIMESTAMP_RANGE)
+    uploaded_at_max = Float(validate=TIMESTAMP_RANGE)
+    number_of_items_min = Integer(validate=Range(min=0, max=MAX_BIGINT))
+    number_of_items_max = Integer(validate=Range(min=0, max=MAX_BIGINT))
+    size_in_bytes_min = Integer(validate=Range(min=0, max=MAX_BIGINT))
+    size_in_bytes_max = Integer(validate=Range(min=0, max=MAX_BIGINT))
+
+
+class _BulkUpdateSchema(Schema):
+    uris = List(String())
+    query = Nested(SearchDatasetSchema)
+
+    @validates_schema
+    def validate_targets(self, data, **kwargs):
+        if ("uris" in data) == ("query" in data):
+            raise ValidationError("Specify either 'uris' or 'query'.")
+
+
+class BulkTagsSchema(_BulkUpdateSchema):
+    add = List(String(), load_default=[])
+    remove = List(String(), load_default=[])
+
+
+class BulkAnnotationsSchema(_BulkUpdateSchema):
+    set = Dict(keys=String(), values=Raw(), load_default={})
+    delete = List(String(), load_default=[])
+
+
+class BulkUpdateResultSchema(Schema):
+    updated = List(String())
+    forbidden = List(String())
+    not_found = List(String())
 
 
 class SummarySchema(Schema):
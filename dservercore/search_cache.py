@@ -0,0 +1,83 @@
+"""Cache of search results
+
+A handful of queries, e.g. the default listing of all datasets or the
+datasets of a popular tag, make up most searches. The :class:`SearchResultCache`
+keeps the results of recent searches keyed on the query after the user's
+permissions have been applied, hence users with access to the same base URIs
+share entries, and on the requested sort order and page.
+
+Every registration, deletion or metadata update increments the cache's
+generation and thereby discards all entries. The generation is local to a
+worker process, changes made via other workers only show after
+``SEARCH_CACHE_TTL`` seconds.
+"""
+import threading
+import time
+
+from collections import OrderedDict
+
+
+def _canonical(value):
+    """Return a hashable form of a query value independent of list order."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted({str(item) for item in value}))
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+class SearchResultCache:
+    """Thread-safe LRU cache of search results with time-to-live."""
+
+    def __init__(self):
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query, pagination_parameters=None, sort_parameters=None):
+        """Return the cache key of a preprocessed query."""
+        page = None
+        if pagination_parameters is not None:
+            page = (pagination_parameters.page, pagination_parameters.page_size)
+        order = None
+        if sort_parameters is not None:
+            order = tuple(sort_parameters.order.items())
+        return (_canonical(query), page, order)
+
+    def get(self, key, ttl):
+        """Return (hits, item_count) cached under key or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            generation, created_at, hits, item_count = entry
+            if generation != self.generation or now - created_at >= ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return [dict(hit) for hit in hits], item_count
+
+    def put(self, key, generation, hits, item_count, maxsize):
+        """Cache hits computed while the cache was at generation."""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (
+                generation, time.monotonic(),
+                [dict(hit) for hit in hits], item_count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Discard all entries."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,30 @@
+"""Text of datasets matched by free text queries of the built-in search plugins.
+
+Both the SQL and the in-memory search plugin match ``free_text`` queries
+against the dataset's name, readme and annotations, as extracted here.
+"""
+
+
+def text_fragments(value):
+    """Yield all keys and scalar values within a JSON-like structure."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield str(key)
+            yield from text_fragments(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from text_fragments(item)
+    elif value is not None:
+        yield str(value)
+
+
+def readme_as_string(readme):
+    """Return readme as string, flattening readmes parsed from YAML."""
+    if readme is None or isinstance(readme, str):
+        return readme
+    return "\n".join(text_fragments(readme))
+
+
+def dataset_fulltext(name, readme, annotations):
+    """Return text free text queries are matched against."""
+    return "\n".join(text_fragments([name, readme, annotations]))
@@ -0,0 +1,187 @@
+"""SQL engine options, SQLite pragmas and connection pool metrics
+
+The ``SQLALCHEMY_POOL_*`` and ``SQLALCHEMY_MAX_OVERFLOW`` parameters of
+:class:`dservercore.config.Config` size the connection pools of the primary
+database and the read replica, see :func:`engine_options`. Options given
+explicitly in ``SQLALCHEMY_ENGINE_OPTIONS`` or ``SQLALCHEMY_BINDS`` take
+precedence.
+
+File-based SQLite databases get the pragmas configured by the ``SQLITE_*``
+parameters on every new connection, by default write-ahead logging, which
+lets readers proceed while a writer commits, ``synchronous=NORMAL``, a busy
+timeout instead of failing right away with "database is locked", and
+memory-mapped reads.
+
+Pools record how long obtaining a connection takes, see
+:class:`PoolMetrics`, exposed via ``GET /config/database-pools``.
+"""
+import bisect
+import threading
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+
+
+SQLITE_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+# Upper bounds in seconds of the checkout wait histogram buckets.
+CHECKOUT_WAIT_BUCKETS = [0.001, 0.01, 0.1, 1.0, 10.0]
+
+
+class PoolMetrics:
+    """Thread-safe statistics of connection checkout wait times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.buckets = [0] * (len(CHECKOUT_WAIT_BUCKETS) + 1)
+
+    def record(self, wait):
+        """Record a checkout that took wait seconds."""
+        bucket = bisect.bisect_left(CHECKOUT_WAIT_BUCKETS, wait)
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.buckets[bucket] += 1
+
+    def as_dict(self):
+        with self._lock:
+            counts = list(self.buckets)
+            summary = {
+                "checkouts": self.checkouts,
+                "checkout_wait_total": self.wait_total,
+                "checkout_wait_max": self.wait_max,
+            }
+        # Cumulative counts per upper bound as in Prometheus histograms.
+        bounds = [str(bound) for bound in CHECKOUT_WAIT_BUCKETS] + ["+Inf"]
+        cumulative, total = {}, 0
+        for bound, count in zip(bounds, counts):
+            total += count
+            cumulative[bound] = total
+        summary["checkout_wait_buckets"] = cumulative
+        return summary
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool recording checkout wait times in :class:`PoolMetrics`."""
+
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics if metrics is not None else PoolMetrics()
+
+    def recreate(self):
+        # Engine.dispose() replaces the pool, keep counting.
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.metrics.record(time.perf_counter() - start)
+
+
+def _is_sqlite(url):
+    return url.get_backend_name() == "sqlite"
+
+
+def _is_sqlite_memory(url):
+    return _is_sqlite(url) and url.database in {None, "", ":memory:"}
+
+
+def engine_options(config, uri):
+    """Return engine options for the database at uri derived from config.
+
+    In-memory SQLite databases share a single connection, hence their pool
+    is not sized or metered.
+    """
+    url = sa.engine.make_url(uri)
+    options = {}
+    if config.get("SQLALCHEMY_POOL_PRE_PING"):
+        options["pool_pre_ping"] = True
+    if config.get("SQLALCHEMY_POOL_RECYCLE", -1) >= 0:
+        options["pool_recycle"] = config["SQLALCHEMY_POOL_RECYCLE"]
+    if _is_sqlite_memory(url):
+        return options
+
+    options["poolclass"] = MeteredQueuePool
+    for key, option in [("SQLALCHEMY_POOL_SIZE", "pool_size"),
+                        ("SQLALCHEMY_MAX_OVERFLOW", "max_overflow"),
+                        ("SQLALCHEMY_POOL_TIMEOUT", "pool_timeout")]:
+        if config.get(key) is not None:
+            options[option] = config[key]
+    return options
+
+
+def _sqlite_pragmas(config):
+    """Return list of PRAGMA statements configured by the SQLITE_* parameters.
+
+    Raises ValueError on invalid parameters.
+    """
+    pragmas = []
+
+    journal_mode = config.get("SQLITE_JOURNAL_MODE")
+    if journal_mode:
+        if journal_mode.upper() not in SQLITE_JOURNAL_MODES:
+            raise ValueError(
+                "Invalid SQLITE_JOURNAL_MODE: {}".format(journal_mode))
+        pragmas.append("PRAGMA journal_mode={}".format(journal_mode.upper()))
+
+    synchronous = config.get("SQLITE_SYNCHRONOUS")
+    if synchronous:
+        if synchronous.upper() not in SQLITE_SYNCHRONOUS_MODES:
+            raise ValueError(
+                "Invalid SQLITE_SYNCHRONOUS: {}".format(synchronous))
+        pragmas.append("PRAGMA synchronous={}".format(synchronous.upper()))
+
+    for key, pragma in [("SQLITE_BUSY_TIMEOUT", "busy_timeout"),
+                        ("SQLITE_MMAP_SIZE", "mmap_size")]:
+        if config.get(key) is not None:
+            pragmas.append("PRAGMA {}={:d}".format(pragma, int(config[key])))
+
+    return pragmas
+
+
+def init_engine(engine, config):
+    """Apply the SQLITE_* pragmas to new connections of file-based SQLite
+    engines."""
+    if not _is_sqlite(engine.url) or _is_sqlite_memory(engine.url):
+        return
+
+    pragmas = _sqlite_pragmas(config)
+    if len(pragmas) == 0:
+        return
+
+    @sa.event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def pool_status(engine):
+    """Return dictionary describing the connection pool of engine."""
+    pool = engine.pool
+    status = {
+        "pool": type(pool).__name__,
+        "size": None,
+        "checked_out": None,
+        "overflow": None,
+    }
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(),
+                      overflow=max(pool.overflow(), 0))
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.as_dict())
+    return status
@@ -4,6 +4,7 @@ from marshmallow import fields, pre_dump
 import dtoolcore.utils
 from dservercore import ma
 from dservercore import sql_db as db
+from dservercore.schemas import ManifestSummarySchema
 
 search_permissions = db.Table(
     "search_permissions",
@@ -11,6 +12,8 @@ search_permissions = db.Table(
     db.Column(
         "base_uri_id", db.Integer, db.ForeignKey("base_uri.id"), primary_key=True
     ),
+    # The primary key serves lookups by user, this index lookups by base URI.
+    db.Index("ix_search_permissions_base_uri_id_user_id", "base_uri_id", "user_id"),
 )
 
 register_permissions = db.Table(
@@ -19,6 +22,8 @@ register_permissions = db.Table(
     db.Column(
         "base_uri_id", db.Integer, db.ForeignKey("base_uri.id"), primary_key=True
     ),
+    # The primary key serves lookups by user, this index lookups by base URI.
+    db.Index("ix_register_permissions_base_uri_id_user_id", "base_uri_id", "user_id"),
 )
 
 
@@ -101,7 +106,29 @@ class BaseURI(db.Model):
 # How long can a URI be?
 # How long can a dataset name be?
 #   => dtool-create enforces names that are max 80 chars
+# Sortable dataset fields backed by (base_uri_id, field, id) indexes, hence
+# deep pages of the datasets in a base URI sorted by them need no full sort.
+# The same indexes answer range filters on these fields, as datasets are
+# always listed by base URI.
+DATASET_SORT_INDEXED_FIELDS = [
+    "created_at",
+    "frozen_at",
+    "number_of_items",
+    "size_in_bytes",
+    "uploaded_at",
+]
+
+
 class Dataset(db.Model):
+    __table_args__ = (
+        # Listings of the datasets in the base URIs a user may search,
+        # sorted by URI by default.
+        db.Index("ix_dataset_base_uri_id_uri", "base_uri_id", "uri"),
+    ) + tuple(
+        db.Index("ix_dataset_base_uri_id_{}_id".format(field),
+                 "base_uri_id", field, "id")
+        for field in DATASET_SORT_INDEXED_FIELDS
+    )
     id = db.Column(db.Integer, primary_key=True)
     base_uri_id = db.Column(db.Integer, db.ForeignKey("base_uri.id"), nullable=False)
     uri = db.Column(db.String(1024), index=True, unique=True, nullable=False)
@@ -142,6 +169,55 @@ class Dataset(db.Model):
         }
 
 
+class StorageWrite(db.Model):
+    """Pending metadata update of a dataset in its storage backend.
+
+    Entries are written by the request handlers and drained by the
+    background workers of :class:`dservercore.storage_writes.StorageWriteQueue`.
+    """
+    __tablename__ = "storage_write"
+    id = db.Column(db.Integer, primary_key=True)
+    uri = db.Column(db.String(1024), index=True, nullable=False)
+    # One of "tags", "tag_delta", "annotations", "annotation_delta", "readme"
+    kind = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # One of "pending", "processing", "failed"
+    status = db.Column(db.String(16), index=True, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(), nullable=False)
+    updated_at = db.Column(db.DateTime(), nullable=False)
+    next_attempt_at = db.Column(db.DateTime(), index=True, nullable=False)
+
+    def __repr__(self):
+        return "<StorageWrite {} {} {}>".format(self.kind, self.uri, self.status)
+
+
+class Change(db.Model):
+    """Entry of the change log of registrations, deletions and metadata
+    updates, in the order of its monotonic sequence number.
+
+    Clients synchronize incrementally by asking for all changes after the
+    last sequence number they have seen.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        db.Index("ix_change_log_base_uri_seq", "base_uri", "seq"),
+        # Never reuse sequence numbers.
+        {"sqlite_autoincrement": True},
+    )
+    seq = db.Column(db.Integer, primary_key=True)
+    uri = db.Column(db.String(1024), index=True, nullable=False)
+    uuid = db.Column(db.String(36), nullable=True)
+    base_uri = db.Column(db.String(1024), nullable=False)
+    # One of "register", "delete", "tags", "annotations", "readme"
+    kind = db.Column(db.String(32), nullable=False)
+    changed_at = db.Column(db.DateTime(), nullable=False)
+
+    def __repr__(self):
+        return "<Change {} {} {}>".format(self.seq, self.kind, self.uri)
+
+
 class BaseURISchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = BaseURI
@@ -224,3 +300,44 @@ class DatasetSchema(ma.SQLAlchemyAutoSchema):
             return obj.base_uri.base_uri
         elif isinstance(obj, dict):
             return obj["base_uri"]
+
+
+class DatasetWithDetailsSchema(DatasetSchema):
+    """Dataset entry optionally expanded by content from the retrieve plugin.
+
+    Expanded fields absent from the serialized object are omitted.
+    """
+    class Meta(DatasetSchema.Meta):
+        fields = DatasetSchema.Meta.fields + (
+            'annotations',
+            'manifest_summary',
+            'readme',
+            'tags')
+
+    annotations = fields.Dict(keys=fields.String(), values=fields.Raw())
+    manifest_summary = fields.Nested(ManifestSummarySchema)
+    readme = fields.String()
+    tags = fields.List(fields.String())
+
+
+class DatasetsByUUIDSchema(ma.Schema):
+    datasets = fields.Dict(
+        keys=fields.String(),
+        values=fields.List(fields.Nested(DatasetSchema)))
+
+
+class StorageWriteSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = StorageWrite
+        exclude = ("payload",)
+
+    created_at = FloatDateTimeField()
+    updated_at = FloatDateTimeField()
+    next_attempt_at = FloatDateTimeField()
+
+
+class ChangeSchema(ma.SQLAlchemyAutoSchema):
+    class Meta:
+        model = Change
+
+    changed_at = FloatDateTimeField()
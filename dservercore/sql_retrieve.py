@@ -0,0 +1,313 @@
+"""Built-in retrieve plugin on top of the dserver SQL database
+
+Used whenever no other ``dservercore.retrieve`` plugin is installed, hence
+small deployments do not need to run a dedicated document database.
+
+Readmes, annotations and tags live in the ``retrieve_dataset`` table.
+Manifests are stored apart in ``retrieve_manifest``, their items split into
+chunks of ``RETRIEVE_SQL_MANIFEST_CHUNK_SIZE`` items, each compressed with
+zstd if the optional ``zstandard`` package is installed or gzip otherwise.
+Range reads of manifest items only decompress the chunks concerned.
+
+Copies of a dataset in several base URIs share the same UUID and usually
+the same manifest. Identical manifests of the same UUID are stored once.
+"""
+import hashlib
+import json
+import logging
+
+from dservercore import RetrieveABC, UnknownURIError, sql_db as db
+from dservercore.compression import compress, decompress, zstandard
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetrieveManifest(db.Model):
+    """Manifest shared by all datasets of the same UUID with same content."""
+    __tablename__ = "retrieve_manifest"
+    id = db.Column(db.Integer, primary_key=True)
+    uuid = db.Column(db.String(36), nullable=False)
+    # SHA-256 of the canonical JSON representation of the manifest
+    digest = db.Column(db.String(64), nullable=False)
+    hash_function = db.Column(db.String(255), nullable=True)
+    dtoolcore_version = db.Column(db.String(255), nullable=True)
+    number_of_items = db.Column(db.Integer, nullable=False)
+    size_in_bytes = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    # Compression of the chunks, "zstd" or "gzip"
+    encoding = db.Column(db.String(16), nullable=False)
+    chunks = db.relationship(
+        "RetrieveManifestChunk", cascade="all, delete-orphan",
+        order_by="RetrieveManifestChunk.position")
+
+    __table_args__ = (
+        db.UniqueConstraint("uuid", "digest"),
+    )
+
+    def __repr__(self):
+        return "<RetrieveManifest {} {}>".format(self.uuid, self.digest)
+
+
+class RetrieveManifestChunk(db.Model):
+    """Compressed JSON list of [identifier, properties] manifest items."""
+    __tablename__ = "retrieve_manifest_chunk"
+    manifest_id = db.Column(
+        db.Integer, db.ForeignKey("retrieve_manifest.id", ondelete="CASCADE"),
+        primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+
+class RetrieveDataset(db.Model):
+    """Descriptive metadata of a dataset served by the SQL retrieve plugin."""
+    __tablename__ = "retrieve_dataset"
+    id = db.Column(db.Integer, primary_key=True)
+    uri = db.Column(db.String(1024), index=True, unique=True, nullable=False)
+    uuid = db.Column(db.String(36), index=True, nullable=False)
+    readme = db.Column(db.Text, nullable=True)
+    annotations = db.Column(db.JSON, nullable=False, default=dict)
+    tags = db.Column(db.JSON, nullable=False, default=list)
+    manifest_id = db.Column(
+        db.Integer, db.ForeignKey("retrieve_manifest.id"), index=True,
+        nullable=True)
+    manifest = db.relationship("RetrieveManifest")
+
+    def __repr__(self):
+        return "<RetrieveDataset {}>".format(self.uri)
+
+
+def _dumps(obj):
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _manifest_digest(manifest):
+    return hashlib.sha256(_dumps(manifest)).hexdigest()
+
+
+class SQLRetrieve(RetrieveABC):
+    """Retrieve plugin storing dataset metadata in the dserver SQL database."""
+
+    def init_app(self, app):
+        self.config = app.config
+
+    @property
+    def _chunk_size(self):
+        return self.config.get("RETRIEVE_SQL_MANIFEST_CHUNK_SIZE", 1000)
+
+    @property
+    def _encoding(self):
+        return "zstd" if zstandard is not None else "gzip"
+
+    def _level(self, encoding):
+        if encoding == "zstd":
+            return self.config.get("RETRIEVE_SQL_ZSTD_LEVEL", 9)
+        return self.config.get("RETRIEVE_SQL_GZIP_LEVEL", 9)
+
+    def get_config(self):
+        return dict()
+
+    def get_config_secrets_to_obfuscate(self):
+        return list()
+
+    # Manifest storage
+
+    def _get_or_create_manifest(self, uuid, manifest):
+        digest = _manifest_digest(manifest)
+        stored = RetrieveManifest.query.filter_by(
+            uuid=uuid, digest=digest).first()
+        if stored is not None:
+            return stored
+
+        items = list(manifest.get("items", {}).items())
+        chunk_size = self._chunk_size
+        encoding = self._encoding
+        level = self._level(encoding)
+
+        stored = RetrieveManifest(
+            uuid=uuid,
+            digest=digest,
+            hash_function=manifest.get("hash_function"),
+            dtoolcore_version=manifest.get("dtoolcore_version"),
+            number_of_items=len(items),
+            size_in_bytes=sum(
+                properties.get("size_in_bytes", 0) for _, properties in items),
+            chunk_size=chunk_size,
+            encoding=encoding,
+        )
+        stored.chunks = [
+            RetrieveManifestChunk(
+                position=position,
+                data=compress(_dumps(items[start:start + chunk_size]),
+                              encoding, level))
+            for position, start in enumerate(range(0, len(items), chunk_size))
+        ]
+        db.session.add(stored)
+        return stored
+
+    def _delete_manifest_if_unused(self, manifest):
+        if manifest is None:
+            return
+        in_use = RetrieveDataset.query.filter_by(
+            manifest_id=manifest.id).first()
+        if in_use is None:
+            db.session.delete(manifest)
+
+    def _items(self, manifest, chunks):
+        items = []
+        for chunk in chunks:
+            items.extend(json.loads(decompress(chunk.data, manifest.encoding)))
+        return items
+
+    # Registration
+
+    def _get_entry(self, uri):
+        entry = RetrieveDataset.query.filter_by(uri=uri).first()
+        if entry is None:
+            raise (UnknownURIError())
+        return entry
+
+    def register_dataset(self, dataset_info):
+        uri = dataset_info["uri"]
+        uuid = str(dataset_info["uuid"])
+
+        entry = RetrieveDataset.query.filter_by(uri=uri).first()
+        if entry is None:
+            entry = RetrieveDataset(uri=uri)
+            db.session.add(entry)
+
+        previous_manifest = entry.manifest
+        entry.uuid = uuid
+        entry.readme = dataset_info.get("readme")
+        entry.annotations = dict(dataset_info.get("annotations", {}))
+        entry.tags = list(dataset_info.get("tags", []))
+        entry.manifest = self._get_or_create_manifest(
+            uuid, dataset_info.get("manifest") or {})
+        db.session.flush()
+
+        if previous_manifest is not entry.manifest:
+            self._delete_manifest_if_unused(previous_manifest)
+
+        db.session.commit()
+        return uuid
+
+    def delete_dataset(self, uri):
+        entry = RetrieveDataset.query.filter_by(uri=uri).first()
+        if entry is None:
+            return
+        manifest = entry.manifest
+        db.session.delete(entry)
+        db.session.flush()
+        self._delete_manifest_if_unused(manifest)
+        db.session.commit()
+
+    # Retrieval
+
+    def get_readme(self, uri):
+        return self._get_entry(uri).readme
+
+    def get_annotations(self, uri):
+        return self._get_entry(uri).annotations
+
+    def get_tags(self, uri):
+        return self._get_entry(uri).tags
+
+    def get_manifest(self, uri):
+        manifest = self._get_entry(uri).manifest
+        return {
+            "hash_function": manifest.hash_function,
+            "dtoolcore_version": manifest.dtoolcore_version,
+            "items": dict(self._items(manifest, manifest.chunks)),
+        }
+
+    def get_manifest_summary(self, uri):
+        manifest = self._get_entry(uri).manifest
+        return {
+            "hash_function": manifest.hash_function,
+            "dtoolcore_version": manifest.dtoolcore_version,
+            "number_of_items": manifest.number_of_items,
+            "size_in_bytes": manifest.size_in_bytes,
+        }
+
+    def get_manifest_items(self, uri, offset=0, limit=None):
+        manifest = self._get_entry(uri).manifest
+        end = manifest.number_of_items
+        if limit is not None:
+            end = min(end, offset + limit)
+        if offset >= end:
+            return {}
+
+        first = offset // manifest.chunk_size
+        last = (end - 1) // manifest.chunk_size
+        chunks = (RetrieveManifestChunk.query
+                  .filter_by(manifest_id=manifest.id)
+                  .filter(RetrieveManifestChunk.position.between(first, last))
+                  .order_by(RetrieveManifestChunk.position)
+                  .all())
+        items = self._items(manifest, chunks)
+        start = offset - first * manifest.chunk_size
+        return dict(items[start:start + end - offset])
+
+    def _get_entries(self, uris):
+        return RetrieveDataset.query.filter(RetrieveDataset.uri.in_(uris))
+
+    def get_readmes_by_uris(self, uris):
+        return {entry.uri: entry.readme for entry in self._get_entries(uris)}
+
+    def get_annotations_by_uris(self, uris):
+        return {entry.uri: entry.annotations
+                for entry in self._get_entries(uris)}
+
+    def get_tags_by_uris(self, uris):
+        return {entry.uri: entry.tags for entry in self._get_entries(uris)}
+
+    # Updates
+
+    def set_readme(self, uri, readme):
+        self._get_entry(uri).readme = readme
+        db.session.commit()
+
+    def set_tags(self, uri, tags):
+        self._get_entry(uri).tags = list(tags)
+        db.session.commit()
+
+    def update_tags_by_uris(self, uris, add_tags, remove_tags):
+        for entry in self._get_entries(uris):
+            entry.tags = [
+                tag for tag in dict.fromkeys(entry.tags + list(add_tags))
+                if tag not in remove_tags]
+        db.session.commit()
+
+    def add_tags(self, uri, tags):
+        self._get_entry(uri)
+        self.update_tags_by_uris([uri], tags, [])
+        return self.get_tags(uri)
+
+    def remove_tags(self, uri, tags):
+        self._get_entry(uri)
+        self.update_tags_by_uris([uri], [], tags)
+        return self.get_tags(uri)
+
+    def set_annotations(self, uri, annotations):
+        self._get_entry(uri).annotations = dict(annotations)
+        db.session.commit()
+
+    def update_annotations_by_uris(self, uris, set_annotations,
+                                   delete_annotations):
+        for entry in self._get_entries(uris):
+            annotations = dict(entry.annotations)
+            annotations.update(set_annotations)
+            for name in delete_annotations:
+                annotations.pop(name, None)
+            entry.annotations = annotations
+        db.session.commit()
+
+    def set_annotation(self, uri, name, value):
+        self._get_entry(uri)
+        self.update_annotations_by_uris([uri], {name: value}, [])
+        return self.get_annotations(uri)
+
+    def delete_annotation(self, uri, name):
+        self._get_entry(uri)
+        self.update_annotations_by_uris([uri], {}, [name])
+        return self.get_annotations(uri)
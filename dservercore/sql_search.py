@@ -0,0 +1,451 @@
+"""Built-in search plugin on top of the dserver SQL database
+
+Used whenever no other ``dservercore.search`` plugin is installed, hence
+small deployments do not need to run a dedicated search database.
+
+Datasets are indexed in the ``search_dataset`` table, their tags in
+``search_dataset_tag``. The ``free_text`` query is matched against the
+dataset's name, readme and annotations by means of
+
+- an SQLite FTS5 table ``search_dataset_fts`` kept in sync by triggers,
+- a GIN index on ``to_tsvector('english', fulltext)`` on PostgreSQL,
+- plain ``LIKE`` comparisons on any other database.
+
+As with the Mongo search plugin, datasets match the ``free_text`` query if
+they contain any of its words.
+"""
+import logging
+
+from sqlalchemy import (
+    DDL,
+    event,
+    func,
+    inspect,
+    literal_column,
+    or_,
+    select,
+)
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql import column, table
+
+from dservercore import (
+    SearchABC,
+    PaginationParameters,
+    SortParameters,
+    sql_db as db,
+)
+from dservercore.date_utils import (
+    extract_created_at_as_datetime,
+    extract_frozen_at_as_datetime,
+)
+from dservercore.schemas import (
+    RANGE_QUERY_KEYS,
+    SearchDatasetSchema,
+    range_filters,
+)
+from dservercore.search_text import dataset_fulltext, readme_as_string
+from dservercore.sort import DESCENDING
+from dservercore.sql_models import DatasetSchema
+
+
+logger = logging.getLogger(__name__)
+
+
+# Text search configuration of the PostgreSQL full-text index.
+TS_CONFIG = literal_column("'english'")
+
+FTS_TABLE = "search_dataset_fts"
+
+
+class SearchDataset(db.Model):
+    """Searchable dataset entry of the built-in SQL search plugin."""
+    __tablename__ = "search_dataset"
+    id = db.Column(db.Integer, primary_key=True)
+    uri = db.Column(db.String(1024), index=True, unique=True, nullable=False)
+    base_uri = db.Column(db.String(1024), index=True, nullable=False)
+    uuid = db.Column(db.String(36), index=True, nullable=False)
+    name = db.Column(db.String(80), index=True, nullable=False)
+    creator_username = db.Column(db.String(255), index=True, nullable=False)
+    frozen_at = db.Column(db.DateTime(), index=True, nullable=False)
+    created_at = db.Column(db.DateTime(), index=True, nullable=False)
+    number_of_items = db.Column(db.Integer, index=True)
+    size_in_bytes = db.Column(db.BigInteger, index=True)
+    uploaded_by = db.Column(db.String(255), index=True, nullable=True)
+    uploaded_at = db.Column(db.DateTime(), index=True, nullable=True)
+    readme = db.Column(db.Text, nullable=True)
+    annotations = db.Column(db.JSON, nullable=False, default=dict)
+    # Tags in their original order, the search_dataset_tag rows serve
+    # filtering only.
+    tags = db.Column(db.JSON, nullable=False, default=list)
+    fulltext = db.Column(db.Text, nullable=False, default="")
+    tag_entries = db.relationship(
+        "SearchDatasetTag", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.Index(
+            "ix_search_dataset_fulltext",
+            func.to_tsvector(TS_CONFIG, fulltext),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    def __repr__(self):
+        return "<SearchDataset {}>".format(self.uri)
+
+    def as_dict(self):
+        """Return search hit using dictionary representation."""
+        dataset_info = {
+            field: getattr(self, field) for field in DatasetSchema.Meta.fields
+        }
+        dataset_info["tags"] = list(self.tags)
+        return dataset_info
+
+
+class SearchDatasetTag(db.Model):
+    __tablename__ = "search_dataset_tag"
+    dataset_id = db.Column(
+        db.Integer, db.ForeignKey("search_dataset.id", ondelete="CASCADE"),
+        primary_key=True)
+    tag = db.Column(db.String(255), primary_key=True)
+
+    __table_args__ = (
+        db.Index("ix_search_dataset_tag_tag", "tag", "dataset_id"),
+    )
+
+
+_fts_table = table(FTS_TABLE, column("rowid"), column("fulltext"))
+
+
+FTS_TRIGGERS = {
+    "search_dataset_ai":
+        "AFTER INSERT ON search_dataset "
+        f"BEGIN INSERT INTO {FTS_TABLE}(rowid, fulltext) "
+        "VALUES (new.id, new.fulltext); END",
+    "search_dataset_ad":
+        "AFTER DELETE ON search_dataset "
+        f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, fulltext) "
+        "VALUES ('delete', old.id, old.fulltext); END",
+    "search_dataset_au":
+        "AFTER UPDATE OF fulltext ON search_dataset "
+        f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, fulltext) "
+        "VALUES ('delete', old.id, old.fulltext); "
+        f"INSERT INTO {FTS_TABLE}(rowid, fulltext) "
+        "VALUES (new.id, new.fulltext); END",
+}
+
+
+def _create_fts_table(connection):
+    """Create the SQLite FTS5 index and the triggers keeping it in sync
+    unless they exist.
+
+    Rebuilds the index if it or any trigger was missing, e.g. after the
+    search_dataset table has been created by a migration, since rows
+    written in the meantime have not been indexed.
+    """
+    compile_options = [
+        row[0] for row in connection.exec_driver_sql("PRAGMA compile_options")]
+    if "ENABLE_FTS5" not in compile_options:
+        logger.warning("SQLite lacks FTS5, free text search falls back to LIKE")
+        return
+
+    names = [FTS_TABLE] + list(FTS_TRIGGERS)
+    existing = {row[0] for row in connection.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE name IN ({})".format(
+            ", ".join("?" * len(names))), tuple(names))}
+    if existing == set(names):
+        return
+
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "fulltext, content='search_dataset', content_rowid='id', "
+        "tokenize='porter unicode61')")
+    for name, definition in FTS_TRIGGERS.items():
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {name} {definition}")
+    connection.exec_driver_sql(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+@event.listens_for(SearchDataset.__table__, "after_create")
+def _create_fts_table_after_create(target, connection, **kwargs):
+    if connection.dialect.name == "sqlite":
+        _create_fts_table(connection)
+
+
+event.listen(
+    SearchDataset.__table__, "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"))
+
+
+def _fulltext(entry):
+    return dataset_fulltext(entry.name, entry.readme, entry.annotations)
+
+
+def _set_tags(entry, tags):
+    tags = list(dict.fromkeys(tags))
+    entry.tags = tags
+    existing = {tag_entry.tag: tag_entry for tag_entry in entry.tag_entries}
+    entry.tag_entries = [
+        existing.get(tag) or SearchDatasetTag(tag=tag) for tag in tags]
+
+
+def _set_annotations(entry, annotations):
+    entry.annotations = dict(annotations)
+    entry.fulltext = _fulltext(entry)
+
+
+class SQLSearch(SearchABC):
+    """Search plugin indexing datasets in the dserver SQL database."""
+
+    optional_query_keys = frozenset(["uploaded_by", *RANGE_QUERY_KEYS])
+
+    def __init__(self):
+        self._fulltext_backends = {}
+
+    def init_app(self, app):
+        pass
+
+    def init_db(self):
+        """Create the full-text index if the search_dataset table exists
+        without it.
+
+        ``db.create_all()`` creates the index along with the table, tables
+        created otherwise, e.g. by migrations, lack it. Called at app start,
+        safe to call repeatedly.
+        """
+        engine = db.engine
+        with engine.begin() as connection:
+            if not inspect(connection).has_table(SearchDataset.__tablename__):
+                return
+            if engine.dialect.name == "sqlite":
+                _create_fts_table(connection)
+            elif engine.dialect.name == "postgresql":
+                connection.exec_driver_sql(
+                    "CREATE INDEX IF NOT EXISTS ix_search_dataset_fulltext "
+                    "ON search_dataset USING gin "
+                    "(to_tsvector('english', fulltext))")
+        self._fulltext_backends.pop(engine.url, None)
+
+    # Indexing
+
+    def _get_entry(self, uri):
+        return (SearchDataset.query
+                .options(selectinload(SearchDataset.tag_entries))
+                .filter_by(uri=uri)
+                .first())
+
+    def _get_entries(self, uris):
+        return (SearchDataset.query
+                .options(selectinload(SearchDataset.tag_entries))
+                .filter(SearchDataset.uri.in_(uris))
+                .all())
+
+    def register_dataset(self, dataset_info):
+        entry = self._get_entry(dataset_info["uri"])
+        if entry is None:
+            entry = SearchDataset(uri=dataset_info["uri"])
+            db.session.add(entry)
+
+        entry.base_uri = dataset_info["base_uri"]
+        entry.uuid = str(dataset_info["uuid"])
+        entry.name = dataset_info["name"]
+        entry.creator_username = dataset_info["creator_username"]
+        entry.frozen_at = extract_frozen_at_as_datetime(dataset_info)
+        entry.created_at = extract_created_at_as_datetime(dataset_info)
+        entry.number_of_items = dataset_info.get("number_of_items")
+        entry.size_in_bytes = dataset_info.get("size_in_bytes")
+        entry.uploaded_by = dataset_info.get("uploaded_by")
+        entry.uploaded_at = dataset_info.get("uploaded_at")
+        entry.readme = readme_as_string(dataset_info.get("readme"))
+        _set_annotations(entry, dataset_info.get("annotations", {}))
+        _set_tags(entry, dataset_info.get("tags", []))
+
+        db.session.commit()
+        return entry.uuid
+
+    def delete_dataset(self, uri):
+        entry = self._get_entry(uri)
+        if entry is not None:
+            db.session.delete(entry)
+            db.session.commit()
+
+    def set_tags(self, uri, tags):
+        entry = self._get_entry(uri)
+        if entry is None:
+            return
+        _set_tags(entry, tags)
+        db.session.commit()
+
+    def update_tags_by_uris(self, uris, add_tags, remove_tags):
+        for entry in self._get_entries(uris):
+            _set_tags(entry, [tag for tag in entry.tags + list(add_tags)
+                              if tag not in remove_tags])
+        db.session.commit()
+
+    def add_tags(self, uri, tags):
+        self.update_tags_by_uris([uri], tags, [])
+
+    def remove_tags(self, uri, tags):
+        self.update_tags_by_uris([uri], [], tags)
+
+    def set_annotations(self, uri, annotations):
+        entry = self._get_entry(uri)
+        if entry is None:
+            return
+        _set_annotations(entry, annotations)
+        db.session.commit()
+
+    def update_annotations_by_uris(self, uris, set_annotations,
+                                   delete_annotations):
+        for entry in self._get_entries(uris):
+            annotations = dict(entry.annotations)
+            annotations.update(set_annotations)
+            for name in delete_annotations:
+                annotations.pop(name, None)
+            _set_annotations(entry, annotations)
+        db.session.commit()
+
+    def set_annotation(self, uri, name, value):
+        self.update_annotations_by_uris([uri], {name: value}, [])
+
+    def delete_annotation(self, uri, name):
+        self.update_annotations_by_uris([uri], {}, [name])
+
+    def set_readme(self, uri, readme):
+        entry = self._get_entry(uri)
+        if entry is None:
+            return
+        entry.readme = readme_as_string(readme)
+        entry.fulltext = _fulltext(entry)
+        db.session.commit()
+
+    # Searching
+
+    def _fulltext_backend(self):
+        """Return "fts5", "tsvector" or "like", determined once per engine."""
+        engine = db.engine
+        backend = self._fulltext_backends.get(engine.url)
+        if backend is None:
+            backend = "like"
+            if engine.dialect.name == "postgresql":
+                backend = "tsvector"
+            elif engine.dialect.name == "sqlite":
+                with engine.connect() as connection:
+                    if connection.exec_driver_sql(
+                            "SELECT name FROM sqlite_master WHERE name = ?",
+                            (FTS_TABLE,)).first() is not None:
+                        backend = "fts5"
+            self._fulltext_backends[engine.url] = backend
+        return backend
+
+    def _free_text_filter(self, free_text):
+        terms = free_text.split()
+        if len(terms) == 0:
+            return None
+
+        backend = self._fulltext_backend()
+        if backend == "fts5":
+            fts_query = " OR ".join(
+                '"{}"'.format(term.replace('"', '""')) for term in terms)
+            return SearchDataset.id.in_(
+                select(_fts_table.c.rowid)
+                .where(_fts_table.c.fulltext.match(fts_query)))
+        if backend == "tsvector":
+            ts_query = func.plainto_tsquery(TS_CONFIG, terms[0])
+            for term in terms[1:]:
+                ts_query = ts_query.op("||")(
+                    func.plainto_tsquery(TS_CONFIG, term))
+            return func.to_tsvector(TS_CONFIG, SearchDataset.fulltext).op(
+                "@@")(ts_query)
+
+        def escape(term):
+            return (term.replace("\\", "\\\\")
+                    .replace("%", "\\%").replace("_", "\\_"))
+
+        return or_(*[
+            SearchDataset.fulltext.ilike(
+                "%{}%".format(escape(term)), escape="\\")
+            for term in terms])
+
+    def _query(self, query):
+        sql_query = SearchDataset.query.filter(
+            SearchDataset.base_uri.in_(query["base_uris"]))
+
+        for key, column_ in [("creator_usernames", SearchDataset.creator_username),
+                             ("uuids", SearchDataset.uuid),
+                             ("uploaded_by", SearchDataset.uploaded_by)]:
+            if len(query.get(key, [])) > 0:
+                sql_query = sql_query.filter(
+                    column_.in_([str(value) for value in query[key]]))
+
+        for field, lower, upper in range_filters(query):
+            column_ = getattr(SearchDataset, field)
+            if lower is not None:
+                sql_query = sql_query.filter(column_ >= lower)
+            if upper is not None:
+                sql_query = sql_query.filter(column_ <= upper)
+
+        tags = list(dict.fromkeys(query.get("tags", [])))
+        if len(tags) > 0:
+            sql_query = sql_query.filter(SearchDataset.id.in_(
+                select(SearchDatasetTag.dataset_id)
+                .where(SearchDatasetTag.tag.in_(tags))
+                .group_by(SearchDatasetTag.dataset_id)
+                .having(func.count() == len(tags))))
+
+        free_text = query.get("free_text")
+        if free_text:
+            free_text_filter = self._free_text_filter(free_text)
+            if free_text_filter is not None:
+                sql_query = sql_query.filter(free_text_filter)
+
+        return sql_query
+
+    def facets(self, query, fields):
+        """Return number of datasets matching query per value of fields."""
+        ids = self._query(query).with_entities(SearchDataset.id).subquery()
+        facets = {}
+        for field in fields:
+            if field == "tags":
+                column = SearchDatasetTag.tag
+                statement = select(column, func.count()).where(
+                    SearchDatasetTag.dataset_id.in_(select(ids.c.id)))
+            else:
+                column = getattr(SearchDataset, field)
+                statement = select(column, func.count()).where(
+                    SearchDataset.id.in_(select(ids.c.id)),
+                    column.isnot(None))
+            facets[field] = dict(
+                db.session.execute(statement.group_by(column)).all())
+        return facets
+
+    def search(self, query: SearchDatasetSchema,
+               pagination_parameters: PaginationParameters = None,
+               sort_parameters: SortParameters = None) -> DatasetSchema(many=True):
+
+        # Deal with edge case where a user has no access to any base URIs.
+        if len(query.get("base_uris", [])) == 0:
+            return []
+
+        sql_query = self._query(query)
+
+        order_by_args = []
+        if sort_parameters is not None:
+            for field, order in sort_parameters.order.items():
+                if field not in SearchDataset.__table__.columns:
+                    continue
+                sort_column = getattr(SearchDataset, field)
+                if order == DESCENDING:
+                    sort_column = sort_column.desc()
+                order_by_args.append(sort_column)
+        sql_query = sql_query.order_by(*order_by_args, SearchDataset.id)
+
+        if pagination_parameters is not None:
+            pagination_parameters.item_count = sql_query.order_by(None).count()
+            sql_query = (
+                sql_query
+                .offset((pagination_parameters.page - 1)
+                        * pagination_parameters.page_size)
+                .limit(pagination_parameters.page_size))
+
+        return [entry.as_dict() for entry in sql_query]
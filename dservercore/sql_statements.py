@@ -0,0 +1,114 @@
+"""Prebuilt statements of hot authorization and lookup queries
+
+Nearly every request resolves a user, a base URI or a dataset by name and
+checks the user's permissions. These statements are built once at import
+and take their values as bound parameters, hence each call merely looks up
+the compiled statement in SQLAlchemy's compiled cache instead of building
+and compiling a new ``Query``. Existence and permission checks select ids
+or flags instead of loading ORM entities.
+
+Execute them via the session, e.g.::
+
+    sql_db.session.execute(USER_BY_USERNAME, {"username": username}).scalar()
+"""
+from sqlalchemy import bindparam, select
+
+from dservercore.sql_models import (
+    BaseURI,
+    Dataset,
+    User,
+    register_permissions,
+    search_permissions,
+)
+
+
+USER_BY_USERNAME = (
+    select(User)
+    .where(User.username == bindparam("username"))
+    .limit(1)
+)
+
+USER_ID_BY_USERNAME = (
+    select(User.id)
+    .where(User.username == bindparam("username"))
+    .limit(1)
+)
+
+USER_IS_ADMIN_BY_USERNAME = (
+    select(User.is_admin)
+    .where(User.username == bindparam("username"))
+    .limit(1)
+)
+
+BASE_URI_BY_NAME = (
+    select(BaseURI)
+    .where(BaseURI.base_uri == bindparam("base_uri"))
+    .limit(1)
+)
+
+BASE_URI_ID_BY_NAME = (
+    select(BaseURI.id)
+    .where(BaseURI.base_uri == bindparam("base_uri"))
+    .limit(1)
+)
+
+DATASET_BY_URI = (
+    select(Dataset)
+    .where(Dataset.uri == bindparam("uri"))
+    .limit(1)
+)
+
+DATASET_ID_BY_URI = (
+    select(Dataset.id)
+    .where(Dataset.uri == bindparam("uri"))
+    .limit(1)
+)
+
+
+def _permission_by_ids(permissions):
+    return (
+        select(permissions.c.user_id)
+        .where(permissions.c.user_id == bindparam("user_id"))
+        .where(permissions.c.base_uri_id == bindparam("base_uri_id"))
+    )
+
+
+def _permission_by_names(permissions):
+    return (
+        select(permissions.c.user_id)
+        .join(User, User.id == permissions.c.user_id)
+        .join(BaseURI, BaseURI.id == permissions.c.base_uri_id)
+        .where(User.username == bindparam("username"))
+        .where(BaseURI.base_uri == bindparam("base_uri"))
+    )
+
+
+def _base_uris_by_user_id(permissions):
+    return (
+        select(BaseURI.base_uri)
+        .join(permissions, permissions.c.base_uri_id == BaseURI.id)
+        .where(permissions.c.user_id == bindparam("user_id"))
+        .order_by(BaseURI.id)
+    )
+
+
+def _base_uris_by_username(permissions):
+    return (
+        select(BaseURI.base_uri)
+        .join(permissions, permissions.c.base_uri_id == BaseURI.id)
+        .join(User, User.id == permissions.c.user_id)
+        .where(User.username == bindparam("username"))
+        .order_by(BaseURI.id)
+    )
+
+
+# Return a row if the user may search or register in the base URI.
+SEARCH_PERMISSION_BY_IDS = _permission_by_ids(search_permissions)
+REGISTER_PERMISSION_BY_IDS = _permission_by_ids(register_permissions)
+SEARCH_PERMISSION_BY_NAMES = _permission_by_names(search_permissions)
+REGISTER_PERMISSION_BY_NAMES = _permission_by_names(register_permissions)
+
+# Return the base URIs the user may search or register in, as strings.
+SEARCH_BASE_URIS_BY_USER_ID = _base_uris_by_user_id(search_permissions)
+SEARCH_BASE_URIS_BY_USERNAME = _base_uris_by_username(search_permissions)
+REGISTER_BASE_URIS_BY_USERNAME = _base_uris_by_username(register_permissions)
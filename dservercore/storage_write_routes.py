@@ -0,0 +1,49 @@
+"""Routes for inspecting the queue of pending storage writes"""
+from flask import (
+    abort,
+    current_app,
+)
+from dservercore.utils_auth import (
+    jwt_required,
+    get_jwt_identity,
+)
+from flask_smorest.pagination import PaginationParameters
+
+import dservercore.utils_auth
+
+from dservercore.blueprint import Blueprint
+from dservercore.schemas import StorageWriteQuerySchema
+from dservercore.sql_models import StorageWriteSchema
+
+
+bp = Blueprint("storage_writes", __name__, url_prefix="/storage-writes")
+
+
+@bp.route("", methods=["GET"])
+@bp.arguments(StorageWriteQuerySchema, location="query")
+@bp.paginate()
+@bp.response(200, StorageWriteSchema(many=True))
+@bp.alt_response(401, description="Not registered")
+@bp.alt_response(403, description="No permissions")
+@jwt_required()
+def storage_writes_get(query: StorageWriteQuerySchema,
+                       pagination_parameters: PaginationParameters):
+    """List pending and failed writes of metadata to the dataset storage.
+
+    The user in the Authorization token needs to be admin.
+    """
+    identity = get_jwt_identity()
+
+    if not dservercore.utils_auth.user_exists(identity):
+        abort(401)
+
+    if not dservercore.utils_auth.has_admin_rights(identity):
+        abort(403)
+
+    query = current_app.storage_writes.list_entries(query.get("status"))
+    pagination_parameters.item_count = query.count()
+    return query.paginate(
+        page=pagination_parameters.page,
+        per_page=pagination_parameters.page_size,
+        error_out=True
+    ).items
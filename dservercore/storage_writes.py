@@ -0,0 +1,290 @@
+"""Write-behind queue for metadata updates in the storage backend
+
+Changing tags, annotations or the readme of a dataset updates the search and
+retrieve plugins within the request, but writing the change back to the
+dataset in its storage backend (e.g. S3 or Azure) is slow. With
+``STORAGE_WRITE_BEHIND`` enabled, these storage writes are recorded in the
+``storage_write`` SQL table instead and applied by background worker threads,
+retried with exponential backoff on failure.
+
+Successive writes to the same dataset are coalesced into a single entry as
+long as no other kind of write to the dataset has been queued in between,
+hence the order of writes to a dataset is preserved. Entries of one dataset
+are always processed by a single worker at a time.
+"""
+import logging
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, exists
+from sqlalchemy.orm import aliased
+
+from dservercore import sql_db
+from dservercore.sql_models import StorageWrite
+
+
+logger = logging.getLogger(__name__)
+
+
+PENDING = "pending"
+PROCESSING = "processing"
+FAILED = "failed"
+
+STATUSES = [PENDING, PROCESSING, FAILED]
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _merge_tag_delta(old, new):
+    return {
+        "add": [t for t in old["add"] if t not in new["remove"]] + [
+            t for t in new["add"] if t not in old["add"]],
+        "remove": [t for t in old["remove"] if t not in new["add"]] + [
+            t for t in new["remove"] if t not in old["remove"]],
+    }
+
+
+def _merge_annotation_delta(old, new):
+    set_ = {k: v for k, v in old["set"].items() if k not in new["delete"]}
+    set_.update(new["set"])
+    delete = [k for k in old["delete"] if k not in new["set"]] + [
+        k for k in new["delete"] if k not in old["delete"]]
+    return {"set": set_, "delete": delete}
+
+
+def _merge_annotations(old, new):
+    # The storage backend still holds the annotations known before the
+    # superseded write, hence keep those as reference for the comparison.
+    return dict(new, previous=old.get("previous"))
+
+
+def _replace(old, new):
+    return new
+
+
+# How to coalesce the payloads of two successive writes of the same kind.
+MERGE = {
+    "tags": _replace,
+    "tag_delta": _merge_tag_delta,
+    "annotations": _merge_annotations,
+    "annotation_delta": _merge_annotation_delta,
+    "readme": _replace,
+}
+
+
+class StorageWriteQueue:
+    """Durable queue of storage writes drained by background workers.
+
+    Configured by the ``STORAGE_WRITE_*`` parameters in
+    :class:`dservercore.config.Config`. The workers are started with the
+    first request served by the app.
+    """
+
+    def __init__(self, app=None, apply_func=None):
+        self.app = None
+        self.apply_func = apply_func
+        self.workers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app, apply_func)
+
+    def init_app(self, app, apply_func=None):
+        self.app = app
+        if apply_func is not None:
+            self.apply_func = apply_func
+        app.before_request(self.start_workers)
+
+    @property
+    def config(self):
+        return self.app.config
+
+    @property
+    def enabled(self):
+        return self.config.get("STORAGE_WRITE_BEHIND", False)
+
+    def start_workers(self):
+        """Start the configured number of worker threads, once."""
+        if self.workers or not self.enabled:
+            return None
+        with self._lock:
+            if self.workers:
+                return None
+            for i in range(self.config.get("STORAGE_WRITE_WORKERS", 0)):
+                worker = threading.Thread(
+                    target=self._work, name="storage-write-{}".format(i),
+                    daemon=True)
+                worker.start()
+                self.workers.append(worker)
+        return None
+
+    def stop_workers(self, timeout=None):
+        self._stop.set()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+        self._stop.clear()
+
+    def _work(self):
+        poll_interval = self.config.get("STORAGE_WRITE_POLL_INTERVAL", 1.0)
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.process_next()
+            except Exception as e:
+                logger.exception(f"Storage write worker failed: {e}")
+                processed = False
+            if not processed:
+                self._stop.wait(poll_interval)
+
+    def enqueue(self, uri, kind, payload):
+        """Record a storage write, coalescing with the latest queued one."""
+        now = _utcnow()
+        latest = (StorageWrite.query
+                  .filter(StorageWrite.uri == uri)
+                  .filter(StorageWrite.status != FAILED)
+                  .order_by(StorageWrite.id.desc())
+                  .first())
+
+        if (latest is not None and latest.status == PENDING
+                and latest.kind == kind):
+            latest.payload = MERGE[kind](latest.payload, payload)
+            latest.updated_at = now
+            sql_db.session.commit()
+            logger.debug(f"Coalesced {kind} storage write for {uri}")
+            return latest
+
+        # Never overtake a queued write of the same dataset that awaits
+        # its retry.
+        next_attempt_at = now
+        if latest is not None and latest.next_attempt_at > now:
+            next_attempt_at = latest.next_attempt_at
+
+        entry = StorageWrite(
+            uri=uri, kind=kind, payload=payload, status=PENDING, attempts=0,
+            created_at=now, updated_at=now, next_attempt_at=next_attempt_at)
+        sql_db.session.add(entry)
+        sql_db.session.commit()
+        logger.debug(f"Queued {kind} storage write for {uri}")
+        return entry
+
+    def _claim(self):
+        """Mark all due entries of one dataset as processing.
+
+        Returns the dataset URI or None if there is nothing to do.
+        """
+        now = _utcnow()
+
+        # Release entries of crashed workers.
+        timeout = timedelta(
+            seconds=self.config.get("STORAGE_WRITE_PROCESSING_TIMEOUT", 600))
+        (StorageWrite.query
+         .filter(StorageWrite.status == PROCESSING)
+         .filter(StorageWrite.updated_at < now - timeout)
+         .update({"status": PENDING, "updated_at": now},
+                 synchronize_session=False))
+        sql_db.session.commit()
+
+        other = aliased(StorageWrite)
+        busy = exists().where(and_(
+            other.uri == StorageWrite.uri, other.status == PROCESSING))
+
+        candidate = (StorageWrite.query
+                     .filter(StorageWrite.status == PENDING)
+                     .filter(StorageWrite.next_attempt_at <= now)
+                     .filter(~busy)
+                     .order_by(StorageWrite.id)
+                     .first())
+        if candidate is None:
+            return None
+        uri = candidate.uri
+
+        claimed = (StorageWrite.query
+                   .filter(StorageWrite.uri == uri)
+                   .filter(StorageWrite.status == PENDING)
+                   .filter(StorageWrite.next_attempt_at <= now)
+                   .filter(~busy)
+                   .update({"status": PROCESSING, "updated_at": now},
+                           synchronize_session=False))
+        sql_db.session.commit()
+
+        if claimed == 0:  # another worker has been faster
+            return None
+        return uri
+
+    def _backoff(self, attempts):
+        backoff = self.config.get("STORAGE_WRITE_RETRY_BACKOFF", 2.0)
+        max_backoff = self.config.get("STORAGE_WRITE_MAX_BACKOFF", 600.0)
+        return timedelta(seconds=min(backoff * 2 ** (attempts - 1), max_backoff))
+
+    def process_next(self):
+        """Apply the due writes of one dataset in order.
+
+        Returns False if there was nothing to do, True otherwise.
+        """
+        uri = self._claim()
+        if uri is None:
+            return False
+
+        entries = (StorageWrite.query
+                   .filter(StorageWrite.uri == uri)
+                   .filter(StorageWrite.status == PROCESSING)
+                   .order_by(StorageWrite.id)
+                   .all())
+
+        max_attempts = self.config.get("STORAGE_WRITE_MAX_ATTEMPTS", 8)
+        for i, entry in enumerate(entries):
+            try:
+                self.apply_func(entry.uri, entry.kind, entry.payload)
+            except Exception as e:
+                now = _utcnow()
+                entry.attempts += 1
+                entry.last_error = str(e)
+                entry.updated_at = now
+                retry_at = now + self._backoff(entry.attempts)
+                if entry.attempts >= max_attempts:
+                    entry.status = FAILED
+                    logger.error(
+                        f"Giving up {entry.kind} storage write for {uri} "
+                        f"after {entry.attempts} attempts: {e}")
+                else:
+                    entry.status = PENDING
+                    entry.next_attempt_at = retry_at
+                    logger.warning(
+                        f"Failed {entry.kind} storage write for {uri}, "
+                        f"retrying at {retry_at}: {e}")
+                # Keep the order of the remaining writes of this dataset.
+                for later_entry in entries[i + 1:]:
+                    later_entry.status = PENDING
+                    later_entry.updated_at = now
+                    if entry.status == PENDING:
+                        later_entry.next_attempt_at = max(
+                            later_entry.next_attempt_at, retry_at)
+                sql_db.session.commit()
+                return True
+
+            sql_db.session.delete(entry)
+            sql_db.session.commit()
+            logger.info(f"Applied {entry.kind} storage write for {uri}")
+
+        return True
+
+    def process_due(self):
+        """Apply all due writes in the calling thread.
+
+        Returns the number of datasets processed.
+        """
+        count = 0
+        while self.process_next():
+            count += 1
+        return count
+
+    def list_entries(self, status=None):
+        """Return query of queued entries, optionally filtered by status."""
+        query = StorageWrite.query.order_by(StorageWrite.id)
+        if status is not None:
+            query = query.filter(StorageWrite.status == status)
+        return query
@@ -10,19 +10,84 @@ from dservercore.utils_auth import (
     get_jwt_identity,
 )
 
-from dservercore import UnknownURIError, AuthorizationError
+from dservercore import UnknownURIError, AuthorizationError, ValidationError
 from dservercore.blueprint import Blueprint
-from dservercore.schemas import TagSchema
+from dservercore.schemas import (
+    BulkTagsSchema,
+    BulkUpdateResultSchema,
+    TagSchema,
+    TagsByURISchema,
+    URIListSchema,
+)
 import dservercore.utils_auth
 from dservercore.utils import (
     url_suffix_to_uri,
+    bulk_update_tags_by_user,
     get_tags_from_uri_by_user,
-    set_tags_for_uri_by_user
+    get_tags_from_uris_by_user,
+    set_tags_for_uri_by_user,
+    add_tags_for_uri_by_user,
+    remove_tags_for_uri_by_user,
 )
 
 bp = Blueprint("tags", __name__, url_prefix="/tags")
 
 
+@bp.route("/batch", methods=["POST"])
+@bp.arguments(URIListSchema)
+@bp.response(200, TagsByURISchema)
+@bp.alt_response(400, description="Too many URIs")
+@bp.alt_response(401, description="Unauthorized")
+@jwt_required()
+def tags_batch(data):
+    """Request the tags of many datasets at once.
+
+    URIs the user has no permissions on or that are unknown are omitted.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        abort(401)
+
+    if len(data["uris"]) > current_app.config.get("MAX_BATCH_SIZE", 1000):
+        abort(400, "Too many URIs in batch request.")
+
+    uris = [url_suffix_to_uri(uri) for uri in data["uris"]]
+    tags = get_tags_from_uris_by_user(username, uris)
+
+    return {"tags": tags}
+
+
+@bp.route("/bulk", methods=["POST"])
+@bp.arguments(BulkTagsSchema)
+@bp.response(200, BulkUpdateResultSchema)
+@bp.alt_response(400, description="Too many URIs or datasets")
+@bp.alt_response(401, description="Unauthorized")
+@jwt_required()
+def tags_bulk(data):
+    """Add and remove tags of many datasets at once.
+
+    Datasets are selected either by a list of ``uris`` or by a search
+    ``query``. Datasets in base URIs the user has got no register
+    permissions on are reported as ``forbidden`` and left untouched.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        abort(401)
+
+    uris = None
+    if "uris" in data:
+        if len(data["uris"]) > current_app.config.get("MAX_BATCH_SIZE", 1000):
+            abort(400, "Too many URIs in bulk request.")
+        uris = [url_suffix_to_uri(uri) for uri in data["uris"]]
+
+    try:
+        return bulk_update_tags_by_user(
+            username, add_tags=data["add"], remove_tags=data["remove"],
+            uris=uris, query=data.get("query"))
+    except ValidationError as message:
+        abort(400, str(message))
+
+
 @bp.route("/<path:uri>", methods=["GET"])
 @bp.response(200, TagSchema)
 @bp.alt_response(401, description="Unauthorized")
@@ -89,13 +154,7 @@ def add_tag(uri, tag):
     uri = url_suffix_to_uri(uri)
 
     try:
-        # Get existing tags
-        existing_tags = get_tags_from_uri_by_user(username, uri)
-        # Add new tag if not already present
-        if tag not in existing_tags:
-            existing_tags.append(tag)
-        # Set updated tags
-        tags = set_tags_for_uri_by_user(username, uri, existing_tags)
+        tags = add_tags_for_uri_by_user(username, uri, [tag])
     except AuthorizationError:
         abort(403)
     except UnknownURIError:
@@ -120,13 +179,7 @@ def delete_tag(uri, tag):
     uri = url_suffix_to_uri(uri)
 
     try:
-        # Get existing tags
-        existing_tags = get_tags_from_uri_by_user(username, uri)
-        # Remove tag if present
-        if tag in existing_tags:
-            existing_tags.remove(tag)
-        # Set updated tags
-        tags = set_tags_for_uri_by_user(username, uri, existing_tags)
+        tags = remove_tags_for_uri_by_user(username, uri, [tag])
     except AuthorizationError:
         abort(403)
     except UnknownURIError:
@@ -1,6 +1,9 @@
 """Routes for querying and managing dataset entries by their URIs"""
+import json
+
 from flask import (
     abort,
+    current_app,
     jsonify
 )
 from dservercore.utils_auth import (
@@ -13,17 +16,22 @@ from flask_smorest.pagination import PaginationParameters
 from dservercore import ValidationError, UnknownURIError
 from dservercore.blueprint import Blueprint
 from dservercore.sort import SortParameters, ASCENDING, DESCENDING
-from dservercore.sql_models import DatasetSchema
+from dservercore.sql_models import DatasetSchema, DatasetWithDetailsSchema
 from dservercore.schemas import (
+    DatasetIncludeSchema,
+    FacetsSchema,
     RegisterDatasetSchema,
-    SearchDatasetSchema
+    SearchDatasetSchema,
+    URIListSchema
 )
 import dservercore.utils_auth
 from dservercore.utils import (
     dataset_info_is_valid,
+    facets_of_datasets_by_user,
     list_datasets_by_user,
     search_datasets_by_user,
-    get_dataset_by_user_and_uri,
+    get_dataset_with_details_by_user_and_uri,
+    get_datasets_by_user_and_uris,
     register_dataset,
     delete_dataset,
     dataset_uri_exists,
@@ -34,17 +42,36 @@ from dservercore.utils import (
 bp = Blueprint("uris", __name__, url_prefix="/uris")
 
 
+def _facets_headers(username, query, facets):
+    """Return X-Facets header with bucket counts for the requested fields.
+
+    Fields that cannot be counted are left out, see
+    :func:`dservercore.utils.facets_of_datasets_by_user`.
+    """
+    if len(facets) == 0:
+        return {}
+    counts = facets_of_datasets_by_user(username, query, facets)
+    return {"X-Facets": json.dumps(counts)}
+
+
 @bp.route("", methods=["GET"])
 @bp.arguments(SearchDatasetSchema, location="query")
+@bp.arguments(FacetsSchema, location="query", as_kwargs=True)
 @bp.sort(sort=["+uri"], allowed_sort_fields=DATASET_SORT_FIELDS)
 @bp.paginate()
 @bp.response(200, DatasetSchema(many=True))
+@bp.alt_response(400, description="Too many hits")
 @bp.alt_response(401, description="Not registered")
 @jwt_required()
 def uris_get(query: SearchDatasetSchema,
                     pagination_parameters: PaginationParameters,
-                    sort_parameters: SortParameters):
-    """Search the datasets a user has access to."""
+                    sort_parameters: SortParameters,
+                    facets=()):
+    """Search the datasets a user has access to.
+
+    Bucket counts of the fields listed in the facets query parameter over
+    all matching datasets are returned in the X-Facets header.
+    """
     username = get_jwt_identity()
     if not dservercore.utils_auth.user_exists(username):
         # Unregistered users should see 401.
@@ -57,26 +84,36 @@ def uris_get(query: SearchDatasetSchema,
                                          sort_parameters=sort_parameters)
     else:
         # here, the data source is the search plugin
-        datasets = search_datasets_by_user(username, query,
-                                           pagination_parameters=pagination_parameters,
-                                           sort_parameters=sort_parameters)
+        try:
+            datasets = search_datasets_by_user(username, query,
+                                               pagination_parameters=pagination_parameters,
+                                               sort_parameters=sort_parameters)
+        except ValidationError as message:
+            abort(400, str(message))
 
-    return datasets
+    return datasets, _facets_headers(username, query, facets)
 
 
 # We offer search via post method as well in case the URL-embedded query string
 # does not suffice for formulating a complex search query.
 @bp.route("", methods=["POST"])
 @bp.arguments(SearchDatasetSchema)
+@bp.arguments(FacetsSchema, location="query", as_kwargs=True)
 @bp.sort(sort=["+uri"], allowed_sort_fields=DATASET_SORT_FIELDS)
 @bp.paginate()
 @bp.response(200, DatasetSchema(many=True))
+@bp.alt_response(400, description="Too many hits")
 @bp.alt_response(401, description="Not registered")
 @jwt_required()
 def uris_post(query: SearchDatasetSchema,
                    pagination_parameters: PaginationParameters,
-                   sort_parameters: SortParameters):
-    """Search the datasets a user has access to."""
+                   sort_parameters: SortParameters,
+                   facets=()):
+    """Search the datasets a user has access to.
+
+    Bucket counts of the fields listed in the facets query parameter over
+    all matching datasets are returned in the X-Facets header.
+    """
     username = get_jwt_identity()
     if not dservercore.utils_auth.user_exists(username):
         # Unregistered users should see 401.
@@ -89,21 +126,54 @@ def uris_post(query: SearchDatasetSchema,
                                          sort_parameters=sort_parameters)
     else:
         # here, the data source is the search plugin
-        datasets = search_datasets_by_user(username, query,
-                                           pagination_parameters=pagination_parameters,
-                                           sort_parameters=sort_parameters)
+        try:
+            datasets = search_datasets_by_user(username, query,
+                                               pagination_parameters=pagination_parameters,
+                                               sort_parameters=sort_parameters)
+        except ValidationError as message:
+            abort(400, str(message))
+
+    return datasets, _facets_headers(username, query, facets)
+
+
+@bp.route("/batch", methods=["POST"])
+@bp.arguments(URIListSchema)
+@bp.response(200, DatasetSchema(many=True))
+@bp.alt_response(400, description="Too many URIs")
+@bp.alt_response(401, description="Not registered")
+@jwt_required()
+def uris_batch(data):
+    """Return dataset information for many URIs at once.
 
-    return datasets
+    URIs the user has no permissions on or that are not registered are
+    omitted.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        # Unregistered users should see 401.
+        abort(401)
+
+    if len(data["uris"]) > current_app.config.get("MAX_BATCH_SIZE", 1000):
+        abort(400, "Too many URIs in batch request.")
+
+    uris = [url_suffix_to_uri(uri) for uri in data["uris"]]
+    return get_datasets_by_user_and_uris(username, uris)
 
 
 @bp.route("/<path:uri>", methods=["GET"])
-@bp.response(200, DatasetSchema)
+@bp.arguments(DatasetIncludeSchema, location="query")
+@bp.response(200, DatasetWithDetailsSchema)
 @bp.alt_response(401, description="Not registered")
 @bp.alt_response(403, description="No permissions")
 @bp.alt_response(404, description="Not found")
 @jwt_required()
-def uri_get(uri):
-    """Return dataset information by URI."""
+def uri_get(query: DatasetIncludeSchema, uri):
+    """Return dataset information by URI.
+
+    The entry can be expanded by any of ``readme``, ``tags``, ``annotations``
+    and ``manifest_summary`` via a comma-separated ``include`` query
+    parameter, e.g. ``?include=readme,tags``.
+    """
     username = get_jwt_identity()
 
     if not dservercore.utils_auth.user_exists(username):
@@ -116,7 +186,12 @@ def uri_get(uri):
         # registered users without search rights on base uri should see 403.
         abort(403)
 
-    dataset = get_dataset_by_user_and_uri(username, uri)
+    try:
+        dataset = get_dataset_with_details_by_user_and_uri(
+            username, uri, include=query["include"])
+    except UnknownURIError:
+        current_app.logger.info("UnknownURIError")
+        abort(404)
 
     if dataset is None:
         abort(404)
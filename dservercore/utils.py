@@ -1,15 +1,20 @@
 """Utility functions."""
 
-from datetime import datetime, date, timezone
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta, timezone
 import importlib
 import json
 import logging
 import sys
+import threading
+import time
 
+from collections import OrderedDict
 from itertools import chain
 
 from flask import current_app
 from flask_smorest.pagination import PaginationParameters
+from sqlalchemy import func, select
 from sqlalchemy.sql import exists
 
 import dtoolcore
@@ -30,7 +35,24 @@ from dservercore import (
 from dservercore.sql_models import (
     User,
     BaseURI,
+    Change,
     Dataset,
+    DatasetSchema,
+    search_permissions,
+)
+from dservercore.read_replica import read_replica
+from dservercore.schemas import RANGE_QUERY_KEYS, range_filters
+from dservercore.sql_statements import (
+    BASE_URI_BY_NAME,
+    BASE_URI_ID_BY_NAME,
+    DATASET_BY_URI,
+    DATASET_ID_BY_URI,
+    REGISTER_BASE_URIS_BY_USERNAME,
+    REGISTER_PERMISSION_BY_IDS,
+    SEARCH_BASE_URIS_BY_USER_ID,
+    SEARCH_PERMISSION_BY_IDS,
+    USER_BY_USERNAME,
+    USER_ID_BY_USERNAME,
 )
 from dservercore.sort import SortParameters, ASCENDING, DESCENDING
 
@@ -62,6 +84,9 @@ DATASET_SORT_FIELDS = [
     "creator_username",
     "frozen_at",
     "name",
+    "number_of_items",
+    "size_in_bytes",
+    "uploaded_at",
     "uri",
     "uuid"
 ]
@@ -91,15 +116,37 @@ def _json_serial(obj):
 
 
 def _get_user_obj(username):
-    return User.query.filter_by(username=username).first()
+    return sql_db.session.execute(
+        USER_BY_USERNAME, {"username": username}).scalar()
 
 
 def _get_base_uri_obj(base_uri):
-    return BaseURI.query.filter_by(base_uri=base_uri).first()
+    return sql_db.session.execute(
+        BASE_URI_BY_NAME, {"base_uri": base_uri}).scalar()
 
 
 def _get_dataset_obj(uri):
-    return Dataset.query.filter_by(uri=uri).first()
+    return sql_db.session.execute(DATASET_BY_URI, {"uri": uri}).scalar()
+
+
+def _may_search(user, base_uri):
+    """Return True if the User may search the BaseURI."""
+    return sql_db.session.execute(
+        SEARCH_PERMISSION_BY_IDS,
+        {"user_id": user.id, "base_uri_id": base_uri.id}).first() is not None
+
+
+def _may_register(user, base_uri):
+    """Return True if the User may register datasets in the BaseURI."""
+    return sql_db.session.execute(
+        REGISTER_PERMISSION_BY_IDS,
+        {"user_id": user.id, "base_uri_id": base_uri.id}).first() is not None
+
+
+def _search_base_uris(user):
+    """Return list of the base URIs the User may search."""
+    return list(sql_db.session.execute(
+        SEARCH_BASE_URIS_BY_USER_ID, {"user_id": user.id}).scalars())
 
 
 #############################################################################
@@ -205,9 +252,9 @@ def generate_dataset_info(dataset, base_uri):
 
 def user_exists(username):
     """Check whether user is registered in the system."""
-    if _get_user_obj(username) is None:
-        return False
-    return True
+    user_id = sql_db.session.execute(
+        USER_ID_BY_USERNAME, {"username": username}).scalar()
+    return user_id is not None
 
 
 def get_user_obj(username):
@@ -277,6 +324,7 @@ def register_users(users):
     sql_db.session.commit()
 
 
+@read_replica()
 def list_users():
     """Return list of users."""
     users = []
@@ -352,6 +400,7 @@ def update_users(users):
     sql_db.session.commit()
 
 
+@read_replica()
 def get_user_info(username):
     """Return information about a user as a dictionary.
 
@@ -390,6 +439,39 @@ def _dataset_order_by_args(sort_parameters):
     return order_by_args
 
 
+def _search_base_uri_ids(username):
+    """Return subquery of the ids of the base URIs a user may search.
+
+    Filtering datasets by ``Dataset.base_uri_id.in_()`` this subquery lets
+    the database resolve the user's permissions once via the
+    search_permissions primary key and then read the datasets of each base
+    URI from the (base_uri_id, ...) indexes of the dataset table, instead of
+    joining the permissions to every dataset.
+    """
+    return (
+        select(search_permissions.c.base_uri_id)
+        .join(User, User.id == search_permissions.c.user_id)
+        .where(User.username == username)
+        .scalar_subquery()
+    )
+
+
+def _dataset_order_by_args_with_id(sort_parameters):
+    """Return SQLAlchemy sort arguments with ties broken by Dataset.id.
+
+    The id follows the direction of the last sort field, hence the order
+    matches a (base_uri_id, field, id) index read forwards or backwards.
+    """
+    if sort_parameters is None:
+        return [Dataset.id]
+    order_by_args = _dataset_order_by_args(sort_parameters)
+    directions = list(sort_parameters.order.values())
+    if len(directions) > 0 and directions[-1] == DESCENDING:
+        return order_by_args + [Dataset.id.desc()]
+    return order_by_args + [Dataset.id]
+
+
+@read_replica()
 def list_datasets_by_user(username,
                           pagination_parameters: PaginationParameters = None,
                           sort_parameters: SortParameters = None):
@@ -404,31 +486,33 @@ def list_datasets_by_user(username,
     """
     user = get_user_obj(username)  # raises AuthenticationError
 
+    # Filter by the ids of the user's base URIs rather than joining the
+    # permissions. Unlike with _search_base_uri_ids(), the database knows
+    # these ids up front, hence for a single base URI it walks one of the
+    # (base_uri_id, field, id) indexes in order instead of sorting all of
+    # its datasets.
+    base_uri_ids = [base_uri.id for base_uri in user.search_base_uris]
     query = (
-        sql_db.session.query(Dataset, User)
-        .join(User.search_base_uris)
-        .filter(User.username == username)
-        .filter(BaseURI.id == Dataset.base_uri_id)
+        sql_db.session.query(Dataset)
+        .join(BaseURI, BaseURI.id == Dataset.base_uri_id)
+        .filter(Dataset.base_uri_id.in_(base_uri_ids))
     )
 
-    if sort_parameters is not None:
-        order_by_args = _dataset_order_by_args(sort_parameters)
-        query = query.order_by(*order_by_args)
+    query = query.order_by(*_dataset_order_by_args_with_id(sort_parameters))
 
     if pagination_parameters is not None:
         pagination_parameters.item_count = query.count()
-        queried_items = query.paginate(
+        datasets = query.paginate(
             page=pagination_parameters.page,
             per_page=pagination_parameters.page_size,
             error_out=True).items
     else:
-        queried_items = query.all()
-
-    datasets = [ds for ds, user in queried_items]
+        datasets = query.all()
 
     return datasets
 
 
+@read_replica()
 def summary_of_datasets_by_user(username):
     """Return summary information of datasets the user has access to.
 
@@ -437,8 +521,12 @@ def summary_of_datasets_by_user(username):
     """
     user = get_user_obj(username)  # raises AuthenticationError
 
-    # Get all the datasets the user has access to.
-    datasets = search_datasets_by_user(username, query={})
+    # Get all the datasets the user has access to. Ask the search plugin
+    # directly, as the dataset table does not know about tags.
+    query = preprocess_query_base_uris(username, {})
+    datasets = []
+    if len(query["base_uris"]) > 0:
+        datasets = current_app.search.search(query)
 
     datasets_per_creator = {}
     datasets_per_base_uri = {}
@@ -504,6 +592,7 @@ def summary_of_datasets_by_user(username):
     return summary
 
 
+@read_replica()
 def lookup_datasets_by_user_and_uuid(username, uuid,
                                      pagination_parameters: PaginationParameters = None,
                                      sort_parameters: SortParameters = None):
@@ -516,31 +605,63 @@ def lookup_datasets_by_user_and_uuid(username, uuid,
     user = get_user_obj(username)  # raises AuthenticationError
 
     query = (
-        sql_db.session.query(Dataset, User)
-        .join(User.search_base_uris)
+        sql_db.session.query(Dataset)
+        .join(BaseURI, BaseURI.id == Dataset.base_uri_id)
         .filter(Dataset.uuid == uuid)
-        .filter(User.username == username)
-        .filter(BaseURI.id == Dataset.base_uri_id)
+        .filter(Dataset.base_uri_id.in_(_search_base_uri_ids(username)))
     )
 
-    if sort_parameters is not None:
-        order_by_args = _dataset_order_by_args(sort_parameters)
-        query = query.order_by(*order_by_args)
+    query = query.order_by(*_dataset_order_by_args_with_id(sort_parameters))
 
     if pagination_parameters is not None:
         pagination_parameters.item_count = query.count()
-        queried_items = query.paginate(
+        datasets = query.paginate(
             page=pagination_parameters.page,
             per_page=pagination_parameters.page_size,
             error_out=True).items
     else:
-        queried_items = query.all()
-
-    datasets = [ds for ds, user in queried_items]
+        datasets = query.all()
 
     return datasets
 
 
+def lookup_datasets_by_user_and_uuids(username, uuids, batch_size=None):
+    """Return iterator over all datasets with matching uuids grouped by uuid.
+
+    Yields (uuid, list of Datasets sorted by URI) pairs in the order of the
+    requested uuids, with empty lists for uuids without any dataset the user
+    has access to. Datasets are queried with a single query per batch of
+    ``batch_size`` uuids, all at once by default.
+
+    Raises AuthenticationError if user is invalid.
+    """
+    get_user_obj(username)  # raises AuthenticationError
+
+    uuids = list(dict.fromkeys(uuids))
+    if batch_size is None or batch_size <= 0:
+        batch_size = max(len(uuids), 1)
+
+    return _lookup_datasets_by_user_and_uuids(username, uuids, batch_size)
+
+
+def _lookup_datasets_by_user_and_uuids(username, uuids, batch_size):
+    for chunk in _chunks(uuids, batch_size):
+        query = (
+            sql_db.session.query(Dataset)
+            .filter(Dataset.uuid.in_(chunk))
+            .filter(Dataset.base_uri_id.in_(_search_base_uri_ids(username)))
+            .order_by(Dataset.uri)
+        )
+
+        datasets = {uuid: [] for uuid in chunk}
+        with read_replica():
+            for dataset in query.all():
+                datasets[dataset.uuid].append(dataset)
+
+        yield from datasets.items()
+
+
+@read_replica()
 def get_dataset_by_user_and_uri(username, uri):
     """Return single dataset with matching uri if user has rights to see it.
 
@@ -549,24 +670,97 @@ def get_dataset_by_user_and_uri(username, uri):
     Raises AuthenticationError if user is invalid.
     """
 
-    # datasets = []
-    query = (
-        sql_db.session.query(Dataset, User)
-        .join(User.search_base_uris)
+    return (
+        sql_db.session.query(Dataset)
         .filter(Dataset.uri == uri)
-        .filter(User.username == username)
-        .filter(BaseURI.id == Dataset.base_uri_id)
+        .filter(Dataset.base_uri_id.in_(_search_base_uri_ids(username)))
+        .first()
+    )
+
+
+@read_replica()
+def get_datasets_by_user_and_uris(username, uris):
+    """Return datasets with matching uris the user has rights to see.
+
+    Permissions are resolved within a single query for all URIs.
+
+    Returns list of Datasets in the order of the requested URIs, omitting
+    those the user has not got access to or that are not registered.
+    Raises AuthenticationError if user is invalid.
+    """
+    user = get_user_obj(username)  # raises AuthenticationError
+
+    uris = list(dict.fromkeys(uris))
+    if len(uris) == 0:
+        return []
+
+    query = (
+        sql_db.session.query(Dataset)
+        .filter(Dataset.uri.in_(uris))
+        .filter(Dataset.base_uri_id.in_(_search_base_uri_ids(username)))
         .all()
     )
 
-    datasets = [ds for ds, user in query]
+    datasets = {ds.uri: ds for ds in query}
+
+    return [datasets[uri] for uri in uris if uri in datasets]
 
-    if len(datasets) > 0:
-        ret = datasets[0]
-    else:
-        ret = None
 
-    return ret
+def _call_in_app_context(app, func, *args):
+    with app.app_context():
+        return func(*args)
+
+
+def get_dataset_with_details_by_user_and_uri(username, uri, include=()):
+    """Return dataset with matching uri expanded by retrieve plugin content.
+
+    Permissions are resolved once via :func:`get_dataset_by_user_and_uri`.
+    The requested retrieve plugin calls, any of ``"annotations"``,
+    ``"manifest_summary"``, ``"readme"`` and ``"tags"``, run concurrently.
+
+    Returns dictionary with dataset entry and requested content if user is
+    valid and has access to the dataset.
+    Returns None if user is valid but has not got access to the dataset.
+    Raises AuthenticationError if user is invalid.
+    Raises UnknownURIError if the retrieve plugin does not know the dataset.
+    """
+    dataset = get_dataset_by_user_and_uri(username, uri)
+    if dataset is None:
+        return None
+
+    dataset_info = {
+        field: getattr(dataset, field) for field in DatasetSchema.Meta.fields
+        if field != "base_uri"
+    }
+    dataset_info["base_uri"] = dataset.base_uri.base_uri
+
+    include = list(dict.fromkeys(include))
+    if len(include) == 0:
+        return dataset_info
+
+    retrieve = current_app.retrieve
+    getters = {
+        "annotations": retrieve.get_annotations,
+        "manifest_summary": retrieve.get_manifest_summary,
+        "readme": retrieve.get_readme,
+        "tags": retrieve.get_tags,
+    }
+
+    if len(include) == 1:
+        key = include[0]
+        dataset_info[key] = getters[key](uri)
+        return dataset_info
+
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=len(include)) as executor:
+        futures = {
+            key: executor.submit(_call_in_app_context, app, getters[key], uri)
+            for key in include
+        }
+    for key, future in futures.items():
+        dataset_info[key] = future.result()
+
+    return dataset_info
 
 
 #############################################################################
@@ -580,7 +774,7 @@ def _preprocess_privileges(username, query):
     # Deal with base URIs. If not specified on the query add the ones that the
     # user has search privileges on. If specified filter out any that the user
     # does not have search privileges on.
-    allowed_uris = [bu.base_uri for bu in user.search_base_uris]
+    allowed_uris = _search_base_uris(user)
     if "base_uris" not in query:
         query["base_uris"] = allowed_uris
     else:
@@ -599,6 +793,118 @@ def preprocess_query_base_uris(username, query):
     return _preprocess_privileges(username, query)
 
 
+# Query keys the dataset table can answer next to base_uris, and the
+# corresponding columns.
+SQL_QUERY_COLUMNS = {
+    "creator_usernames": Dataset.creator_username,
+    "uuids": Dataset.uuid,
+    "uploaded_by": Dataset.uploaded_by,
+}
+
+# Query keys only the search plugin can answer.
+PLUGIN_QUERY_KEYS = ("free_text", "tags")
+
+# Query keys search plugins are not required to answer, applied in SQL
+# unless listed in the plugin's optional_query_keys.
+SQL_ONLY_QUERY_KEYS = ("uploaded_by", *RANGE_QUERY_KEYS)
+
+
+def _sql_only_query_keys(query):
+    """Return keys of query's criteria the search plugin does not apply, see
+    :attr:`dservercore.SearchABC.optional_query_keys`."""
+    supported = current_app.search.optional_query_keys
+    return [key for key in SQL_ONLY_QUERY_KEYS
+            if query.get(key) not in (None, []) and key not in supported]
+
+
+def _has_sql_only_criteria(query):
+    """Return True if the query has criteria the search plugin does not
+    apply, see :class:`dservercore.SearchABC`."""
+    return len(_sql_only_query_keys(query)) > 0
+
+
+def plan_search_query(query):
+    """Return where to answer a search query.
+
+    - "sql" if the dataset table can answer the query on its own,
+    - "plugin" if the search plugin answers all of its criteria,
+    - "intersect" if free text or tags are combined with criteria only
+      applied in SQL, i.e. the uploader or ranges unless the plugin supports
+      them. The plugin's hits for the other criteria are then filtered in
+      the dataset table.
+
+    With ``SEARCH_QUERY_PLANNER`` disabled, queries without free text and
+    tags go to the plugin as well unless they filter by uploader or ranges.
+    Criteria are never dropped, "intersect" raises ValidationError if too
+    many datasets match, see :func:`_intersect_plugin_hits`.
+    """
+    if not any(query.get(key) for key in PLUGIN_QUERY_KEYS):
+        if (current_app.config.get("SEARCH_QUERY_PLANNER", False)
+                or any(query.get(key) not in (None, [])
+                       for key in SQL_ONLY_QUERY_KEYS)):
+            return "sql"
+        return "plugin"
+    if _has_sql_only_criteria(query):
+        return "intersect"
+    return "plugin"
+
+
+def _dataset_as_search_hit(dataset):
+    """Return dataset entry in the form of a search plugin hit."""
+    hit = {field: getattr(dataset, field)
+           for field in DatasetSchema.Meta.fields}
+    hit["base_uri"] = dataset.base_uri.base_uri
+    return hit
+
+
+def _filter_datasets_in_sql(sql_query, query, uris=None):
+    """Apply the criteria of a query without free text and tags."""
+    sql_query = (
+        sql_query
+        .join(Dataset.base_uri)
+        .filter(BaseURI.base_uri.in_(query["base_uris"]))
+    )
+    for key, column in SQL_QUERY_COLUMNS.items():
+        if query.get(key):
+            sql_query = sql_query.filter(
+                column.in_([str(value) for value in query[key]]))
+    for field, lower, upper in range_filters(query):
+        column = getattr(Dataset, field)
+        if lower is not None:
+            sql_query = sql_query.filter(column >= lower)
+        if upper is not None:
+            sql_query = sql_query.filter(column <= upper)
+    if uris is not None:
+        sql_query = sql_query.filter(Dataset.uri.in_(uris))
+    return sql_query
+
+
+def _search_datasets_in_sql(query, uris=None,
+                            pagination_parameters: PaginationParameters = None,
+                            sort_parameters: SortParameters = None):
+    """Answer a search query without free text and tags from the dataset table.
+
+    :param uris: optional list of URIs to restrict the results to
+    """
+    sql_query = _filter_datasets_in_sql(
+        sql_db.session.query(Dataset), query, uris)
+
+    sql_query = sql_query.order_by(
+        *_dataset_order_by_args_with_id(sort_parameters))
+
+    if pagination_parameters is not None:
+        pagination_parameters.item_count = sql_query.count()
+        datasets = sql_query.paginate(
+            page=pagination_parameters.page,
+            per_page=pagination_parameters.page_size,
+            error_out=True).items
+    else:
+        datasets = sql_query.all()
+
+    return [_dataset_as_search_hit(dataset) for dataset in datasets]
+
+
+@read_replica()
 def search_datasets_by_user(username, query,
                             pagination_parameters: PaginationParameters = None,
                             sort_parameters: SortParameters = None):
@@ -606,7 +912,15 @@ def search_datasets_by_user(username, query,
 
     Valid keys for the query are: creator_usernames, base_uris, free_text.  If
     the query dictionary is empty all datasets, that a user has access to, are
-    returned.
+    returned. Datasets can be filtered by ranges of dates and sizes with the
+    keys in schemas.RANGE_QUERY_KEYS.
+
+    Queries without free text and tags are answered from the dserver SQL
+    database, see :func:`plan_search_query`. Their hits lack tags.
+
+    Results are cached for ``SEARCH_CACHE_TTL`` seconds keyed on the query
+    after preprocessing and the requested sort order and page, see
+    :mod:`dservercore.search_cache`.
 
     :param username: username
     :param query: dictionary specifying query
@@ -616,6 +930,9 @@ def search_datasets_by_user(username, query,
               Empty list if user is valid but has not got access to any
               datasets.
     :raises: AuthenticationError if user is invalid.
+             ValidationError if free text or tags combined with uploader
+             or range criteria match more than
+             ``SEARCH_QUERY_PLANNER_MAX_HITS`` datasets.
     """
 
     query = preprocess_query_base_uris(username, query)
@@ -624,11 +941,189 @@ def search_datasets_by_user(username, query,
     if len(query["base_uris"]) == 0:
         return []
 
+    maxsize = current_app.config.get("SEARCH_CACHE_SIZE", 0)
+    if maxsize <= 0:
+        return _search_datasets(query, pagination_parameters, sort_parameters)
+
+    cache = current_app.search_cache
+    key = cache.key(query, pagination_parameters, sort_parameters)
+    cached = cache.get(key, current_app.config.get("SEARCH_CACHE_TTL", 30.0))
+    if cached is not None:
+        hits, item_count = cached
+        if pagination_parameters is not None:
+            pagination_parameters.item_count = item_count
+        return hits
+
+    generation = cache.generation
+    hits = _search_datasets(query, pagination_parameters, sort_parameters)
+    item_count = None
+    if pagination_parameters is not None:
+        item_count = pagination_parameters.item_count
+    cache.put(key, generation, hits, item_count, maxsize)
+    return hits
+
+
+def invalidate_search_results():
+    """Discard cached search results after datasets have changed."""
+    current_app.search_cache.invalidate()
+
+
+def _search_datasets(query, pagination_parameters, sort_parameters):
+    """Answer a preprocessed search query according to its plan."""
+    plan = plan_search_query(query)
+    logger.debug("Search query %s answered by plan '%s'", query, plan)
+
+    if plan == "sql":
+        return _search_datasets_in_sql(
+            query,
+            pagination_parameters=pagination_parameters,
+            sort_parameters=sort_parameters)
+
+    if plan == "intersect":
+        return _search_datasets_in_sql(
+            query, uris=[hit["uri"] for hit in _intersect_plugin_hits(query)],
+            pagination_parameters=pagination_parameters,
+            sort_parameters=sort_parameters)
+
     return current_app.search.search(query,
                                      pagination_parameters=pagination_parameters,
                                      sort_parameters=sort_parameters)
 
 
+def _intersect_plugin_hits(query):
+    """Return the search plugin's hits for query matching its criteria only
+    applied in SQL, see :func:`_sql_only_query_keys`.
+
+    The plugin's hits are fetched and filtered in pages of
+    ``SEARCH_QUERY_PLANNER_MAX_HITS``, at most
+    ``SEARCH_QUERY_PLANNER_MAX_SCAN`` hits in total.
+
+    :raises: ValidationError if more than ``SEARCH_QUERY_PLANNER_MAX_HITS``
+             datasets match or the plugin has more than
+             ``SEARCH_QUERY_PLANNER_MAX_SCAN`` hits.
+    """
+    max_hits = current_app.config.get("SEARCH_QUERY_PLANNER_MAX_HITS", 10000)
+    max_scan = current_app.config.get("SEARCH_QUERY_PLANNER_MAX_SCAN", 100000)
+    sql_only_keys = _sql_only_query_keys(query)
+    plugin_query = {key: value for key, value in query.items()
+                    if key not in sql_only_keys}
+    # Page in a stable order.
+    sort_parameters = SortParameters(["+uri"])
+
+    matches = []
+    page = 1
+    while True:
+        pagination_parameters = PaginationParameters(page=page,
+                                                     page_size=max_hits)
+        hits = current_app.search.search(
+            plugin_query, pagination_parameters=pagination_parameters,
+            sort_parameters=sort_parameters)
+        item_count = pagination_parameters.item_count
+        if ((item_count is not None and item_count > max_scan)
+                or (page - 1) * max_hits + len(hits) > max_scan):
+            raise (ValidationError(
+                "More than {} datasets match the free text and tags, "
+                "narrow the query".format(max_scan)))
+        if len(hits) > 0:
+            uris = {uri for uri, in _filter_datasets_in_sql(
+                sql_db.session.query(Dataset.uri), query,
+                [hit["uri"] for hit in hits])}
+            matches.extend(hit for hit in hits if hit["uri"] in uris)
+        if len(matches) > max_hits:
+            raise (ValidationError(
+                "More than {} datasets match, narrow the query".format(
+                    max_hits)))
+        if len(hits) < max_hits or (item_count is not None
+                                    and page * max_hits >= item_count):
+            return matches
+        page += 1
+
+
+def _facets_in_sql(query, fields, uris=None):
+    """Aggregate facets of a query without free text and tags in SQL.
+
+    :param uris: optional list of URIs to restrict the datasets to
+    """
+    facets = {}
+    for field in fields:
+        column = BaseURI.base_uri if field == "base_uri" else getattr(
+            Dataset, field)
+        rows = (
+            _filter_datasets_in_sql(
+                sql_db.session.query(column, func.count(Dataset.id))
+                .select_from(Dataset), query, uris)
+            .filter(column.isnot(None))
+            .group_by(column)
+        )
+        facets[field] = dict(rows.all())
+    return facets
+
+
+def _tag_facets(hits):
+    """Count the tags of search plugin hits."""
+    counts = {}
+    for hit in hits:
+        for tag in hit.get("tags") or []:
+            counts[tag] = counts.get(tag, 0) + 1
+    return counts
+
+
+@read_replica()
+def facets_of_datasets_by_user(username, query, fields):
+    """Return number of datasets matching query per value of fields.
+
+    Facets are computed by the search plugin if it implements a ``facets``
+    method and the query does not comprise criteria only applied in SQL,
+    see :func:`plan_search_query`. Otherwise, they are aggregated in SQL
+    over the same datasets a search returns, i.e. the plugin's hits for
+    free text and tags filtered in SQL as in :func:`_intersect_plugin_hits`,
+    with tags counted from the plugin's hits. Fields requiring more hits
+    than :func:`_intersect_plugin_hits` admits are left out. Only the
+    ``SEARCH_FACETS_MAX_BUCKETS`` most frequent values are reported.
+
+    :param username: username
+    :param query: dictionary specifying query, see SearchDatasetSchema
+    :param fields: list of facet fields, see schemas.FACET_FIELDS
+    :returns: dictionary mapping each available field to a dictionary of
+              counts
+    :raises: AuthenticationError if user is invalid.
+    """
+    fields = list(dict.fromkeys(fields))
+    query = preprocess_query_base_uris(username, dict(query))
+    if len(fields) == 0:
+        return {}
+    if len(query["base_uris"]) == 0:
+        return {field: {} for field in fields}
+
+    if (hasattr(current_app.search, "facets")
+            and not _has_sql_only_criteria(query)):
+        facets = current_app.search.facets(query, fields)
+    else:
+        facets = {}
+        plugin_criteria = any(query.get(key) for key in PLUGIN_QUERY_KEYS)
+        hits = None
+        if plugin_criteria or "tags" in fields:
+            try:
+                hits = _intersect_plugin_hits(query)
+            except ValidationError as message:
+                logger.info("Leaving out facets: %s", message)
+        if hits is not None or not plugin_criteria:
+            uris = None
+            if plugin_criteria:
+                uris = [hit["uri"] for hit in hits]
+            facets = _facets_in_sql(
+                query, [field for field in fields if field != "tags"], uris)
+        if hits is not None and "tags" in fields:
+            facets["tags"] = _tag_facets(hits)
+
+    max_buckets = current_app.config.get("SEARCH_FACETS_MAX_BUCKETS", 20)
+    return {
+        field: dict(sorted(facets[field].items(),
+                           key=lambda bucket: (-bucket[1], bucket[0]))[:max_buckets])
+        for field in fields if field in facets
+    }
+
+
 #############################################################################
 # Base URI helper functions
 #############################################################################
@@ -675,9 +1170,9 @@ def uri_to_url_suffix(uri):
 
 def base_uri_exists(base_uri):
     """Return True if the base URI has been registered."""
-    if _get_base_uri_obj(base_uri) is None:
-        return False
-    return True
+    base_uri_id = sql_db.session.execute(
+        BASE_URI_ID_BY_NAME, {"base_uri": base_uri}).scalar()
+    return base_uri_id is not None
 
 
 def get_base_uri_obj(base_uri):
@@ -707,8 +1202,10 @@ def delete_base_uri(base_uri):
         sql_db.session.delete(sqlalch_base_uri_obj)
 
     sql_db.session.commit()
+    invalidate_search_results()
 
 
+@read_replica()
 def list_base_uris():
     """List the base URIs in dserver."""
     base_uris = []
@@ -722,6 +1219,7 @@ def list_base_uris():
 #############################################################################
 
 
+@read_replica()
 def get_permission_info(base_uri_str):
     """Return the permissions on a base URI as a dictionary."""
     base_uri = get_base_uri_obj(base_uri_str)
@@ -758,9 +1256,9 @@ def register_permissions(base_uri, permissions):
 
 def dataset_uri_exists(uri):
     """Return True if the dataset URI has been registered."""
-    if _get_dataset_obj(uri) is None:
-        return False
-    return True
+    dataset_id = sql_db.session.execute(
+        DATASET_ID_BY_URI, {"uri": uri}).scalar()
+    return dataset_id is not None
 
 
 def get_dataset_obj(uri):
@@ -934,6 +1432,11 @@ def register_dataset(dataset_info):
     # this is double bookkeeping, next to delegating dataset registration to
     # the search plugin, we also store metadata in an sql table
     register_dataset_admin_metadata(dataset_info)
+    _record_changes([dataset_info["uri"]], "register")
+
+    # The dataset might have changed in storage since it has been opened.
+    invalidate_dataset_handle(dataset_info["uri"])
+    invalidate_search_results()
 
     return dataset_info["uri"]
 
@@ -981,10 +1484,117 @@ def delete_dataset(uri):
 
     # this is double bookkeeping, next to delegating dataset registration to
     # the search plugin, we also store metadata in an sql table
+    _record_changes([uri], "delete")
     delete_dataset_admin_metadata(uri)
 
+    invalidate_dataset_handle(uri)
+    invalidate_search_results()
+
     return uri
 
+
+def _record_changes(uris, kind):
+    """Append entries of kind for datasets to the change log."""
+    if not current_app.config.get("CHANGE_LOG_ENABLED", False):
+        return
+
+    uris = list(dict.fromkeys(uris))
+    rows = (
+        sql_db.session.query(Dataset.uri, Dataset.uuid, BaseURI.base_uri)
+        .join(Dataset.base_uri)
+        .filter(Dataset.uri.in_(uris))
+        .all()
+    )
+    known = {uri: (uuid, base_uri) for uri, uuid, base_uri in rows}
+
+    changed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    for uri in uris:
+        uuid, base_uri = known.get(uri, (None, uri.rsplit("/", 1)[0]))
+        sql_db.session.add(Change(
+            uri=uri, uuid=uuid, base_uri=base_uri, kind=kind,
+            changed_at=changed_at))
+    sql_db.session.commit()
+    current_app.events.notify()
+
+
+@read_replica()
+def list_changes_by_user(username, since=0, limit=None):
+    """Return changes to datasets the user has access to.
+
+    Changes are returned in the order of their sequence number, starting
+    after since. At most limit, and never more than ``CHANGES_MAX_PAGE_SIZE``
+    changes are returned. Clients page through the change log by passing
+    the sequence number of the last change received as since.
+
+    Sequence numbers are assigned when a change is written, but concurrent
+    transactions may commit out of sequence order, e.g. on PostgreSQL. Hence
+    changes are only listed once they are older than
+    ``CHANGES_VISIBILITY_DELAY`` seconds, and the list ends before the first
+    more recent one, see :func:`visible_changes`.
+
+    :raises: AuthenticationError if user is invalid.
+    """
+    user = get_user_obj(username)  # raises AuthenticationError
+
+    max_page_size = current_app.config.get("CHANGES_MAX_PAGE_SIZE", 1000)
+    if limit is None or limit > max_page_size:
+        limit = max_page_size
+
+    base_uris = _search_base_uris(user)
+    return visible_changes(
+        Change.query
+        .filter(Change.base_uri.in_(base_uris))
+        .filter(Change.seq > since)
+        .order_by(Change.seq)
+        .limit(limit)
+        .all()
+    )
+
+
+def visible_changes(changes):
+    """Return the leading changes older than ``CHANGES_VISIBILITY_DELAY``.
+
+    Changes of transactions still in flight when a more recent one has
+    committed get a lower sequence number. Cutting the sequence-ordered
+    list before the first change within the delay keeps clients from
+    skipping them, as long as transactions commit within the delay.
+    """
+    cutoff = _visibility_cutoff()
+    if cutoff is None:
+        return changes
+
+    for i, change in enumerate(changes):
+        if change.changed_at > cutoff:
+            return changes[:i]
+    return changes
+
+
+def last_visible_seq():
+    """Return the sequence number ending the visible part of the change log.
+
+    This is the last change :func:`visible_changes` would return out of the
+    whole sequence-ordered change log, 0 if there is none.
+    """
+    query = sql_db.session.query(func.max(Change.seq))
+    cutoff = _visibility_cutoff()
+    if cutoff is not None:
+        first_recent = (sql_db.session.query(func.min(Change.seq))
+                        .filter(Change.changed_at > cutoff)
+                        .scalar())
+        if first_recent is not None:
+            query = query.filter(Change.seq < first_recent)
+    return query.scalar() or 0
+
+
+def _visibility_cutoff():
+    """Return the time changes must be older than to be visible, or None."""
+    delay = current_app.config.get("CHANGES_VISIBILITY_DELAY", 1.0)
+    if delay <= 0:
+        return None
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(
+        seconds=delay)
+
+
 #############################################################################
 # Dataset information retrieval helper functions
 #############################################################################
@@ -1015,6 +1625,7 @@ def list_admin_metadata_in_base_uri(base_uri_str):
 #############################################################################
 
 
+@read_replica()
 def get_readme_from_uri_by_user(username, uri):
     """Return the readme.
 
@@ -1034,12 +1645,13 @@ def get_readme_from_uri_by_user(username, uri):
     if base_uri is None:
         raise (UnknownBaseURIError())
 
-    if base_uri not in user.search_base_uris:
+    if not _may_search(user, base_uri):
         raise (AuthorizationError())
 
     return current_app.retrieve.get_readme(uri)
 
 
+@read_replica()
 def get_manifest_from_uri_by_user(username, uri):
     """Return the manifest.
 
@@ -1059,12 +1671,42 @@ def get_manifest_from_uri_by_user(username, uri):
     if base_uri is None:
         raise (UnknownBaseURIError())
 
-    if base_uri not in user.search_base_uris:
+    if not _may_search(user, base_uri):
         raise (AuthorizationError())
 
     return current_app.retrieve.get_manifest(uri)
 
 
+@read_replica()
+def get_manifest_items_from_uri_by_user(username, uri, offset=0, limit=None):
+    """Return a range of the manifest's items.
+
+    :param username: username
+    :param uri: dataset URI
+    :param offset: index of the first item to return
+    :param limit: maximum number of items to return, all if None
+    :returns: dictionary of manifest items
+    :raises: AuthenticationError if user is invalid.
+             AuthorizationError if the user has not got permissions to read
+             content in the base URI
+             UnknownBaseURIError if the base URI has not been registered.
+             UnknownURIError if the URI is not available to the user.
+    """
+    user = get_user_obj(username)
+
+    base_uri_str = uri.rsplit("/", 1)[0]
+    base_uri = _get_base_uri_obj(base_uri_str)
+    if base_uri is None:
+        raise (UnknownBaseURIError())
+
+    if not _may_search(user, base_uri):
+        raise (AuthorizationError())
+
+    return current_app.retrieve.get_manifest_items(
+        uri, offset=offset, limit=limit)
+
+
+@read_replica()
 def get_tags_from_uri_by_user(username, uri):
     """Return tags.
 
@@ -1084,12 +1726,13 @@ def get_tags_from_uri_by_user(username, uri):
     if base_uri is None:
         raise (UnknownBaseURIError())
 
-    if base_uri not in user.search_base_uris:
+    if not _may_search(user, base_uri):
         raise (AuthorizationError())
 
     return current_app.retrieve.get_tags(uri)
 
 
+@read_replica()
 def get_annotations_from_uri_by_user(username, uri):
     """Return the annotations.
 
@@ -1109,77 +1752,272 @@ def get_annotations_from_uri_by_user(username, uri):
     if base_uri is None:
         raise (UnknownBaseURIError())
 
-    if base_uri not in user.search_base_uris:
+    if not _may_search(user, base_uri):
         raise (AuthorizationError())
 
     return current_app.retrieve.get_annotations(uri)
 
 
-def _update_tags_in_storage(uri, tags):
-    """Update tags in the actual storage backend using dtoolcore.
+def _filter_uris_by_search_permissions(user, uris):
+    """Return unique URIs in base URIs the user may search, in order."""
+    allowed_base_uris = set(_search_base_uris(user))
+    return [uri for uri in dict.fromkeys(uris)
+            if uri.rsplit("/", 1)[0] in allowed_base_uris]
+
+
+@read_replica()
+def get_readmes_from_uris_by_user(username, uris):
+    """Return the readmes of many datasets at once.
+
+    :param username: username
+    :param uris: list of dataset URIs
+    :returns: dictionary of dataset readmes by URI, omitting URIs the user
+              has not got permissions to read and unknown URIs
+    :raises: AuthenticationError if user is invalid.
+    """
+    user = get_user_obj(username)
+    uris = _filter_uris_by_search_permissions(user, uris)
+    return current_app.retrieve.get_readmes_by_uris(uris)
+
+
+@read_replica()
+def get_annotations_from_uris_by_user(username, uris):
+    """Return the annotations of many datasets at once.
+
+    :param username: username
+    :param uris: list of dataset URIs
+    :returns: dictionary of dataset annotations by URI, omitting URIs the
+              user has not got permissions to read and unknown URIs
+    :raises: AuthenticationError if user is invalid.
+    """
+    user = get_user_obj(username)
+    uris = _filter_uris_by_search_permissions(user, uris)
+    return current_app.retrieve.get_annotations_by_uris(uris)
+
+
+@read_replica()
+def get_tags_from_uris_by_user(username, uris):
+    """Return the tags of many datasets at once.
+
+    :param username: username
+    :param uris: list of dataset URIs
+    :returns: dictionary of dataset tags by URI, omitting URIs the user
+              has not got permissions to read and unknown URIs
+    :raises: AuthenticationError if user is invalid.
+    """
+    user = get_user_obj(username)
+    uris = _filter_uris_by_search_permissions(user, uris)
+    return current_app.retrieve.get_tags_by_uris(uris)
+
+
+def _check_register_permission(username, uri):
+    """Raise unless the user may modify content in the dataset's base URI."""
+    user = get_user_obj(username)
+
+    base_uri_str = uri.rsplit("/", 1)[0]
+    base_uri = _get_base_uri_obj(base_uri_str)
+    if base_uri is None:
+        raise (UnknownBaseURIError())
+
+    if not _may_register(user, base_uri):
+        raise (AuthorizationError())
+
+
+class _DataSetHandleCache:
+    """Bounded cache of opened :class:`dtoolcore.DataSet` handles by URI.
+
+    Opening a dataset reads its admin metadata from the storage backend.
+    Handles are reused for ``ttl`` seconds, at most ``maxsize`` handles are
+    kept, the least recently used ones are dropped first.
+    """
+
+    def __init__(self):
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uri, maxsize, ttl):
+        if maxsize <= 0:
+            return dtoolcore.DataSet.from_uri(uri)
+
+        now = time.monotonic()
+        with self._lock:
+            cached = self._handles.get(uri)
+            if cached is not None and now - cached[1] < ttl:
+                self._handles.move_to_end(uri)
+                return cached[0]
+
+        dataset = dtoolcore.DataSet.from_uri(uri)
+
+        with self._lock:
+            self._handles[uri] = (dataset, now)
+            self._handles.move_to_end(uri)
+            while len(self._handles) > maxsize:
+                self._handles.popitem(last=False)
+        return dataset
+
+    def invalidate(self, uri):
+        with self._lock:
+            self._handles.pop(uri, None)
+
+    def clear(self):
+        with self._lock:
+            self._handles.clear()
+
+
+_dataset_handles = _DataSetHandleCache()
+
+
+def _open_dataset(uri):
+    """Return a possibly cached :class:`dtoolcore.DataSet` for uri."""
+    return _dataset_handles.get(
+        uri,
+        maxsize=current_app.config.get("DATASET_HANDLE_CACHE_SIZE", 0),
+        ttl=current_app.config.get("DATASET_HANDLE_CACHE_TTL", 300.0))
+
+
+def invalidate_dataset_handle(uri):
+    """Drop the cached :class:`dtoolcore.DataSet` handle of uri, if any."""
+    _dataset_handles.invalidate(uri)
+
+
+def apply_storage_write(uri, kind, payload):
+    """Apply a metadata update to the dataset in its storage backend.
 
     :param uri: dataset URI
-    :param tags: list of tags to set
+    :param kind: one of "tags", "tag_delta", "annotations",
+                 "annotation_delta" and "readme"
+    :param payload: dictionary describing the update
+    :raises: any error raised by the storage backend
     """
     try:
-        # Load the dataset
-        dataset = dtoolcore.DataSet.from_uri(uri)
+        _apply_storage_write(uri, kind, payload)
+    except Exception:
+        # The cached handle might be stale, open the dataset anew on retry.
+        invalidate_dataset_handle(uri)
+        raise
 
-        # Get existing tags from storage
-        existing_tags = set(dataset.list_tags())
-        new_tags = set(tags)
 
-        # Delete tags that are no longer present
-        for tag in existing_tags - new_tags:
-            logger.debug(f"Deleting tag '{tag}' from storage for {uri}")
-            try:
-                dataset.delete_tag(tag)
-            except Exception as e:
-                logger.warning(f"Failed to delete tag '{tag}': {e}")
+def _apply_storage_write(uri, kind, payload):
+    if kind == "tags":
+        _update_tags_in_storage(uri, payload["tags"])
+    elif kind == "tag_delta":
+        _update_tag_delta_in_storage(uri, payload["add"], payload["remove"])
+    elif kind == "annotations":
+        _update_annotations_in_storage(
+            uri, payload["annotations"], payload.get("previous"))
+    elif kind == "annotation_delta":
+        _update_annotation_delta_in_storage(
+            uri, payload["set"], payload["delete"])
+    elif kind == "readme":
+        _update_readme_in_storage(uri, payload["readme"])
+    else:
+        raise ValueError("Unknown kind of storage write '{}'".format(kind))
+
 
-        # Add new tags (put_tag includes name validation)
-        for tag in new_tags - existing_tags:
-            logger.debug(f"Adding tag '{tag}' to storage for {uri}")
-            dataset.put_tag(tag)
+def _write_to_storage(uri, kind, payload):
+    """Write metadata update to storage, via the write-behind queue if enabled.
 
-        logger.info(f"Updated tags in storage for {uri}")
+    Failures of synchronous writes are logged only, as the database update
+    has succeeded already.
+    """
+    if current_app.storage_writes.enabled:
+        current_app.storage_writes.enqueue(uri, kind, payload)
+        return
 
+    try:
+        apply_storage_write(uri, kind, payload)
     except Exception as e:
         # Log but don't fail - database update succeeded
-        logger.warning(f"Failed to update tags in storage for {uri}: {e}")
+        logger.warning(f"Failed to update {kind} in storage for {uri}: {e}")
 
 
-def _update_annotations_in_storage(uri, annotations):
-    """Update annotations in the actual storage backend using dtoolcore.
+def _update_tags_in_storage(uri, tags):
+    """Update tags in the actual storage backend using dtoolcore.
 
     :param uri: dataset URI
-    :param annotations: dictionary of annotations to set
+    :param tags: list of tags to set
     """
-    try:
-        # Load the dataset
-        dataset = dtoolcore.DataSet.from_uri(uri)
+    dataset = _open_dataset(uri)
 
-        # Get existing annotation names from storage
-        existing_annotations = set(dataset.list_annotation_names())
-        new_annotations = set(annotations.keys())
+    # Get existing tags from storage
+    existing_tags = set(dataset.list_tags())
+    new_tags = set(tags)
 
-        # Delete annotations that are no longer present
-        for annotation_name in existing_annotations - new_annotations:
-            logger.debug(f"Deleting annotation '{annotation_name}' from storage for {uri}")
-            try:
-                dataset.delete_annotation(annotation_name)
-            except Exception as e:
-                logger.warning(f"Failed to delete annotation '{annotation_name}': {e}")
+    # Delete tags that are no longer present
+    for tag in existing_tags - new_tags:
+        logger.debug(f"Deleting tag '{tag}' from storage for {uri}")
+        try:
+            dataset.delete_tag(tag)
+        except Exception as e:
+            logger.warning(f"Failed to delete tag '{tag}': {e}")
 
-        # Add/update annotations (put_annotation includes name validation)
-        for annotation_name, value in annotations.items():
-            logger.debug(f"Setting annotation '{annotation_name}' in storage for {uri}")
-            dataset.put_annotation(annotation_name, value)
+    # Add new tags (put_tag includes name validation)
+    for tag in new_tags - existing_tags:
+        logger.debug(f"Adding tag '{tag}' to storage for {uri}")
+        dataset.put_tag(tag)
 
-        logger.info(f"Updated annotations in storage for {uri}")
+    logger.info(f"Updated tags in storage for {uri}")
 
-    except Exception as e:
-        logger.warning(f"Failed to update annotations in storage for {uri}: {e}")
+
+def _update_tag_delta_in_storage(uri, add_tags, remove_tags):
+    """Add and remove tags in the actual storage backend using dtoolcore.
+
+    :param uri: dataset URI
+    :param add_tags: list of tags to add
+    :param remove_tags: list of tags to remove
+    """
+    dataset = _open_dataset(uri)
+
+    for tag in add_tags:
+        logger.debug(f"Adding tag '{tag}' to storage for {uri}")
+        dataset.put_tag(tag)
+
+    for tag in remove_tags:
+        logger.debug(f"Deleting tag '{tag}' from storage for {uri}")
+        try:
+            dataset.delete_tag(tag)
+        except Exception as e:
+            logger.warning(f"Failed to delete tag '{tag}': {e}")
+
+    logger.info(f"Updated tags in storage for {uri}")
+
+
+def _update_annotations_in_storage(uri, annotations,
+                                   previous_annotations=None):
+    """Update annotations in the actual storage backend using dtoolcore.
+
+    Only annotations that differ from previous_annotations are written.
+
+    :param uri: dataset URI
+    :param annotations: dictionary of annotations to set
+    :param previous_annotations: dictionary of annotations known before the
+                                 update, all annotations are written if None
+    """
+    dataset = _open_dataset(uri)
+
+    # Get existing annotation names from storage
+    existing_annotations = set(dataset.list_annotation_names())
+    new_annotations = set(annotations.keys())
+
+    # Delete annotations that are no longer present
+    for annotation_name in existing_annotations - new_annotations:
+        logger.debug(f"Deleting annotation '{annotation_name}' from storage for {uri}")
+        try:
+            dataset.delete_annotation(annotation_name)
+        except Exception as e:
+            logger.warning(f"Failed to delete annotation '{annotation_name}': {e}")
+
+    # Add/update annotations (put_annotation includes name validation)
+    for annotation_name, value in annotations.items():
+        if (previous_annotations is not None
+                and annotation_name in existing_annotations
+                and annotation_name in previous_annotations
+                and previous_annotations[annotation_name] == value):
+            continue
+        logger.debug(f"Setting annotation '{annotation_name}' in storage for {uri}")
+        dataset.put_annotation(annotation_name, value)
+
+    logger.info(f"Updated annotations in storage for {uri}")
 
 
 def set_tags_for_uri_by_user(username, uri, tags):
@@ -1195,16 +2033,8 @@ def set_tags_for_uri_by_user(username, uri, tags):
              UnknownBaseURIError if the base URI has not been registered.
              UnknownURIError if the URI is not available to the user.
     """
-    user = get_user_obj(username)
-
-    base_uri_str = uri.rsplit("/", 1)[0]
-    base_uri = _get_base_uri_obj(base_uri_str)
-    if base_uri is None:
-        raise (UnknownBaseURIError())
-
     # Check if user has register permissions (write access) for this base URI
-    if base_uri not in user.register_base_uris:
-        raise (AuthorizationError())
+    _check_register_permission(username, uri)
 
     # Update tags in both search and retrieve plugins (database)
     if hasattr(current_app.search, "set_tags"):
@@ -1216,13 +2046,109 @@ def set_tags_for_uri_by_user(username, uri, tags):
         current_app.retrieve.set_tags(uri, tags)
     else:
         logger.warning("Retrieve plugin has no method 'set_tags'")
+    invalidate_search_results()
+    _record_changes([uri], "tags")
 
     # Update tags in actual storage backend
-    _update_tags_in_storage(uri, tags)
+    _write_to_storage(uri, "tags", {"tags": tags})
 
     return tags
 
 
+def _update_in_plugins(uri, kind, method, *args):
+    """Apply a single tag or annotation update via the plugins' method.
+
+    The methods are declared on SearchABC and RetrieveABC, which read,
+    change and write all tags or annotations unless a plugin implements
+    the update itself.
+
+    :param kind: kind of change to record, "tags" or "annotations"
+    :param method: name of the method, e.g. 'add_tags' or 'set_annotation'
+    :returns: updated tags or annotations as returned by the retrieve plugin
+    """
+    getattr(current_app.search, method)(uri, *args)
+    updated = getattr(current_app.retrieve, method)(uri, *args)
+    invalidate_search_results()
+    _record_changes([uri], kind)
+
+    return updated
+
+
+def add_tags_for_uri_by_user(username, uri, tags):
+    """Add tags to a dataset, keeping existing ones.
+
+    Plugins implementing 'add_tags' are sent only the delta, as is the
+    storage backend, see :class:`dservercore.SearchABC`.
+
+    :param username: username
+    :param uri: dataset URI
+    :param tags: list of tags to add
+    :returns: updated list of tags
+    :raises: AuthenticationError if user is invalid.
+             AuthorizationError if the user has not got permissions to modify
+             content in the base URI
+             UnknownBaseURIError if the base URI has not been registered.
+             UnknownURIError if the URI is not available to the user.
+    """
+    _check_register_permission(username, uri)
+
+    updated_tags = _update_in_plugins(uri, "tags", "add_tags", tags)
+
+    _write_to_storage(uri, "tag_delta", {"add": tags, "remove": []})
+
+    return updated_tags
+
+
+def remove_tags_for_uri_by_user(username, uri, tags):
+    """Remove tags from a dataset, keeping all others.
+
+    Plugins implementing 'remove_tags' are sent only the delta, as is the
+    storage backend, see :class:`dservercore.SearchABC`.
+
+    :param username: username
+    :param uri: dataset URI
+    :param tags: list of tags to remove
+    :returns: updated list of tags
+    :raises: AuthenticationError if user is invalid.
+             AuthorizationError if the user has not got permissions to modify
+             content in the base URI
+             UnknownBaseURIError if the base URI has not been registered.
+             UnknownURIError if the URI is not available to the user.
+    """
+    _check_register_permission(username, uri)
+
+    updated_tags = _update_in_plugins(uri, "tags", "remove_tags", tags)
+
+    _write_to_storage(uri, "tag_delta", {"add": [], "remove": tags})
+
+    return updated_tags
+
+
+def _update_annotation_delta_in_storage(uri, set_annotations,
+                                        delete_annotations):
+    """Set and delete single annotations in the actual storage backend
+    using dtoolcore.
+
+    :param uri: dataset URI
+    :param set_annotations: dictionary of annotations to set
+    :param delete_annotations: list of names of annotations to delete
+    """
+    dataset = _open_dataset(uri)
+
+    for annotation_name, value in set_annotations.items():
+        logger.debug(f"Setting annotation '{annotation_name}' in storage for {uri}")
+        dataset.put_annotation(annotation_name, value)
+
+    for annotation_name in delete_annotations:
+        logger.debug(f"Deleting annotation '{annotation_name}' from storage for {uri}")
+        try:
+            dataset.delete_annotation(annotation_name)
+        except Exception as e:
+            logger.warning(f"Failed to delete annotation '{annotation_name}': {e}")
+
+    logger.info(f"Updated annotations in storage for {uri}")
+
+
 def set_annotations_for_uri_by_user(username, uri, annotations):
     """Set all annotations for a dataset (replaces existing annotations).
 
@@ -1236,16 +2162,14 @@ def set_annotations_for_uri_by_user(username, uri, annotations):
              UnknownBaseURIError if the base URI has not been registered.
              UnknownURIError if the URI is not available to the user.
     """
-    user = get_user_obj(username)
-
-    base_uri_str = uri.rsplit("/", 1)[0]
-    base_uri = _get_base_uri_obj(base_uri_str)
-    if base_uri is None:
-        raise (UnknownBaseURIError())
-
     # Check if user has register permissions (write access) for this base URI
-    if base_uri not in user.register_base_uris:
-        raise (AuthorizationError())
+    _check_register_permission(username, uri)
+
+    # Remember current annotations to write only changed ones to storage
+    try:
+        previous_annotations = current_app.retrieve.get_annotations(uri)
+    except UnknownURIError:
+        previous_annotations = None
 
     # Update annotations in both search and retrieve plugins (database)
     if hasattr(current_app.search, "set_annotations"):
@@ -1257,9 +2181,12 @@ def set_annotations_for_uri_by_user(username, uri, annotations):
         current_app.retrieve.set_annotations(uri, annotations)
     else:
         logger.warning("Retrieve plugin has no method 'set_annotations'")
+    invalidate_search_results()
+    _record_changes([uri], "annotations")
 
     # Update annotations in actual storage backend
-    _update_annotations_in_storage(uri, annotations)
+    _write_to_storage(uri, "annotations", {
+        "annotations": annotations, "previous": previous_annotations})
 
     return annotations
 
@@ -1278,14 +2205,15 @@ def set_annotation_for_uri_by_user(username, uri, annotation_name, value):
              UnknownBaseURIError if the base URI has not been registered.
              UnknownURIError if the URI is not available to the user.
     """
-    # Get existing annotations
-    existing_annotations = get_annotations_from_uri_by_user(username, uri)
+    _check_register_permission(username, uri)
 
-    # Update the specific annotation
-    existing_annotations[annotation_name] = value
+    updated_annotations = _update_in_plugins(
+        uri, "annotations", "set_annotation", annotation_name, value)
 
-    # Set all annotations
-    return set_annotations_for_uri_by_user(username, uri, existing_annotations)
+    _write_to_storage(uri, "annotation_delta", {
+        "set": {annotation_name: value}, "delete": []})
+
+    return updated_annotations
 
 
 def delete_annotation_for_uri_by_user(username, uri, annotation_name):
@@ -1301,15 +2229,15 @@ def delete_annotation_for_uri_by_user(username, uri, annotation_name):
              UnknownBaseURIError if the base URI has not been registered.
              UnknownURIError if the URI is not available to the user.
     """
-    # Get existing annotations
-    existing_annotations = get_annotations_from_uri_by_user(username, uri)
+    _check_register_permission(username, uri)
+
+    updated_annotations = _update_in_plugins(
+        uri, "annotations", "delete_annotation", annotation_name)
 
-    # Remove the annotation if it exists
-    if annotation_name in existing_annotations:
-        del existing_annotations[annotation_name]
+    _write_to_storage(uri, "annotation_delta", {
+        "set": {}, "delete": [annotation_name]})
 
-    # Set all annotations
-    return set_annotations_for_uri_by_user(username, uri, existing_annotations)
+    return updated_annotations
 
 
 def _update_readme_in_storage(uri, content):
@@ -1318,19 +2246,13 @@ def _update_readme_in_storage(uri, content):
     :param uri: dataset URI
     :param content: README content string
     """
-    try:
-        # Load the dataset
-        dataset = dtoolcore.DataSet.from_uri(uri)
-
-        # Update the README using put_readme
-        logger.debug(f"Updating README in storage for {uri}")
-        dataset.put_readme(content)
+    dataset = _open_dataset(uri)
 
-        logger.info(f"Updated README in storage for {uri}")
+    # Update the README using put_readme
+    logger.debug(f"Updating README in storage for {uri}")
+    dataset.put_readme(content)
 
-    except Exception as e:
-        # Log but don't fail - database update succeeded
-        logger.warning(f"Failed to update README in storage for {uri}: {e}")
+    logger.info(f"Updated README in storage for {uri}")
 
 
 def set_readme_for_uri_by_user(username, uri, content):
@@ -1346,16 +2268,8 @@ def set_readme_for_uri_by_user(username, uri, content):
              UnknownBaseURIError if the base URI has not been registered.
              UnknownURIError if the URI is not available to the user.
     """
-    user = get_user_obj(username)
-
-    base_uri_str = uri.rsplit("/", 1)[0]
-    base_uri = _get_base_uri_obj(base_uri_str)
-    if base_uri is None:
-        raise (UnknownBaseURIError())
-
     # Check if user has register permissions (write access) for this base URI
-    if base_uri not in user.register_base_uris:
-        raise (AuthorizationError())
+    _check_register_permission(username, uri)
 
     # Update README in both search and retrieve plugins (database)
     if hasattr(current_app.search, "set_readme"):
@@ -1367,8 +2281,151 @@ def set_readme_for_uri_by_user(username, uri, content):
         current_app.retrieve.set_readme(uri, content)
     else:
         logger.warning("Retrieve plugin has no method 'set_readme'")
+    invalidate_search_results()
+    _record_changes([uri], "readme")
 
     # Update README in actual storage backend
-    _update_readme_in_storage(uri, content)
+    _write_to_storage(uri, "readme", {"readme": content})
 
     return content
+
+
+#############################################################################
+# Bulk metadata updates
+#############################################################################
+
+
+def _resolve_bulk_update_uris(username, uris=None, query=None):
+    """Resolve the datasets targeted by a bulk update.
+
+    Datasets are selected either by a list of URIs or by a search query.
+    Register permissions are checked once per base URI.
+
+    A query may select at most ``MAX_BATCH_SIZE`` datasets. It is answered
+    by the primary database and the search plugin, bypassing the read
+    replica and the search result cache, which may both lag behind.
+
+    :returns: tuple of lists of URIs the user may modify, URIs the user may
+              see but not modify and URIs that are unknown to the user
+    :raises: AuthenticationError if user is invalid.
+             ValidationError if the query selects too many datasets.
+    """
+    get_user_obj(username)  # raises AuthenticationError
+
+    if query is not None:
+        found = []
+        query = preprocess_query_base_uris(username, dict(query))
+        if len(query["base_uris"]) > 0:
+            max_datasets = current_app.config.get("MAX_BATCH_SIZE", 1000)
+            datasets = _search_datasets(
+                query, PaginationParameters(page=1, page_size=max_datasets + 1),
+                SortParameters(["+uri"]))
+            if len(datasets) > max_datasets:
+                raise (ValidationError(
+                    "Query selects more than {} datasets".format(
+                        max_datasets)))
+            found = list(dict.fromkeys(ds["uri"] for ds in datasets))
+        not_found = []
+    else:
+        found = [ds.uri for ds in get_datasets_by_user_and_uris(username, uris)]
+        found_set = set(found)
+        not_found = [uri for uri in dict.fromkeys(uris)
+                     if uri not in found_set]
+
+    register_base_uris = set(sql_db.session.execute(
+        REGISTER_BASE_URIS_BY_USERNAME, {"username": username}).scalars())
+    updatable, forbidden = [], []
+    for uri in found:
+        if uri.rsplit("/", 1)[0] in register_base_uris:
+            updatable.append(uri)
+        else:
+            forbidden.append(uri)
+
+    return updatable, forbidden, not_found
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def bulk_update_tags_by_user(username, add_tags=(), remove_tags=(),
+                             uris=None, query=None):
+    """Add and remove tags of many datasets at once.
+
+    Datasets are selected either by a list of URIs or by a search query.
+    Changes are applied to plugins and storage in batches of
+    ``BULK_BATCH_SIZE`` datasets.
+
+    :param username: username
+    :param add_tags: list of tags to add
+    :param remove_tags: list of tags to remove
+    :param uris: list of dataset URIs
+    :param query: dictionary specifying query, see SearchDatasetSchema
+    :returns: dictionary with lists of 'updated' URIs, URIs the user is not
+              allowed to modify ('forbidden') and unknown URIs ('not_found')
+    :raises: AuthenticationError if user is invalid.
+             ValidationError if the query selects more than
+             ``MAX_BATCH_SIZE`` datasets.
+    """
+    updatable, forbidden, not_found = _resolve_bulk_update_uris(
+        username, uris=uris, query=query)
+
+    add_tags = list(dict.fromkeys(add_tags))
+    remove_tags = [tag for tag in dict.fromkeys(remove_tags)
+                   if tag not in add_tags]
+
+    batch_size = current_app.config.get("BULK_BATCH_SIZE", 500)
+    for chunk in _chunks(updatable, batch_size):
+        for plugin in [current_app.search, current_app.retrieve]:
+            plugin.update_tags_by_uris(chunk, add_tags, remove_tags)
+        invalidate_search_results()
+        _record_changes(chunk, "tags")
+        for uri in chunk:
+            _write_to_storage(
+                uri, "tag_delta", {"add": add_tags, "remove": remove_tags})
+
+    return {"updated": updatable, "forbidden": forbidden,
+            "not_found": not_found}
+
+
+def bulk_update_annotations_by_user(username, set_annotations=None,
+                                    delete_annotations=(),
+                                    uris=None, query=None):
+    """Set and delete annotations of many datasets at once.
+
+    Datasets are selected either by a list of URIs or by a search query.
+    Changes are applied to plugins and storage in batches of
+    ``BULK_BATCH_SIZE`` datasets.
+
+    :param username: username
+    :param set_annotations: dictionary of annotations to set
+    :param delete_annotations: list of names of annotations to delete
+    :param uris: list of dataset URIs
+    :param query: dictionary specifying query, see SearchDatasetSchema
+    :returns: dictionary with lists of 'updated' URIs, URIs the user is not
+              allowed to modify ('forbidden') and unknown URIs ('not_found')
+    :raises: AuthenticationError if user is invalid.
+             ValidationError if the query selects more than
+             ``MAX_BATCH_SIZE`` datasets.
+    """
+    updatable, forbidden, not_found = _resolve_bulk_update_uris(
+        username, uris=uris, query=query)
+
+    set_annotations = dict(set_annotations or {})
+    delete_annotations = [name for name in dict.fromkeys(delete_annotations)
+                          if name not in set_annotations]
+
+    batch_size = current_app.config.get("BULK_BATCH_SIZE", 500)
+    for chunk in _chunks(updatable, batch_size):
+        for plugin in [current_app.search, current_app.retrieve]:
+            plugin.update_annotations_by_uris(
+                chunk, set_annotations, delete_annotations)
+        invalidate_search_results()
+        _record_changes(chunk, "annotations")
+        for uri in chunk:
+            _write_to_storage(uri, "annotation_delta", {
+                "set": set_annotations, "delete": delete_annotations})
+
+    return {"updated": updatable, "forbidden": forbidden,
+            "not_found": not_found}
@@ -2,9 +2,16 @@
 
 from functools import wraps
 
-from dservercore.sql_models import (
-    User,
-    BaseURI,
+from dservercore import sql_db
+from dservercore.sql_statements import (
+    BASE_URI_BY_NAME,
+    REGISTER_BASE_URIS_BY_USERNAME,
+    REGISTER_PERMISSION_BY_NAMES,
+    SEARCH_BASE_URIS_BY_USERNAME,
+    SEARCH_PERMISSION_BY_NAMES,
+    USER_BY_USERNAME,
+    USER_ID_BY_USERNAME,
+    USER_IS_ADMIN_BY_USERNAME,
 )
 
 from flask import current_app
@@ -44,38 +51,35 @@ def get_jwt():
 
 
 def _get_user_obj(username):
-    return User.query.filter_by(username=username).first()
+    return sql_db.session.execute(
+        USER_BY_USERNAME, {"username": username}).scalar()
 
 
 def _get_base_uri_obj(base_uri):
-    return BaseURI.query.filter_by(base_uri=base_uri).first()
+    return sql_db.session.execute(
+        BASE_URI_BY_NAME, {"base_uri": base_uri}).scalar()
 
 
 def user_exists(username):
     """Return True if the user exists."""
-    user = _get_user_obj(username)
-    if user is None:
-        return False
-    return True
+    user_id = sql_db.session.execute(
+        USER_ID_BY_USERNAME, {"username": username}).scalar()
+    return user_id is not None
 
 
 def has_admin_rights(username):
     """Return True if user has admin rights."""
-    user = _get_user_obj(username)
-    if user is None:
-        return False
-    return user.is_admin
+    is_admin = sql_db.session.execute(
+        USER_IS_ADMIN_BY_USERNAME, {"username": username}).scalar()
+    return bool(is_admin)
 
 
 def may_search(username, base_uri):
     """Return True if user has privileges to search the base URI."""
-    user = _get_user_obj(username)
-    if user is None:
-        return False
-    base_uri = _get_base_uri_obj(base_uri)
-    if base_uri is None:
-        return False
-    return base_uri in user.search_base_uris
+    permission = sql_db.session.execute(
+        SEARCH_PERMISSION_BY_NAMES,
+        {"username": username, "base_uri": base_uri}).first()
+    return permission is not None
 
 
 def may_access(username, uri):
@@ -86,26 +90,19 @@ def may_access(username, uri):
 
 def may_register(username, base_uri):
     """Return True if user has privileges to register on the base URI."""
-    user = _get_user_obj(username)
-    if user is None:
-        return False
-    base_uri = _get_base_uri_obj(base_uri)
-    if base_uri is None:
-        return False
-    return base_uri in user.register_base_uris
+    permission = sql_db.session.execute(
+        REGISTER_PERMISSION_BY_NAMES,
+        {"username": username, "base_uri": base_uri}).first()
+    return permission is not None
 
 
 def list_search_base_uris(username):
     """Return list of base URIs the user may search."""
-    user = _get_user_obj(username)
-    if user is None:
-        return []
-    return [bu.base_uri for bu in user.search_base_uris]
+    return list(sql_db.session.execute(
+        SEARCH_BASE_URIS_BY_USERNAME, {"username": username}).scalars())
 
 
 def list_register_base_uris(username):
     """Return list of base URIs the user may regiester datasets to."""
-    user = _get_user_obj(username)
-    if user is None:
-        return []
-    return [bu.base_uri for bu in user.register_base_uris]
+    return list(sql_db.session.execute(
+        REGISTER_BASE_URIS_BY_USERNAME, {"username": username}).scalars())
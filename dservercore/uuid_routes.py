@@ -1,7 +1,12 @@
 """Routes for querying dataset entries by their UUIDs"""
+import json
+
 from flask import (
     abort,
-    jsonify
+    current_app,
+    jsonify,
+    Response,
+    stream_with_context,
 )
 from dservercore.utils_auth import (
     jwt_required,
@@ -12,10 +17,12 @@ from flask_smorest.pagination import PaginationParameters
 
 from dservercore.blueprint import Blueprint
 from dservercore.sort import SortParameters
-from dservercore.sql_models import DatasetSchema
+from dservercore.schemas import UUIDListSchema
+from dservercore.sql_models import DatasetSchema, DatasetsByUUIDSchema
 import dservercore.utils_auth
 from dservercore.utils import (
     lookup_datasets_by_user_and_uuid,
+    lookup_datasets_by_user_and_uuids,
     DATASET_SORT_FIELDS
 )
 
@@ -23,6 +30,42 @@ from dservercore.utils import (
 bp = Blueprint("uuids", __name__, url_prefix="/uuids")
 
 
+def _stream_datasets_by_uuid(groups):
+    """Yield JSON document of DatasetsByUUIDSchema group by group."""
+    schema = DatasetSchema(many=True)
+    yield '{"datasets": {'
+    separator = ""
+    for uuid, datasets in groups:
+        yield "{}{}: {}".format(
+            separator, json.dumps(uuid), json.dumps(schema.dump(datasets)))
+        separator = ", "
+    yield "}}"
+
+
+@bp.route("", methods=["POST"])
+@bp.arguments(UUIDListSchema)
+@bp.response(200, DatasetsByUUIDSchema)
+@bp.alt_response(401, description="Not registered")
+@jwt_required()
+def uuids_post(data):
+    """List all instances of many datasets at once, grouped by UUID.
+
+    Every requested UUID maps to the list of datasets in any base URIs the
+    user has access to, sorted by URI. The response is streamed.
+    """
+    username = get_jwt_identity()
+    if not dservercore.utils_auth.user_exists(username):
+        # Unregistered users should see 401.
+        abort(401)
+
+    groups = lookup_datasets_by_user_and_uuids(
+        username, data["uuids"],
+        batch_size=current_app.config.get("UUID_LOOKUP_BATCH_SIZE", 500))
+
+    return Response(stream_with_context(_stream_datasets_by_uuid(groups)),
+                    mimetype="application/json")
+
+
 @bp.route("/<uuid>", methods=["GET"])
 @bp.sort(sort=["+uri"], allowed_sort_fields=DATASET_SORT_FIELDS)
 @bp.paginate()
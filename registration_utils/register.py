@@ -1,10 +1,13 @@
+import gzip
+import json
+
 import click
 import requests
 import yaml
 
 from dtoolcore import iter_datasets_in_base_uri
 
-from dserver.utils import generate_dataset_info
+from dservercore.utils import generate_dataset_info, uri_to_url_suffix
 
 
 def get_projects(fpath):
@@ -22,6 +25,11 @@ def get_header(token):
     }
 
 
+def compress_payload(data):
+    """Return JSON-serialized, gzip-compressed request body."""
+    return gzip.compress(json.dumps(data).encode("utf-8"))
+
+
 def register_base_uris(projects_fpath, token, lookup_server_url):
     "Register base URIs."
     projects = get_projects(projects_fpath)
@@ -85,7 +93,7 @@ def register_permissions(projects_fpath, token, lookup_server_url):
         print(response.status_code, response.reason)
 
 
-def register_data(projects_fpath, token, lookup_server_url):
+def register_data(projects_fpath, token, lookup_server_url, compress=True):
     "Register data."
     projects = get_projects(projects_fpath)
     for b_uri in projects.keys():
@@ -96,10 +104,19 @@ def register_data(projects_fpath, token, lookup_server_url):
             except:  # NOQA
                 print("Failed to generate dataset info")
                 continue
-            response = requests.post(
-                lookup_server_url + "/dataset/register",
-                headers=get_header(token),
-                json=dataset_info,
+            url = lookup_server_url + "/uris/" + uri_to_url_suffix(dataset.uri)
+            headers = get_header(token)
+            if compress:
+                # The manifest dominates the payload of large datasets and
+                # compresses well, sending it compressed speeds up uploads.
+                headers["Content-Encoding"] = "gzip"
+                body = compress_payload(dataset_info)
+            else:
+                body = json.dumps(dataset_info)
+            response = requests.put(
+                url,
+                headers=headers,
+                data=body,
                 verify=False
             )
             print(response.status_code, response.reason)
@@ -141,21 +158,25 @@ def permissions(projects_file, token, lookup_server_url):
 @click.argument("projects_file", type=click.Path(exists=True, dir_okay=False))
 @click.argument("token")
 @click.argument("lookup_server_url")
-def data(projects_file, token, lookup_server_url):
+@click.option("--compress/--no-compress", default=True, show_default=True,
+              help="Send gzip-compressed dataset payloads.")
+def data(projects_file, token, lookup_server_url, compress):
     "Register data."
-    register_data(projects_file, token, lookup_server_url)
+    register_data(projects_file, token, lookup_server_url, compress=compress)
 
 
 @register.command()
 @click.argument("projects_file", type=click.Path(exists=True, dir_okay=False))
 @click.argument("token")
 @click.argument("lookup_server_url")
-def all(projects_file, token, lookup_server_url):
+@click.option("--compress/--no-compress", default=True, show_default=True,
+              help="Send gzip-compressed dataset payloads.")
+def all(projects_file, token, lookup_server_url, compress):
     "Register base URI, users, permissions and data."
     register_base_uris(projects_file, token, lookup_server_url)
     register_users(projects_file, token, lookup_server_url)
     register_permissions(projects_file, token, lookup_server_url)
-    register_data(projects_file, token, lookup_server_url)
+    register_data(projects_file, token, lookup_server_url, compress=compress)
 
 
 if __name__ == "__main__":
@@ -347,6 +347,93 @@ def tmp_app_with_data_client(tmp_app_with_data):
     return tmp_app_with_data.test_client()
 
 
+@pytest.fixture
+def tmp_app_with_write_behind(request, tmp_path):
+    """App writing metadata back to a local dataset via the write-behind
+    queue, drained by worker threads as in production."""
+
+    import dtoolcore
+
+    from flask import current_app
+
+    from dservercore import create_app, sql_db
+    from dservercore.utils import (
+        generate_dataset_info,
+        register_users,
+        register_base_uri,
+        register_dataset,
+        register_permissions,
+    )
+
+    tmp_mongo_db_name = random_string()
+
+    config = {
+        "API_TITLE": 'dservercore API',
+        "API_VERSION": 'v1',
+        "OPENAPI_VERSION": '3.0.2',
+        # The worker threads need a database shared between connections.
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///{}".format(
+            tmp_path / "dserver.sqlite"),
+        "RETRIEVE_MONGO_URI": TEST_MONGO_URI,
+        "RETRIEVE_MONGO_DB": tmp_mongo_db_name,
+        "RETRIEVE_MONGO_COLLECTION": "datasets",
+        "SEARCH_MONGO_URI": TEST_MONGO_URI,
+        "SEARCH_MONGO_DB": tmp_mongo_db_name,
+        "SEARCH_MONGO_COLLECTION": "datasets",
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "JWT_ALGORITHM": "RS256",
+        "JWT_PUBLIC_KEY": JWT_PUBLIC_KEY,
+        "JWT_TOKEN_LOCATION": "headers",
+        "JWT_HEADER_NAME": "Authorization",
+        "JWT_HEADER_TYPE": "Bearer",
+        "MONGO_URI": os.environ.get("TEST_MONGO_URI", "mongodb://localhost:27017/"),
+        "MONGO_DB": tmp_mongo_db_name,
+        "MONGO_COLLECTION": "dependencies",
+        "SQLITE_JOURNAL_MODE": "WAL",
+        "STORAGE_WRITE_BEHIND": True,
+        "STORAGE_WRITE_WORKERS": 2,
+        "STORAGE_WRITE_POLL_INTERVAL": 0.01,
+    }
+
+    app = create_app(config)
+
+    # Ensure the sql database has been put into the context.
+    app.app_context().push()
+
+    # Populate the database.
+    sql_db.Model.metadata.create_all(sql_db.engine)
+
+    # Register a local dataset.
+    (tmp_path / "datasets").mkdir()
+    proto_dataset = dtoolcore.create_proto_dataset(
+        "bad-apples", (tmp_path / "datasets").as_uri())
+    proto_dataset.put_readme("---\ndescription: apples from queen")
+    proto_dataset.put_annotation("type", "fruit")
+    proto_dataset.put_tag("evil")
+    proto_dataset.freeze()
+    dataset = dtoolcore.DataSet.from_uri(proto_dataset.uri)
+    base_uri = dataset.uri.rsplit("/", 1)[0]
+
+    register_users([dict(username="grumpy")])
+    register_base_uri(base_uri)
+    register_permissions(base_uri, {
+        "users_with_search_permissions": ["grumpy"],
+        "users_with_register_permissions": ["grumpy"]
+    })
+    register_dataset(generate_dataset_info(dataset, base_uri))
+
+    @request.addfinalizer
+    def teardown():
+        app.storage_writes.stop_workers(timeout=5)
+        current_app.retrieve.client.drop_database(tmp_mongo_db_name)
+        current_app.retrieve.client.close()
+        current_app.search.client.drop_database(tmp_mongo_db_name)
+        current_app.search.client.close()
+        sql_db.session.remove()
+
+    return app
+
+
 @pytest.fixture
 def tmp_cli_runner(request):
 
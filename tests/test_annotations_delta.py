@@ -0,0 +1,164 @@
+"""Test per-key annotation writes."""
+
+import json
+
+import dtoolcore
+
+from flask import current_app
+
+from dservercore.utils import uri_to_url_suffix
+
+
+URI = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+
+
+def test_set_and_delete_annotation_routes_with_plugin_hooks(
+        tmp_app_with_data_client,
+        grumpy_token,
+        sleepy_token,
+        monkeypatch):  # NOQA
+
+    calls = []
+    stored = {"type": "fruit", "only_here": "crazystuff"}
+
+    def search_set_annotation(uri, name, value):
+        calls.append(("search", "set_annotation", uri, name, value))
+
+    def search_delete_annotation(uri, name):
+        calls.append(("search", "delete_annotation", uri, name))
+
+    def retrieve_set_annotation(uri, name, value):
+        calls.append(("retrieve", "set_annotation", uri, name, value))
+        stored[name] = value
+        return dict(stored)
+
+    def retrieve_delete_annotation(uri, name):
+        calls.append(("retrieve", "delete_annotation", uri, name))
+        stored.pop(name, None)
+        return dict(stored)
+
+    def fail(*args):
+        raise AssertionError("Full annotations must not be read or written.")
+
+    for plugin, name, func in [
+            (current_app.search, "set_annotation", search_set_annotation),
+            (current_app.search, "delete_annotation", search_delete_annotation),
+            (current_app.search, "set_annotations", fail),
+            (current_app.retrieve, "set_annotation", retrieve_set_annotation),
+            (current_app.retrieve, "delete_annotation",
+             retrieve_delete_annotation),
+            (current_app.retrieve, "set_annotations", fail),
+            (current_app.retrieve, "get_annotations", fail)]:
+        monkeypatch.setattr(plugin, name, func, raising=False)
+
+    url = "/annotations/{}".format(uri_to_url_suffix(URI))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_data_client.put(
+        url + "/colour",
+        headers=headers,
+        data=json.dumps({"value": "orange"}),
+        content_type="application/json"
+    )
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["annotations"] == {
+        "type": "fruit", "only_here": "crazystuff", "colour": "orange"}
+
+    r = tmp_app_with_data_client.delete(url + "/only_here", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["annotations"] == {
+        "type": "fruit", "colour": "orange"}
+
+    assert calls == [
+        ("search", "set_annotation", URI, "colour", "orange"),
+        ("retrieve", "set_annotation", URI, "colour", "orange"),
+        ("search", "delete_annotation", URI, "only_here"),
+        ("retrieve", "delete_annotation", URI, "only_here"),
+    ]
+
+    # sleepy has got no register permissions
+    r = tmp_app_with_data_client.delete(
+        url + "/type", headers=dict(Authorization="Bearer " + sleepy_token))
+    assert r.status_code == 403
+
+
+def test_set_annotation_falls_back_to_set_annotations(
+        tmp_app_with_data_client,
+        grumpy_token,
+        monkeypatch):  # NOQA
+
+    written = {}
+
+    def search_set_annotations(uri, annotations):
+        written["search"] = annotations
+
+    def retrieve_set_annotations(uri, annotations):
+        written["retrieve"] = annotations
+
+    monkeypatch.setattr(current_app.search, "set_annotations",
+                        search_set_annotations, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "set_annotations",
+                        retrieve_set_annotations, raising=False)
+
+    url = "/annotations/{}/colour".format(uri_to_url_suffix(URI))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+    r = tmp_app_with_data_client.put(
+        url,
+        headers=headers,
+        data=json.dumps({"value": "orange"}),
+        content_type="application/json"
+    )
+    assert r.status_code == 200
+    expected = {"type": "fruit", "only_here": "crazystuff", "colour": "orange"}
+    assert written == {"search": expected, "retrieve": expected}
+
+    r = tmp_app_with_data_client.delete(
+        "/annotations/{}/type".format(uri_to_url_suffix(URI)),
+        headers=headers)
+    assert r.status_code == 200
+    expected = {"only_here": "crazystuff"}
+    assert json.loads(r.data.decode("utf-8"))["annotations"] == expected
+    assert written == {"search": expected, "retrieve": expected}
+
+
+def test_update_annotations_in_storage_writes_changed_keys_only(
+        tmp_app_with_data, tmp_path, monkeypatch):  # NOQA
+
+    from dservercore.utils import _update_annotations_in_storage
+
+    proto_dataset = dtoolcore.create_proto_dataset(
+        "annotated", tmp_path.as_uri())
+    proto_dataset.put_annotation("unchanged", {"large": list(range(100))})
+    proto_dataset.put_annotation("changed", 1)
+    proto_dataset.put_annotation("removed", True)
+    proto_dataset.freeze()
+    uri = proto_dataset.uri
+
+    previous = {
+        "unchanged": {"large": list(range(100))},
+        "changed": 1,
+        "removed": True,
+    }
+
+    written = []
+    put_annotation = dtoolcore.DataSet.put_annotation
+
+    def counting_put_annotation(self, name, value):
+        written.append(name)
+        return put_annotation(self, name, value)
+
+    monkeypatch.setattr(dtoolcore.DataSet, "put_annotation",
+                        counting_put_annotation)
+
+    _update_annotations_in_storage(uri, {
+        "unchanged": {"large": list(range(100))},
+        "changed": 2,
+        "added": "new",
+    }, previous)
+
+    assert sorted(written) == ["added", "changed"]
+
+    dataset = dtoolcore.DataSet.from_uri(uri)
+    assert sorted(dataset.list_annotation_names()) == [
+        "added", "changed", "unchanged"]
+    assert dataset.get_annotation("changed") == 2
@@ -0,0 +1,129 @@
+"""Test the /<resource>/batch routes."""
+
+import json
+
+from dservercore.utils import uri_to_url_suffix
+
+
+SNOW_WHITE_APPLES = "s3://snow-white/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+SNOW_WHITE_ORANGES = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+MR_MEN_APPLES = "s3://mr-men/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+UNKNOWN = "s3://snow-white/00000000-0000-0000-0000-000000000000"
+NO_PERMISSION = "s3://no-permission/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+
+URIS = [
+    MR_MEN_APPLES,
+    SNOW_WHITE_ORANGES,
+    UNKNOWN,
+    NO_PERMISSION,
+    uri_to_url_suffix(SNOW_WHITE_APPLES),
+]
+
+
+def _post(client, route, token, uris):
+    return client.post(
+        route,
+        headers=dict(Authorization="Bearer " + token),
+        data=json.dumps({"uris": uris}),
+        content_type="application/json"
+    )
+
+
+def test_uris_batch_route(tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    r = _post(tmp_app_with_data_client, "/uris/batch", grumpy_token, URIS)
+    assert r.status_code == 200
+
+    datasets = json.loads(r.data.decode("utf-8"))
+    # Order of request is preserved, unknown and inaccessible URIs omitted.
+    assert [ds["uri"] for ds in datasets] == [
+        MR_MEN_APPLES, SNOW_WHITE_ORANGES, SNOW_WHITE_APPLES]
+    assert datasets[1]["name"] == "oranges"
+
+
+def test_tags_batch_route(tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    r = _post(tmp_app_with_data_client, "/tags/batch", grumpy_token, URIS)
+    assert r.status_code == 200
+
+    tags = json.loads(r.data.decode("utf-8"))["tags"]
+    assert set(tags.keys()) == set(
+        [MR_MEN_APPLES, SNOW_WHITE_ORANGES, SNOW_WHITE_APPLES])
+    assert set(tags[SNOW_WHITE_ORANGES]) == set(["good", "fruit"])
+    assert set(tags[MR_MEN_APPLES]) == set(["evil", "fruit"])
+
+
+def test_annotations_batch_route(tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    r = _post(tmp_app_with_data_client, "/annotations/batch", grumpy_token, URIS)
+    assert r.status_code == 200
+
+    annotations = json.loads(r.data.decode("utf-8"))["annotations"]
+    assert annotations == {
+        MR_MEN_APPLES: {"type": "fruit"},
+        SNOW_WHITE_APPLES: {"type": "fruit"},
+        SNOW_WHITE_ORANGES: {"type": "fruit", "only_here": "crazystuff"},
+    }
+
+
+def test_readmes_batch_route(tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    r = _post(tmp_app_with_data_client, "/readmes/batch", grumpy_token, URIS)
+    assert r.status_code == 200
+
+    readmes = json.loads(r.data.decode("utf-8"))["readmes"]
+    assert readmes == {
+        MR_MEN_APPLES: "---\ndescripton: apples from queen",
+        SNOW_WHITE_APPLES: "---\ndescripton: apples from queen",
+        SNOW_WHITE_ORANGES: "---\ndescripton: oranges from queen",
+    }
+
+
+def test_batch_routes_without_permissions(
+        tmp_app_with_data_client,
+        sleepy_token,
+        noone_token):  # NOQA
+
+    for route, key in [("/tags/batch", "tags"),
+                       ("/annotations/batch", "annotations"),
+                       ("/readmes/batch", "readmes")]:
+        # User without search permissions sees nothing.
+        r = _post(tmp_app_with_data_client, route, sleepy_token, URIS)
+        assert r.status_code == 200
+        assert json.loads(r.data.decode("utf-8")) == {key: {}}
+
+        # Unregistered user.
+        r = _post(tmp_app_with_data_client, route, noone_token, URIS)
+        assert r.status_code == 401
+
+    r = _post(tmp_app_with_data_client, "/uris/batch", sleepy_token, URIS)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == []
+
+    r = _post(tmp_app_with_data_client, "/uris/batch", noone_token, URIS)
+    assert r.status_code == 401
+
+
+def test_batch_routes_limit(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token):  # NOQA
+
+    tmp_app_with_data.config["MAX_BATCH_SIZE"] = 2
+
+    for route in ["/uris/batch", "/tags/batch",
+                  "/annotations/batch", "/readmes/batch"]:
+        r = _post(tmp_app_with_data_client, route, grumpy_token, URIS)
+        assert r.status_code == 400
+
+        r = _post(tmp_app_with_data_client, route, grumpy_token, URIS[:2])
+        assert r.status_code == 200
+
+    # The list of URIs is required.
+    r = tmp_app_with_data_client.post(
+        "/tags/batch",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        data=json.dumps({}),
+        content_type="application/json"
+    )
+    assert r.status_code == 422
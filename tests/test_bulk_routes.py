@@ -0,0 +1,196 @@
+"""Test the /tags/bulk and /annotations/bulk routes."""
+
+import json
+
+from flask import current_app
+
+from dservercore.sql_models import StorageWrite
+from dservercore.utils import (
+    preprocess_query_base_uris,
+    register_permissions,
+    search_datasets_by_user,
+)
+
+
+SNOW_WHITE_APPLES = "s3://snow-white/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+SNOW_WHITE_ORANGES = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+MR_MEN_APPLES = "s3://mr-men/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+UNKNOWN = "s3://snow-white/00000000-0000-0000-0000-000000000000"
+
+
+def _post(client, route, token, data):
+    return client.post(
+        route,
+        headers=dict(Authorization="Bearer " + token),
+        data=json.dumps(data),
+        content_type="application/json"
+    )
+
+
+def _revoke_register_permission_on_mr_men():
+    register_permissions("s3://mr-men", {
+        "users_with_search_permissions": ["grumpy"],
+        "users_with_register_permissions": []
+    })
+
+
+def test_tags_bulk_route_by_uris(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token,
+        monkeypatch):  # NOQA
+
+    _revoke_register_permission_on_mr_men()
+    tmp_app_with_data.config["STORAGE_WRITE_BEHIND"] = True
+
+    calls = []
+
+    def update_tags_by_uris(uris, add_tags, remove_tags):
+        calls.append((uris, add_tags, remove_tags))
+
+    monkeypatch.setattr(current_app.search, "update_tags_by_uris",
+                        update_tags_by_uris, raising=False)
+
+    r = _post(tmp_app_with_data_client, "/tags/bulk", grumpy_token, {
+        "uris": [SNOW_WHITE_APPLES, SNOW_WHITE_ORANGES,
+                 MR_MEN_APPLES, UNKNOWN],
+        "add": ["curated"],
+        "remove": ["evil"],
+    })
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == {
+        "updated": [SNOW_WHITE_APPLES, SNOW_WHITE_ORANGES],
+        "forbidden": [MR_MEN_APPLES],
+        "not_found": [UNKNOWN],
+    }
+
+    assert calls == [([SNOW_WHITE_APPLES, SNOW_WHITE_ORANGES],
+                      ["curated"], ["evil"])]
+
+    entries = StorageWrite.query.order_by(StorageWrite.id).all()
+    assert [(e.uri, e.kind, e.payload) for e in entries] == [
+        (SNOW_WHITE_APPLES, "tag_delta", {"add": ["curated"], "remove": ["evil"]}),
+        (SNOW_WHITE_ORANGES, "tag_delta", {"add": ["curated"], "remove": ["evil"]}),
+    ]
+
+
+def test_tags_bulk_route_by_query_in_batches(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token,
+        monkeypatch):  # NOQA
+
+    tmp_app_with_data.config["BULK_BATCH_SIZE"] = 1
+
+    written = {}
+
+    def set_tags(uri, tags):
+        written[uri] = tags
+
+    monkeypatch.setattr(current_app.search, "set_tags",
+                        set_tags, raising=False)
+
+    r = _post(tmp_app_with_data_client, "/tags/bulk", grumpy_token, {
+        "query": {"base_uris": ["s3://snow-white"], "tags": ["fruit"]},
+        "add": ["curated"],
+    })
+    assert r.status_code == 200
+    result = json.loads(r.data.decode("utf-8"))
+    assert sorted(result["updated"]) == sorted(
+        [SNOW_WHITE_APPLES, SNOW_WHITE_ORANGES])
+    assert result["forbidden"] == []
+    assert result["not_found"] == []
+
+    # Plugins without batched methods fall back to per-dataset updates.
+    assert written == {
+        SNOW_WHITE_APPLES: ["evil", "fruit", "curated"],
+        SNOW_WHITE_ORANGES: ["good", "fruit", "curated"],
+    }
+
+
+def test_annotations_bulk_route(
+        tmp_app_with_data_client,
+        grumpy_token,
+        monkeypatch):  # NOQA
+
+    calls = []
+
+    def set_annotation(uri, name, value):
+        calls.append(("set", uri, name, value))
+
+    def delete_annotation(uri, name):
+        calls.append(("delete", uri, name))
+
+    monkeypatch.setattr(current_app.retrieve, "set_annotation",
+                        set_annotation, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "delete_annotation",
+                        delete_annotation, raising=False)
+
+    r = _post(tmp_app_with_data_client, "/annotations/bulk", grumpy_token, {
+        "uris": [MR_MEN_APPLES],
+        "set": {"curator": "grumpy"},
+        "delete": ["type"],
+    })
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == {
+        "updated": [MR_MEN_APPLES], "forbidden": [], "not_found": []}
+    assert calls == [
+        ("set", MR_MEN_APPLES, "curator", "grumpy"),
+        ("delete", MR_MEN_APPLES, "type"),
+    ]
+
+
+def test_bulk_routes_validation(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token,
+        noone_token):  # NOQA
+
+    for route in ["/tags/bulk", "/annotations/bulk"]:
+        # Either uris or query, not both or none.
+        r = _post(tmp_app_with_data_client, route, grumpy_token, {})
+        assert r.status_code == 422
+        r = _post(tmp_app_with_data_client, route, grumpy_token,
+                  {"uris": [MR_MEN_APPLES], "query": {}})
+        assert r.status_code == 422
+
+        r = _post(tmp_app_with_data_client, route, noone_token,
+                  {"uris": [MR_MEN_APPLES]})
+        assert r.status_code == 401
+
+    tmp_app_with_data.config["MAX_BATCH_SIZE"] = 1
+    r = _post(tmp_app_with_data_client, "/tags/bulk", grumpy_token,
+              {"uris": [MR_MEN_APPLES, SNOW_WHITE_APPLES], "add": ["x"]})
+    assert r.status_code == 400
+
+    # An empty query selects all three datasets grumpy may see.
+    tmp_app_with_data.config["MAX_BATCH_SIZE"] = 2
+    for route, data in [("/tags/bulk", {"query": {}, "add": ["x"]}),
+                        ("/annotations/bulk", {"query": {}, "delete": ["x"]})]:
+        r = _post(tmp_app_with_data_client, route, grumpy_token, data)
+        assert r.status_code == 400
+    assert StorageWrite.query.count() == 0
+
+
+def test_bulk_query_bypasses_search_cache(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token):  # NOQA
+
+    tmp_app_with_data.config["SEARCH_CACHE_SIZE"] = 16
+    tmp_app_with_data.config["SEARCH_QUERY_PLANNER"] = True
+    query = {"base_uris": ["s3://snow-white"], "uuids": [
+        "af6727bf-29c7-43dd-b42f-a5d7ede28337"]}
+    search_datasets_by_user("grumpy", dict(query))
+
+    # Stale cached hits must not select the datasets to update.
+    current_app.search_cache.put(
+        current_app.search_cache.key(
+            preprocess_query_base_uris("grumpy", dict(query)), None, None),
+        current_app.search_cache.generation, [], None, 16)
+
+    r = _post(tmp_app_with_data_client, "/tags/bulk", grumpy_token,
+              {"query": query, "add": ["curated"]})
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["updated"] == [
+        SNOW_WHITE_APPLES]
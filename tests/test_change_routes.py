@@ -0,0 +1,153 @@
+"""Test the /changes blueprint route."""
+
+import json
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from dservercore import sql_db
+from dservercore.sql_models import Change
+from dservercore.utils import (
+    add_tags_for_uri_by_user,
+    delete_dataset,
+    list_changes_by_user,
+    register_base_uri,
+    register_dataset,
+    register_permissions,
+    set_readme_for_uri_by_user,
+)
+
+
+UUID = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+SNOW_WHITE = "s3://snow-white/" + UUID
+MR_MEN = "s3://mr-men/" + UUID
+
+
+def _dataset_info(uri):
+    return {
+        "base_uri": uri.rsplit("/", 1)[0],
+        "type": "dataset",
+        "uuid": UUID,
+        "uri": uri,
+        "name": "bad-apples",
+        "readme": "---\ndescription: apples from queen",
+        "manifest": {
+            "dtoolcore_version": "3.7.0",
+            "hash_function": "md5sum_hexdigest",
+            "items": {}
+        },
+        "creator_username": "queen",
+        "frozen_at": 1536238185.881941,
+        "annotations": {"type": "fruit"},
+        "tags": ["evil", "fruit"],
+        "size_in_bytes": 0,
+        "number_of_items": 0,
+    }
+
+
+@pytest.fixture
+def tmp_app_with_changes(tmp_app_with_users):
+    tmp_app_with_users.config["CHANGE_LOG_ENABLED"] = True
+    tmp_app_with_users.config["CHANGES_VISIBILITY_DELAY"] = 0
+    tmp_app_with_users.config["STORAGE_WRITE_BEHIND"] = True
+
+    register_base_uri("s3://mr-men")
+    register_permissions("s3://mr-men", {
+        "users_with_search_permissions": ["grumpy"],
+        "users_with_register_permissions": ["grumpy"]
+    })
+
+    register_dataset(_dataset_info(SNOW_WHITE))
+    register_dataset(_dataset_info(MR_MEN))
+    add_tags_for_uri_by_user("grumpy", SNOW_WHITE, ["good"])
+    set_readme_for_uri_by_user("grumpy", MR_MEN, "---\nedited: true")
+    delete_dataset(SNOW_WHITE)
+
+    return tmp_app_with_users
+
+
+def test_list_changes_by_user(tmp_app_with_changes):  # NOQA
+    changes = list_changes_by_user("grumpy")
+    assert [(c.kind, c.uri) for c in changes] == [
+        ("register", SNOW_WHITE),
+        ("register", MR_MEN),
+        ("tags", SNOW_WHITE),
+        ("readme", MR_MEN),
+        ("delete", SNOW_WHITE),
+    ]
+    seqs = [c.seq for c in changes]
+    assert seqs == sorted(seqs)
+    assert all(c.uuid == UUID for c in changes)
+    assert changes[-1].base_uri == "s3://snow-white"
+
+    # Sleepy may only search snow-white.
+    assert [c.kind for c in list_changes_by_user("sleepy")] == [
+        "register", "tags", "delete"]
+
+    assert [c.kind for c in list_changes_by_user(
+        "grumpy", since=seqs[1], limit=2)] == ["tags", "readme"]
+    assert list_changes_by_user("grumpy", since=seqs[-1]) == []
+
+    tmp_app_with_changes.config["CHANGES_MAX_PAGE_SIZE"] = 1
+    assert len(list_changes_by_user("grumpy", limit=3)) == 1
+
+
+def test_recent_changes_withheld(tmp_app_with_changes):  # NOQA
+    changes = list_changes_by_user("grumpy")
+
+    # Pretend only the readme update has just been written, the list ends
+    # before it even though the following deletion is older.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for change in changes:
+        change.changed_at = now - timedelta(seconds=60)
+    changes[3].changed_at = now
+    sql_db.session.commit()
+
+    tmp_app_with_changes.config["CHANGES_VISIBILITY_DELAY"] = 5
+    assert [c.kind for c in list_changes_by_user("grumpy")] == [
+        "register", "register", "tags"]
+
+
+def test_change_log_disabled(tmp_app_with_changes):  # NOQA
+    tmp_app_with_changes.config["CHANGE_LOG_ENABLED"] = False
+    count = Change.query.count()
+    register_dataset(_dataset_info(SNOW_WHITE))
+    assert Change.query.count() == count
+
+
+def test_changes_route(
+        tmp_app_with_changes,
+        tmp_app_with_users_client,
+        grumpy_token,
+        dopey_token):  # NOQA
+
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    # Page through all changes by passing the last sequence number.
+    since = 0
+    received = []
+    while True:
+        r = tmp_app_with_users_client.get(
+            "/changes", headers=headers,
+            query_string={"since": since, "limit": 2})
+        assert r.status_code == 200
+        page = json.loads(r.data.decode("utf-8"))
+        if len(page) == 0:
+            break
+        received.extend(page)
+        since = page[-1]["seq"]
+
+    assert [change["kind"] for change in received] == [
+        "register", "register", "tags", "readme", "delete"]
+    assert set(received[0]) == {
+        "seq", "uri", "uuid", "base_uri", "kind", "changed_at"}
+    assert isinstance(received[0]["changed_at"], float)
+
+    r = tmp_app_with_users_client.get(
+        "/changes", headers=headers, query_string={"since": -1})
+    assert r.status_code == 422
+
+    r = tmp_app_with_users_client.get(
+        "/changes", headers=dict(Authorization="Bearer " + dopey_token))
+    assert r.status_code == 401
@@ -0,0 +1,237 @@
+"""Test negotiated compression of response bodies."""
+
+import gzip
+import json
+
+import pytest
+
+from dservercore.compression import (
+    available_encodings,
+    available_request_encodings,
+    compress,
+    iter_compressed,
+    CompressedBodyCache,
+)
+from dservercore.utils import uri_to_url_suffix
+
+
+URI = "s3://snow-white/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+
+
+def test_available_encodings():
+    encodings = available_encodings()
+    assert "gzip" in encodings
+    # gzip is the fallback and hence least preferred
+    assert encodings[-1] == "gzip"
+
+
+@pytest.mark.parametrize("encoding", available_encodings())
+def test_iter_compressed_matches_one_shot(encoding):
+    chunks = [b'{"items": [', b'"a", ' * 1000, b'"b"]}']
+    streamed = b"".join(iter_compressed(chunks, encoding, 3))
+
+    if encoding == "gzip":
+        assert gzip.decompress(streamed) == b"".join(chunks)
+        assert gzip.decompress(compress(b"".join(chunks), "gzip", 3)) \
+            == b"".join(chunks)
+    else:
+        assert len(streamed) < len(b"".join(chunks))
+
+
+def test_compressed_body_cache_evicts_least_recently_used():
+    cache = CompressedBodyCache(max_bytes=10)
+    cache.put(("a", "gzip"), b"12345")
+    cache.put(("b", "gzip"), b"12345")
+    assert cache.get(("a", "gzip")) == b"12345"
+    cache.put(("c", "gzip"), b"12345")
+    assert cache.get(("b", "gzip")) is None
+    assert cache.get(("a", "gzip")) == b"12345"
+    assert cache.get(("c", "gzip")) == b"12345"
+
+
+def test_gzip_compressed_manifest_route(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token):  # NOQA
+
+    tmp_app_with_data.config["COMPRESSION_ENABLED"] = True
+    tmp_app_with_data.config["COMPRESSION_MIN_SIZE"] = 0
+
+    url = "/manifests/{}".format(uri_to_url_suffix(URI))
+    headers = {
+        "Authorization": "Bearer " + grumpy_token,
+        "Accept-Encoding": "gzip",
+    }
+
+    r = tmp_app_with_data_client.get(url, headers=headers)
+    assert r.status_code == 200
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["Vary"]
+    compressed = r.data
+    manifest = json.loads(gzip.decompress(compressed).decode("utf-8"))
+    assert manifest["hash_function"] == "md5sum_hexdigest"
+
+    # Identical bodies are served from the cache of compressed bodies.
+    r = tmp_app_with_data_client.get(url, headers=headers)
+    assert r.data == compressed
+
+    # Without Accept-Encoding the response is sent as is.
+    r = tmp_app_with_data_client.get(
+        url, headers={"Authorization": "Bearer " + grumpy_token})
+    assert "Content-Encoding" not in r.headers
+    assert json.loads(r.data.decode("utf-8")) == manifest
+
+    # Explicitly refused encodings are not used.
+    r = tmp_app_with_data_client.get(url, headers={
+        "Authorization": "Bearer " + grumpy_token,
+        "Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in r.headers
+
+
+def test_compression_threshold_and_switch(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token):  # NOQA
+
+    url = "/tags/{}".format(uri_to_url_suffix(URI))
+    headers = {
+        "Authorization": "Bearer " + grumpy_token,
+        "Accept-Encoding": "gzip",
+    }
+
+    # Small responses stay uncompressed.
+    tmp_app_with_data.config["COMPRESSION_ENABLED"] = True
+    tmp_app_with_data.config["COMPRESSION_MIN_SIZE"] = 1024
+    r = tmp_app_with_data_client.get(url, headers=headers)
+    assert r.status_code == 200
+    assert "Content-Encoding" not in r.headers
+
+    # Compression can be disabled altogether.
+    tmp_app_with_data.config["COMPRESSION_ENABLED"] = False
+    tmp_app_with_data.config["COMPRESSION_MIN_SIZE"] = 0
+    r = tmp_app_with_data_client.get(url, headers=headers)
+    assert r.status_code == 200
+    assert "Content-Encoding" not in r.headers
+
+
+def _dataset_info():
+    base_uri = "s3://snow-white"
+    uuid = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+    return {
+        "base_uri": base_uri,
+        "uuid": uuid,
+        "uri": "{}/{}".format(base_uri, uuid),
+        "name": "my-dataset",
+        "type": "dataset",
+        "readme": "---\ndescription: test dataset",
+        "manifest": {
+            "dtoolcore_version": "3.7.0",
+            "hash_function": "md5sum_hexdigest",
+            "items": {
+                "e4cc3a7dc281c3d89ed4553293c4b4b110dc9bf3": {
+                    "hash": "d89117c9da2cc34586e183017cb14851",
+                    "relpath": "U00096.3.rev.1.bt2",
+                    "size_in_bytes": 5741810,
+                    "utc_timestamp": 1536832115.0
+                }
+            }
+        },
+        "creator_username": "olssont",
+        "frozen_at": "1536238185.881941",
+        "annotations": {"software": "bowtie2"},
+        "tags": ["rnaseq"],
+        "number_of_items": 1,
+        "size_in_bytes": 5741810,
+    }
+
+
+def test_put_gzip_compressed_dataset(
+        tmp_app_with_users_client,
+        grumpy_token):  # NOQA
+
+    from dservercore.utils import get_admin_metadata_from_uri
+
+    dataset_info = _dataset_info()
+    url = "/uris/{}".format(uri_to_url_suffix(dataset_info["uri"]))
+    headers = {
+        "Authorization": "Bearer " + grumpy_token,
+        "Content-Encoding": "gzip",
+    }
+
+    r = tmp_app_with_users_client.put(
+        url,
+        headers=headers,
+        data=gzip.compress(json.dumps(dataset_info).encode("utf-8")),
+        content_type="application/json"
+    )
+    assert r.status_code == 201
+
+    admin_metadata = get_admin_metadata_from_uri(dataset_info["uri"])
+    assert admin_metadata["name"] == "my-dataset"
+
+
+@pytest.mark.skipif("zstd" not in available_request_encodings(),
+                    reason="zstandard not installed")
+def test_put_zstd_compressed_dataset(
+        tmp_app_with_users_client,
+        grumpy_token):  # NOQA
+
+    import zstandard
+
+    dataset_info = _dataset_info()
+    url = "/uris/{}".format(uri_to_url_suffix(dataset_info["uri"]))
+    headers = {
+        "Authorization": "Bearer " + grumpy_token,
+        "Content-Encoding": "zstd",
+    }
+
+    r = tmp_app_with_users_client.put(
+        url,
+        headers=headers,
+        data=zstandard.ZstdCompressor().compress(
+            json.dumps(dataset_info).encode("utf-8")),
+        content_type="application/json"
+    )
+    assert r.status_code == 201
+
+
+def test_put_compressed_dataset_rejections(
+        tmp_app_with_users,
+        tmp_app_with_users_client,
+        grumpy_token):  # NOQA
+
+    dataset_info = _dataset_info()
+    url = "/uris/{}".format(uri_to_url_suffix(dataset_info["uri"]))
+    payload = json.dumps(dataset_info).encode("utf-8")
+
+    # Decompressed body exceeds the configured limit.
+    tmp_app_with_users.config["MAX_DECOMPRESSED_REQUEST_SIZE"] = len(payload) - 1
+    r = tmp_app_with_users_client.put(
+        url,
+        headers={"Authorization": "Bearer " + grumpy_token,
+                 "Content-Encoding": "gzip"},
+        data=gzip.compress(payload),
+        content_type="application/json"
+    )
+    assert r.status_code == 413
+    tmp_app_with_users.config["MAX_DECOMPRESSED_REQUEST_SIZE"] = len(payload)
+
+    # Body is not gzip-compressed at all.
+    r = tmp_app_with_users_client.put(
+        url,
+        headers={"Authorization": "Bearer " + grumpy_token,
+                 "Content-Encoding": "gzip"},
+        data=payload,
+        content_type="application/json"
+    )
+    assert r.status_code == 400
+
+    # Unknown encoding.
+    r = tmp_app_with_users_client.put(
+        url,
+        headers={"Authorization": "Bearer " + grumpy_token,
+                 "Content-Encoding": "compress"},
+        data=payload,
+        content_type="application/json"
+    )
+    assert r.status_code == 415
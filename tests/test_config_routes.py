@@ -72,3 +72,28 @@ def test_config_versions_route(tmp_app_client):
     for k, v in expected_content.items():
         assert k in response
         assert v == response[k]
+
+
+def test_config_database_pools_route(
+        tmp_app_with_users_client,
+        snowwhite_token,
+        grumpy_token,
+        noone_token):  # NOQA
+
+    headers = dict(Authorization="Bearer " + snowwhite_token)
+    r = tmp_app_with_users_client.get("/config/database-pools", headers=headers)
+    assert r.status_code == 200
+
+    # The in-memory test database has a single, static connection.
+    pools = json.loads(r.data.decode("utf-8"))
+    assert pools == [{
+        "bind": None, "pool": "StaticPool",
+        "size": None, "checked_out": None, "overflow": None}]
+
+    headers = dict(Authorization="Bearer " + grumpy_token)
+    r = tmp_app_with_users_client.get("/config/database-pools", headers=headers)
+    assert r.status_code == 403
+
+    headers = dict(Authorization="Bearer " + noone_token)
+    r = tmp_app_with_users_client.get("/config/database-pools", headers=headers)
+    assert r.status_code == 401
@@ -0,0 +1,86 @@
+"""Test the cache of opened datasets used by storage writes."""
+
+import dtoolcore
+
+from dservercore.utils import (
+    _dataset_handles,
+    apply_storage_write,
+    invalidate_dataset_handle,
+)
+
+
+def _local_dataset(tmp_path, name="local"):
+    proto_dataset = dtoolcore.create_proto_dataset(name, tmp_path.as_uri())
+    proto_dataset.freeze()
+    return proto_dataset.uri
+
+
+def _count_from_uri(monkeypatch):
+    opened = []
+    from_uri = dtoolcore.DataSet.from_uri
+
+    def counting_from_uri(uri, config_path=None):
+        opened.append(uri)
+        return from_uri(uri, config_path)
+
+    monkeypatch.setattr(dtoolcore.DataSet, "from_uri", counting_from_uri)
+    return opened
+
+
+def test_storage_writes_reuse_dataset_handles(
+        tmp_app_with_data, tmp_path, monkeypatch):  # NOQA
+
+    tmp_app_with_data.config["DATASET_HANDLE_CACHE_SIZE"] = 1
+    tmp_app_with_data.config["DATASET_HANDLE_CACHE_TTL"] = 3600
+    _dataset_handles.clear()
+
+    first = _local_dataset(tmp_path, "first")
+    second = _local_dataset(tmp_path, "second")
+    opened = _count_from_uri(monkeypatch)
+
+    apply_storage_write(first, "tag_delta", {"add": ["a"], "remove": []})
+    apply_storage_write(first, "readme", {"readme": "---\nedited: true"})
+    apply_storage_write(first, "annotation_delta",
+                        {"set": {"x": 1}, "delete": []})
+    assert opened == [first]
+
+    # The least recently used handle is dropped.
+    apply_storage_write(second, "tag_delta", {"add": ["b"], "remove": []})
+    apply_storage_write(first, "tag_delta", {"add": ["c"], "remove": []})
+    assert opened == [first, second, first]
+
+    invalidate_dataset_handle(first)
+    apply_storage_write(first, "tag_delta", {"add": [], "remove": ["c"]})
+    assert opened == [first, second, first, first]
+
+    dataset = dtoolcore.DataSet.from_uri(first)
+    assert dataset.list_tags() == ["a"]
+    assert dataset.get_annotation("x") == 1
+    assert dataset.get_readme_content() == "---\nedited: true"
+
+
+def test_dataset_handles_expire_and_are_dropped_on_failure(
+        tmp_app_with_data, tmp_path, monkeypatch):  # NOQA
+
+    tmp_app_with_data.config["DATASET_HANDLE_CACHE_SIZE"] = 8
+    tmp_app_with_data.config["DATASET_HANDLE_CACHE_TTL"] = 0
+    _dataset_handles.clear()
+
+    uri = _local_dataset(tmp_path)
+    opened = _count_from_uri(monkeypatch)
+
+    apply_storage_write(uri, "tag_delta", {"add": ["a"], "remove": []})
+    apply_storage_write(uri, "tag_delta", {"add": ["b"], "remove": []})
+    assert opened == [uri, uri]
+
+    tmp_app_with_data.config["DATASET_HANDLE_CACHE_TTL"] = 3600
+    apply_storage_write(uri, "tag_delta", {"add": ["c"], "remove": []})
+    try:
+        apply_storage_write(uri, "tag_delta",
+                            {"add": ["invalid tag!"], "remove": []})
+    except Exception:
+        pass
+    else:
+        raise AssertionError("Invalid tag name must be rejected.")
+    apply_storage_write(uri, "tag_delta", {"add": ["d"], "remove": []})
+    assert opened == [uri, uri, uri]
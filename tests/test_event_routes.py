@@ -0,0 +1,229 @@
+"""Test the /events server-sent events stream."""
+
+import json
+from datetime import timedelta
+
+import pytest
+
+from flask import current_app
+
+from dservercore import sql_db
+from dservercore.sql_models import Change
+from dservercore.utils import (
+    register_base_uri,
+    register_dataset,
+    register_permissions,
+    set_readme_for_uri_by_user,
+)
+
+
+UUID = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+SNOW_WHITE = "s3://snow-white/" + UUID
+MR_MEN = "s3://mr-men/" + UUID
+
+
+def _dataset_info(uri):
+    return {
+        "base_uri": uri.rsplit("/", 1)[0],
+        "type": "dataset",
+        "uuid": UUID,
+        "uri": uri,
+        "name": "bad-apples",
+        "readme": "---\ndescription: apples from queen",
+        "manifest": {
+            "dtoolcore_version": "3.7.0",
+            "hash_function": "md5sum_hexdigest",
+            "items": {}
+        },
+        "creator_username": "queen",
+        "frozen_at": 1536238185.881941,
+        "annotations": {"type": "fruit"},
+        "tags": ["evil", "fruit"],
+        "size_in_bytes": 0,
+        "number_of_items": 0,
+    }
+
+
+def _parse(messages):
+    """Return (id, event, data) of the events in server-sent messages."""
+    events = []
+    for message in "".join(messages).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines()
+                      if not line.startswith(":"))
+        if fields:
+            events.append((int(fields["id"]), fields["event"],
+                           json.loads(fields["data"])))
+    return events
+
+
+def _next_event(stream):
+    """Return the next event of a stream, skipping heartbeats."""
+    for message in stream:
+        events = _parse([message])
+        if events:
+            return events[0]
+
+
+@pytest.fixture
+def tmp_app_with_events(tmp_app_with_users, monkeypatch):
+    tmp_app_with_users.config["CHANGE_LOG_ENABLED"] = True
+    tmp_app_with_users.config["CHANGES_VISIBILITY_DELAY"] = 0
+    tmp_app_with_users.config["STORAGE_WRITE_BEHIND"] = True
+    tmp_app_with_users.config["EVENTS_HEARTBEAT_INTERVAL"] = 0.05
+
+    # The in-memory test database does not support concurrent access by
+    # the poller thread, tests poll the change log explicitly instead.
+    monkeypatch.setattr(tmp_app_with_users.events, "_poll", lambda: None)
+
+    register_base_uri("s3://mr-men")
+    register_permissions("s3://mr-men", {
+        "users_with_search_permissions": ["grumpy"],
+        "users_with_register_permissions": ["grumpy"]
+    })
+
+    yield tmp_app_with_users
+
+    tmp_app_with_users.events.stop_poller(timeout=1)
+
+
+def test_event_hub_delivers_permitted_changes(tmp_app_with_events):  # NOQA
+    hub = current_app.events
+    grumpy = hub.subscribe(["s3://snow-white", "s3://mr-men"], timeout=5)
+    sleepy = hub.subscribe(["s3://snow-white"], timeout=5)
+
+    register_dataset(_dataset_info(MR_MEN))
+    register_dataset(_dataset_info(SNOW_WHITE))
+    assert hub.poll_once() == 2
+
+    seq, kind, data = _next_event(grumpy)
+    assert (kind, data["uri"], data["seq"]) == ("register", MR_MEN, seq)
+
+    # Sleepy is not told about mr-men.
+    _, kind, data = _next_event(sleepy)
+    assert (kind, data["uri"]) == ("register", SNOW_WHITE)
+
+    set_readme_for_uri_by_user("grumpy", SNOW_WHITE, "---\nedited: true")
+    assert hub.poll_once() == 1
+    events = [_next_event(grumpy), _next_event(grumpy)]
+    assert [(kind, data["uri"]) for _, kind, data in events] == [
+        ("register", SNOW_WHITE), ("readme", SNOW_WHITE)]
+
+    # Idle subscribers receive heartbeats.
+    assert hub.poll_once() == 0
+    assert next(grumpy) == ": keep-alive\n\n"
+
+
+def test_event_hub_replays_changes_dropped_from_buffer(tmp_app_with_events):  # NOQA
+    tmp_app_with_events.config["EVENTS_BUFFER_SIZE"] = 2
+    hub = current_app.events
+    grumpy = hub.subscribe(["s3://snow-white", "s3://mr-men"], timeout=5)
+
+    register_dataset(_dataset_info(MR_MEN))
+    register_dataset(_dataset_info(SNOW_WHITE))
+    set_readme_for_uri_by_user("grumpy", SNOW_WHITE, "---\nedited: true")
+    assert hub.poll_once() == 2
+    assert hub.poll_once() == 1
+
+    # The first change has left the buffer before grumpy read it.
+    events = [_next_event(grumpy) for _ in range(3)]
+    assert [(kind, data["uri"]) for _, kind, data in events] == [
+        ("register", MR_MEN), ("register", SNOW_WHITE),
+        ("readme", SNOW_WHITE)]
+    seqs = [seq for seq, _, _ in events]
+    assert seqs == sorted(seqs)
+
+
+def test_event_hub_replays_missed_changes_in_pages(tmp_app_with_events):  # NOQA
+    tmp_app_with_events.config["CHANGES_MAX_PAGE_SIZE"] = 1
+    hub = current_app.events
+    hub.start_poller()
+
+    register_dataset(_dataset_info(MR_MEN))
+    register_dataset(_dataset_info(SNOW_WHITE))
+    set_readme_for_uri_by_user("grumpy", SNOW_WHITE, "---\nedited: true")
+    assert hub.poll_once() == 3
+
+    missed = hub._missed_events({"s3://snow-white"}, 0, hub.last_seq)
+    events = _parse(list(missed))
+    assert [(kind, data["uri"]) for _, kind, data in events] == [
+        ("register", SNOW_WHITE), ("readme", SNOW_WHITE)]
+
+    grumpy = hub.subscribe(["s3://snow-white", "s3://mr-men"],
+                           last_event_id=0, timeout=5)
+    events = [_next_event(grumpy) for _ in range(3)]
+    assert [kind for _, kind, _ in events] == [
+        "register", "register", "readme"]
+
+
+def test_event_hub_starts_at_last_visible_change(tmp_app_with_events):  # NOQA
+    hub = current_app.events
+    register_dataset(_dataset_info(MR_MEN))
+    register_dataset(_dataset_info(SNOW_WHITE))
+
+    # Pretend only the second registration has just been written, it is
+    # left to the poller.
+    first, second = Change.query.order_by(Change.seq).all()
+    first.changed_at = second.changed_at - timedelta(seconds=60)
+    sql_db.session.commit()
+
+    tmp_app_with_events.config["CHANGES_VISIBILITY_DELAY"] = 5
+    hub.start_poller()
+    assert hub.last_seq == first.seq
+
+    tmp_app_with_events.config["CHANGES_VISIBILITY_DELAY"] = 0
+    assert hub.poll_once() == 1
+
+
+def test_event_hub_refreshes_permissions(tmp_app_with_events):  # NOQA
+    tmp_app_with_events.config["EVENTS_PERMISSIONS_INTERVAL"] = 0
+    hub = current_app.events
+    base_uris = ["s3://snow-white", "s3://mr-men"]
+    grumpy = hub.subscribe(base_uris, timeout=5,
+                           refresh_base_uris=lambda: base_uris)
+
+    # Permissions on mr-men are revoked after subscribing.
+    base_uris = ["s3://snow-white"]
+    register_dataset(_dataset_info(MR_MEN))
+    register_dataset(_dataset_info(SNOW_WHITE))
+    assert hub.poll_once() == 2
+    _, kind, data = _next_event(grumpy)
+    assert (kind, data["uri"]) == ("register", SNOW_WHITE)
+
+    # The stream ends once the user is gone.
+    base_uris = None
+    assert list(grumpy) == []
+
+
+def test_events_route_replays_missed_changes(
+        tmp_app_with_events,
+        tmp_app_with_users_client,
+        sleepy_token,
+        dopey_token):  # NOQA
+
+    tmp_app_with_events.config["EVENTS_STREAM_TIMEOUT"] = 0.1
+    register_dataset(_dataset_info(SNOW_WHITE))
+    register_dataset(_dataset_info(MR_MEN))
+    set_readme_for_uri_by_user("grumpy", SNOW_WHITE, "---\nedited: true")
+
+    headers = dict(Authorization="Bearer " + sleepy_token)
+    r = tmp_app_with_users_client.get(
+        "/events", headers=dict(headers, **{"Last-Event-ID": "0"}))
+    assert r.status_code == 200
+    assert r.mimetype == "text/event-stream"
+    events = _parse([r.data.decode("utf-8")])
+    assert [(kind, data["uri"]) for _, kind, data in events] == [
+        ("register", SNOW_WHITE), ("readme", SNOW_WHITE)]
+
+    r = tmp_app_with_users_client.get(
+        "/events", headers=dict(headers, **{"Last-Event-ID": str(events[0][0])}))
+    assert [kind for _, kind, _ in _parse([r.data.decode("utf-8")])] == [
+        "readme"]
+
+    # Without Last-Event-ID, only new changes are sent.
+    r = tmp_app_with_users_client.get("/events", headers=headers)
+    assert r.status_code == 200
+    assert _parse([r.data.decode("utf-8")]) == []
+
+    r = tmp_app_with_users_client.get(
+        "/events", headers=dict(Authorization="Bearer " + dopey_token))
+    assert r.status_code == 401
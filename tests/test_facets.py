@@ -0,0 +1,161 @@
+"""Test facet counts returned alongside search results."""
+
+import json
+
+from flask import current_app
+
+from dservercore.utils import facets_of_datasets_by_user
+
+
+ALL_FACETS = "tags,creator_username,base_uri,uploaded_by"
+
+
+def _facets(response):
+    return json.loads(response.headers["X-Facets"])
+
+
+def test_uris_routes_with_facets(
+        tmp_app_with_data_client, grumpy_token, sleepy_token):  # NOQA
+
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_data_client.get(
+        "/uris", headers=headers, query_string={"facets": ALL_FACETS})
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 3
+    assert _facets(r) == {
+        "tags": {"fruit": 3, "evil": 2, "good": 1},
+        "creator_username": {"queen": 3},
+        "base_uri": {"s3://snow-white": 2, "s3://mr-men": 1},
+        "uploaded_by": {},
+    }
+
+    r = tmp_app_with_data_client.post(
+        "/uris",
+        headers=headers,
+        query_string={"facets": "base_uri,tags", "page_size": 1},
+        data=json.dumps({"tags": ["evil"]}),
+        content_type="application/json")
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 1
+    assert _facets(r) == {
+        "base_uri": {"s3://mr-men": 1, "s3://snow-white": 1},
+        "tags": {"evil": 2, "fruit": 2},
+    }
+
+    # Facets only cover datasets the user may search.
+    r = tmp_app_with_data_client.get(
+        "/uris",
+        headers=dict(Authorization="Bearer " + sleepy_token),
+        query_string={"facets": "tags"})
+    assert r.status_code == 200
+    assert _facets(r) == {"tags": {}}
+
+    r = tmp_app_with_data_client.get("/uris", headers=headers)
+    assert "X-Facets" not in r.headers
+
+    r = tmp_app_with_data_client.get(
+        "/uris", headers=headers, query_string={"facets": "readme"})
+    assert r.status_code == 422
+
+
+def test_facets_aggregated_in_sql(tmp_app_with_data, monkeypatch):  # NOQA
+    current_app.config["SEARCH_QUERY_PLANNER"] = True
+
+    def fail(*args, **kwargs):
+        raise AssertionError("search plugin must not be called")
+
+    monkeypatch.setattr(current_app.search, "search", fail)
+
+    facets = facets_of_datasets_by_user(
+        "grumpy", {"creator_usernames": ["queen"]},
+        ["base_uri", "creator_username", "uploaded_by"])
+    assert facets == {
+        "base_uri": {"s3://snow-white": 2, "s3://mr-men": 1},
+        "creator_username": {"queen": 3},
+        "uploaded_by": {},
+    }
+
+    current_app.config["SEARCH_FACETS_MAX_BUCKETS"] = 1
+    assert facets_of_datasets_by_user(
+        "grumpy", {"uuids": ["af6727bf-29c7-43dd-b42f-a5d7ede28337"]},
+        ["base_uri"]) == {"base_uri": {"s3://mr-men": 1}}
+
+
+def test_facets_count_datasets_filtered_in_sql(
+        tmp_app_with_data, tmp_app_with_data_client, grumpy_token,
+        monkeypatch):  # NOQA
+    current_app.config["SEARCH_QUERY_PLANNER"] = True
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("retrieve plugin must not be called")
+
+    monkeypatch.setattr(current_app.retrieve, "get_tags", fail)
+    monkeypatch.setattr(current_app.retrieve, "get_tags_by_uris", fail)
+
+    # Only the oranges are empty, their tags come from the search plugin's
+    # hits.
+    r = tmp_app_with_data_client.post(
+        "/uris",
+        headers=headers,
+        query_string={"facets": "tags,creator_username"},
+        json={"size_in_bytes_max": 0})
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 1
+    assert _facets(r) == {
+        "tags": {"fruit": 1, "good": 1},
+        "creator_username": {"queen": 1},
+    }
+
+    monkeypatch.undo()
+    current_app.config["SEARCH_QUERY_PLANNER"] = False
+
+    # The plugin resolves the tags, the ranges still apply.
+    r = tmp_app_with_data_client.post(
+        "/uris",
+        headers=headers,
+        query_string={"facets": "tags,base_uri"},
+        json={"tags": ["fruit"], "size_in_bytes_min": 1})
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 2
+    assert _facets(r) == {
+        "tags": {"evil": 2, "fruit": 2},
+        "base_uri": {"s3://mr-men": 1, "s3://snow-white": 1},
+    }
+
+
+def test_facets_left_out_beyond_scan_limit(
+        tmp_app_with_data, tmp_app_with_data_client, grumpy_token):  # NOQA
+    current_app.config["SEARCH_QUERY_PLANNER"] = True
+    current_app.config["SEARCH_QUERY_PLANNER_MAX_SCAN"] = 2
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    # Counting the tags of all three datasets takes too many plugin hits.
+    r = tmp_app_with_data_client.get(
+        "/uris", headers=headers,
+        query_string={"facets": "tags,creator_username"})
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 3
+    assert _facets(r) == {"creator_username": {"queen": 3}}
+
+    # The search succeeds without facets it cannot count.
+    r = tmp_app_with_data_client.post(
+        "/uris",
+        headers=headers,
+        query_string={"facets": "tags,base_uri"},
+        json={"tags": ["fruit"]})
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 3
+    assert _facets(r) == {}
+
+    r = tmp_app_with_data_client.post(
+        "/uris",
+        headers=headers,
+        query_string={"facets": "tags,base_uri"},
+        json={"tags": ["evil"]})
+    assert r.status_code == 200
+    assert _facets(r) == {
+        "tags": {"evil": 2, "fruit": 2},
+        "base_uri": {"s3://mr-men": 1, "s3://snow-white": 1},
+    }
@@ -18,3 +18,25 @@ def test_lookup_datasets_by_user_and_uuid(tmp_app_with_data_client):  # NOQA
 
     with pytest.raises(AuthenticationError):
         lookup_datasets_by_user_and_uuid("noone", uuid)
+
+
+def test_lookup_datasets_by_user_and_uuids(tmp_app_with_data_client):  # NOQA
+
+    from dservercore import AuthenticationError
+    from dservercore.utils import lookup_datasets_by_user_and_uuids
+
+    apples = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+    oranges = "a2218059-5bd0-4690-b090-062faf08e046"
+
+    for batch_size in [None, 1, 2]:
+        groups = list(lookup_datasets_by_user_and_uuids(
+            "grumpy", [apples, oranges, apples], batch_size=batch_size))
+        assert [uuid for uuid, _ in groups] == [apples, oranges]
+        assert [len(datasets) for _, datasets in groups] == [2, 1]
+
+    assert list(lookup_datasets_by_user_and_uuids("grumpy", [])) == []
+    assert list(lookup_datasets_by_user_and_uuids("sleepy", [apples])) == [
+        (apples, [])]
+
+    with pytest.raises(AuthenticationError):
+        lookup_datasets_by_user_and_uuids("noone", [apples])
@@ -0,0 +1,118 @@
+"""Test the fast manifest validation path of RegisterDatasetSchema."""
+
+import json
+
+import pytest
+
+from marshmallow import Schema, ValidationError
+from marshmallow.fields import Nested
+
+from dservercore.schemas import (
+    ManifestSchema,
+    RegisterDatasetSchema,
+    load_manifest,
+)
+from dservercore.utils import uri_to_url_suffix
+
+
+class NestedManifestSchema(Schema):
+    """Reference: the way manifests were validated before."""
+    manifest = Nested(ManifestSchema)
+
+
+ITEM = {
+    "hash": "d89117c9da2cc34586e183017cb14851",
+    "relpath": "U00096.3.rev.1.bt2",
+    "size_in_bytes": 5741810,
+    "utc_timestamp": 1536832115.0
+}
+
+
+MANIFESTS = [
+    {},
+    {"hash_function": "md5sum_hexdigest"},
+    {"dtoolcore_version": "3.7.0", "hash_function": "md5sum_hexdigest",
+     "items": {"e4cc3a7dc281c3d89ed4553293c4b4b110dc9bf3": ITEM}},
+    # values needing type coercion
+    {"items": {"a": {"size_in_bytes": "5", "utc_timestamp": "1.5"}}},
+    {"items": {"a": {"utc_timestamp": 2}, "b": ITEM}},
+    # invalid manifests
+    None,
+    "not a manifest",
+    {"items": []},
+    {"items": {}, "unknown": 1, "hash_function": 3},
+    {"items": {"a": 5}},
+    {"items": {"a": {"hash": 1, "size_in_bytes": "x", "utc_timestamp": None,
+                     "unknown": 1}}},
+    {"items": {"a": {"size_in_bytes": True, "utc_timestamp": float("nan")}}},
+    {"items": {"a": ITEM, "b": {"utc_timestamp": True}}},
+]
+
+
+def _load(schema, manifest):
+    try:
+        return "ok", schema.load({"manifest": manifest})
+    except ValidationError as exc:
+        return "error", exc.messages
+
+
+@pytest.mark.parametrize("manifest", MANIFESTS)
+def test_fast_path_agrees_with_nested_schema(manifest):
+    expected = _load(NestedManifestSchema(), manifest)
+    actual = _load(RegisterDatasetSchema(only=("manifest",)), manifest)
+    assert actual == expected
+
+
+def test_load_manifest():
+    manifest = {"hash_function": "md5sum_hexdigest", "items": {"a": ITEM}}
+    assert load_manifest(manifest) == manifest
+
+    with pytest.raises(ValidationError) as excinfo:
+        load_manifest({"items": {"a": {"size_in_bytes": "x"}}})
+    assert excinfo.value.messages == {
+        "items": {"a": {"value": {"size_in_bytes": ["Not a valid integer."]}}}}
+
+
+def test_put_dataset_with_invalid_manifest(
+        tmp_app_with_users_client,
+        grumpy_token):  # NOQA
+
+    base_uri = "s3://snow-white"
+    uuid = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+    uri = "{}/{}".format(base_uri, uuid)
+    dataset_info = {
+        "base_uri": base_uri,
+        "uuid": uuid,
+        "uri": uri,
+        "name": "my-dataset",
+        "type": "dataset",
+        "readme": "---\ndescription: test dataset",
+        "manifest": {
+            "dtoolcore_version": "3.7.0",
+            "hash_function": "md5sum_hexdigest",
+            "items": {
+                "e4cc3a7dc281c3d89ed4553293c4b4b110dc9bf3": {
+                    "hash": "d89117c9da2cc34586e183017cb14851",
+                    "relpath": "U00096.3.rev.1.bt2",
+                    "size_in_bytes": "many",
+                    "utc_timestamp": 1536832115.0
+                }
+            }
+        },
+        "creator_username": "olssont",
+        "frozen_at": "1536238185.881941",
+        "annotations": {},
+        "tags": [],
+    }
+
+    r = tmp_app_with_users_client.put(
+        "/uris/{}".format(uri_to_url_suffix(uri)),
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        data=json.dumps(dataset_info),
+        content_type="application/json"
+    )
+    assert r.status_code == 422
+    errors = json.loads(r.data.decode("utf-8"))["errors"]["json"]
+    assert errors["manifest"]["items"][
+        "e4cc3a7dc281c3d89ed4553293c4b4b110dc9bf3"]["value"] == {
+            "size_in_bytes": ["Not a valid integer."]}
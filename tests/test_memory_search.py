@@ -0,0 +1,322 @@
+"""Test the built-in in-memory search plugin."""
+
+import json
+import struct
+import threading
+
+import pytest
+
+from flask import current_app
+from flask_smorest.pagination import PaginationParameters
+
+from dservercore import sql_db
+from dservercore.memory_search import MemoryIndex, MemorySearch, tokenize
+from dservercore.sort import SortParameters
+from dservercore.utils import (
+    register_dataset,
+    set_annotation_for_uri_by_user,
+    add_tags_for_uri_by_user,
+    set_readme_for_uri_by_user,
+    delete_dataset,
+)
+
+
+BASE_URI = "s3://snow-white"
+APPLES = BASE_URI + "/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+ORANGES = BASE_URI + "/a2218059-5bd0-4690-b090-062faf08e046"
+PEARS = BASE_URI + "/3f4e2b8c-6b0d-4f5a-9d1e-7c2a9b8e1f00"
+
+
+def _dataset_info(uri, name, readme, creator, annotations, tags, frozen_at):
+    return {
+        "base_uri": BASE_URI,
+        "type": "dataset",
+        "uuid": uri.rsplit("/", 1)[1],
+        "uri": uri,
+        "name": name,
+        "readme": readme,
+        "manifest": {
+            "dtoolcore_version": "3.7.0",
+            "hash_function": "md5sum_hexdigest",
+            "items": {}
+        },
+        "creator_username": creator,
+        "frozen_at": frozen_at,
+        "annotations": annotations,
+        "tags": tags,
+        "size_in_bytes": 0,
+        "number_of_items": 0,
+    }
+
+
+DATASETS = [
+    _dataset_info(APPLES, "bad-apples",
+                  "---\ndescription: apples from queen", "queen",
+                  {"type": "fruit"}, ["evil", "fruit"], 1536238185.0),
+    _dataset_info(ORANGES, "oranges",
+                  "---\ndescription: oranges from queen", "queen",
+                  {"type": "fruit", "only_here": "crazystuff"},
+                  ["good", "fruit"], 1536238186.0),
+    _dataset_info(PEARS, "pears",
+                  "---\ndescription: pears from the dwarfs", "grumpy",
+                  {"type": {"kind": "fruit", "variety": "conference"}},
+                  ["good"], 1536238187.0),
+]
+
+
+@pytest.fixture
+def tmp_app_with_memory_search(tmp_app_with_users):
+    mongo_search = tmp_app_with_users.search
+    tmp_app_with_users.search = MemorySearch()
+    tmp_app_with_users.search.init_app(tmp_app_with_users)
+
+    for dataset_info in DATASETS:
+        register_dataset(dataset_info)
+
+    yield tmp_app_with_users
+
+    # The fixture's teardown expects the Mongo search plugin.
+    tmp_app_with_users.search = mongo_search
+
+
+def _search(query, search=None, **kwargs):
+    search = search or current_app.search
+    query = dict(query, base_uris=query.get("base_uris", [BASE_URI]))
+    return [hit["uri"] for hit in search.search(query, **kwargs)]
+
+
+def test_tokenize():
+    assert tokenize("Bad-Apples from the dwarfs' class") == {
+        "bad", "apple", "from", "the", "dwarf", "class"}
+
+
+def test_memory_search_filters(tmp_app_with_memory_search):  # NOQA
+    sort = SortParameters(["+name"])
+
+    assert _search({}, sort_parameters=sort) == [APPLES, ORANGES, PEARS]
+    assert _search({"base_uris": []}) == []
+    assert _search({"base_uris": ["s3://mr-men"]}) == []
+
+    assert _search({"creator_usernames": ["queen"]},
+                   sort_parameters=sort) == [APPLES, ORANGES]
+    assert _search({"uuids": [PEARS.rsplit("/", 1)[1]]}) == [PEARS]
+    assert _search({"tags": ["fruit"]}, sort_parameters=sort) == [
+        APPLES, ORANGES]
+    assert _search({"tags": ["good", "fruit"]}) == [ORANGES]
+    assert _search({"tags": ["good", "evil"]}) == []
+    assert _search({"uploaded_by": ["nobody"]}) == []
+
+    assert _search({"free_text": "apple"}) == [APPLES]
+    assert _search({"free_text": "crazystuff"}) == [ORANGES]
+    assert _search({"free_text": "conference"}) == [PEARS]
+    assert _search({"free_text": "dwarf"}) == [PEARS]
+    assert _search({"free_text": "apples pears"},
+                   sort_parameters=sort) == [APPLES, PEARS]
+    assert _search({"free_text": "fruit", "tags": ["good"]},
+                   sort_parameters=sort) == [ORANGES, PEARS]
+    assert _search({"free_text": "\"unknown"}) == []
+
+
+def test_memory_search_sort_and_pagination(tmp_app_with_memory_search):  # NOQA
+    sort = SortParameters(["-frozen_at"])
+    assert _search({"free_text": "queen dwarfs"}, sort_parameters=sort) == [
+        PEARS, ORANGES, APPLES]
+
+    pagination = PaginationParameters(page=2, page_size=2)
+    assert _search({}, sort_parameters=sort,
+                   pagination_parameters=pagination) == [APPLES]
+    assert pagination.item_count == 3
+
+    pagination = PaginationParameters(page=2, page_size=1)
+    assert _search({"free_text": "fruit"}, sort_parameters=sort,
+                   pagination_parameters=pagination) == [ORANGES]
+    assert pagination.item_count == 3
+
+    sort = SortParameters(["+creator_username", "-name"])
+    assert _search({}, sort_parameters=sort) == [PEARS, ORANGES, APPLES]
+
+    hit, = current_app.search.search({"base_uris": [BASE_URI],
+                                      "uuids": [APPLES.rsplit("/", 1)[1]]})
+    assert hit["name"] == "bad-apples"
+    assert hit["tags"] == ["evil", "fruit"]
+    assert hit["uploaded_by"] is None
+
+
+def test_memory_search_follows_updates(tmp_app_with_memory_search):  # NOQA
+    tmp_app_with_memory_search.config["STORAGE_WRITE_BEHIND"] = True
+
+    add_tags_for_uri_by_user("grumpy", APPLES, ["good"])
+    assert _search({"tags": ["good", "evil"]}) == [APPLES]
+
+    set_annotation_for_uri_by_user("grumpy", PEARS, "colour", "green")
+    assert _search({"free_text": "green"}) == [PEARS]
+
+    set_readme_for_uri_by_user("grumpy", ORANGES, "---\ndescription: lemons")
+    assert _search({"free_text": "oranges lemon"}) == [ORANGES]
+    assert _search({"free_text": "queen"}) == [APPLES]
+
+    delete_dataset(APPLES)
+    assert _search({"free_text": "apples"}) == []
+    assert _search({"tags": ["evil"]}) == []
+
+    # Freed ids are reused.
+    register_dataset(DATASETS[0])
+    assert len(current_app.search._index.entries) == 3
+    assert _search({"free_text": "apples"}) == [APPLES]
+
+
+def test_memory_search_loads_from_database(tmp_app_with_memory_search):  # NOQA
+    # A fresh worker builds its index from the dataset table and the
+    # retrieve plugin.
+    search = MemorySearch()
+    search.init_app(tmp_app_with_memory_search)
+    assert _search({"free_text": "conference"}, search) == [PEARS]
+    assert _search({"tags": ["good"]}, search,
+                   sort_parameters=SortParameters(["+name"])) == [
+        ORANGES, PEARS]
+
+    # Registrations and deletions by other workers show after syncing.
+    tmp_app_with_memory_search.config["MEMORY_SEARCH_SYNC_INTERVAL"] = 0
+    delete_dataset(ORANGES)
+    register_dataset(dict(DATASETS[0], tags=["rotten"]))
+    assert _search({}, search, sort_parameters=SortParameters(["+name"])) == [
+        APPLES, PEARS]
+    assert _search({"tags": ["rotten"]}, search) == [APPLES]
+
+
+def test_memory_search_snapshot(tmp_app_with_memory_search, tmp_path):  # NOQA
+    path = str(tmp_path / "search.snapshot")
+    current_app.search.save_snapshot(path)
+
+    index = MemoryIndex.load(path)
+    original = current_app.search._index
+    assert index.ids == original.ids
+    assert index.entries == original.entries
+    assert index.words == original.words
+    assert index.tags == original.tags
+    assert index.values == original.values
+    assert index.max_dataset_id == original.max_dataset_id
+    assert [index.documents[i] for i in range(len(index.documents))] == [
+        original.documents[i] for i in range(len(original.documents))]
+
+    # Postings are views of the mapped file, readmes and annotations are
+    # not part of the JSON header.
+    assert isinstance(index.words["queen"], memoryview)
+    with open(path, "rb") as f:
+        data = f.read()
+    header_size = struct.unpack("<Q", data[4:12])[0]
+    header = json.loads(data[12:12 + header_size])
+    assert "documents" not in header
+    assert "pears from the dwarfs" not in json.dumps(header)
+    assert '"only_here": "crazystuff"' not in json.dumps(header)
+
+    # A worker starting from the snapshot does not rebuild its index.
+    tmp_app_with_memory_search.config["MEMORY_SEARCH_SNAPSHOT"] = path
+    search = MemorySearch()
+    search.init_app(tmp_app_with_memory_search)
+    search._index_datasets = None
+    assert _search({"free_text": "crazystuff"}, search) == [ORANGES]
+
+    # Postings are copied once modified.
+    search.set_readme(PEARS, "---\ndescription: pears from the queen")
+    search.set_tags(APPLES, ["good"])
+    assert _search({"free_text": "queen"}, search) == [APPLES, ORANGES, PEARS]
+    assert _search({"tags": ["good"]}, search) == [APPLES, ORANGES, PEARS]
+    assert _search({"tags": ["evil"]}, search) == []
+    assert _search({"free_text": "dwarfs"}, search) == []
+    assert _search({"free_text": "crazystuff"}, search) == [ORANGES]
+
+    with open(path, "wb") as f:
+        f.write(b"garbage")
+    with pytest.raises(ValueError):
+        MemoryIndex.load(path)
+
+
+def test_memory_search_saves_snapshot_in_background(tmp_app_with_memory_search, tmp_path, monkeypatch):  # NOQA
+    path = str(tmp_path / "search.snapshot")
+    tmp_app_with_memory_search.config["MEMORY_SEARCH_SNAPSHOT"] = path
+    tmp_app_with_memory_search.config["MEMORY_SEARCH_SNAPSHOT_INTERVAL"] = 0
+    search = current_app.search
+
+    # Changes while the snapshot is written do not affect the snapshot.
+    saved = threading.Event()
+    release = threading.Event()
+    save = MemoryIndex.save
+
+    def slow_save(index, path):
+        release.wait(10)
+        save(index, path)
+        saved.set()
+
+    monkeypatch.setattr(MemoryIndex, "save", slow_save)
+    delete_dataset(PEARS)
+    assert search._saver.is_alive()
+    add_tags_for_uri_by_user("grumpy", APPLES, ["good"])
+    assert _search({"tags": ["good"]}) == [APPLES, ORANGES]
+    release.set()
+    assert saved.wait(10)
+    search._saver.join()
+    monkeypatch.setattr(MemoryIndex, "save", save)
+
+    index = MemoryIndex.load(path)
+    assert sorted(index.ids) == sorted([APPLES, ORANGES])
+    assert index.get_tags(APPLES) == ["evil", "fruit"]
+
+    # The change made meanwhile is saved next.
+    assert search._dirty
+    search.set_readme(ORANGES, "---\ndescription: lemons")
+    search._saver.join()
+    index = MemoryIndex.load(path)
+    assert index.get_tags(APPLES) == ["evil", "fruit", "good"]
+    assert index.documents[index.ids[ORANGES]]["readme"] == (
+        "---\ndescription: lemons")
+
+
+def test_create_app_with_builtin_memory_search(monkeypatch):  # NOQA
+    import dservercore
+
+    monkeypatch.setattr(dservercore, "search_entrypoints_iterator", [])
+    monkeypatch.setattr(dservercore, "retrieve_entrypoints_iterator", [])
+
+    app = dservercore.create_app({
+        "API_TITLE": "dservercore API",
+        "API_VERSION": "v1",
+        "OPENAPI_VERSION": "3.0.2",
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "BUILTIN_SEARCH_PLUGIN": "memory",
+    })
+    assert isinstance(app.search, MemorySearch)
+    assert app.plugins[0] is app.search
+    with app.app_context():
+        sql_db.session.remove()
+
+    with pytest.raises(RuntimeError):
+        dservercore.create_app({"BUILTIN_SEARCH_PLUGIN": "elastic"})
+
+
+def test_memory_search_facets(tmp_app_with_memory_search):  # NOQA
+    fields = ["tags", "creator_username", "base_uri", "uploaded_by"]
+    assert current_app.search.facets(
+        {"base_uris": [BASE_URI], "free_text": "queen"}, fields) == {
+        "tags": {"evil": 1, "fruit": 2, "good": 1},
+        "creator_username": {"queen": 2},
+        "base_uri": {BASE_URI: 2},
+        "uploaded_by": {},
+    }
+    assert current_app.search.facets(
+        {"base_uris": [BASE_URI]}, ["creator_username"]) == {
+        "creator_username": {"queen": 2, "grumpy": 1}}
+
+
+def test_memory_search_range_filters(tmp_app_with_memory_search):  # NOQA
+    sort = SortParameters(["+name"])
+
+    assert _search({"frozen_at_min": 1536238186.0},
+                   sort_parameters=sort) == [ORANGES, PEARS]
+    assert _search({"frozen_at_min": 1536238185.5,
+                    "frozen_at_max": 1536238186.5}) == [ORANGES]
+    assert _search({"free_text": "queen",
+                    "frozen_at_max": 1536238185.0}) == [APPLES]
+    assert _search({"size_in_bytes_min": 1}) == []
+    assert len(_search({"number_of_items_max": 0,
+                        "uploaded_at_min": 0.0})) == 3
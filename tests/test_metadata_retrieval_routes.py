@@ -89,6 +89,32 @@ def test_dataset_manifest_route(
     assert r.status_code == 404
 
 
+def test_dataset_manifest_route_with_range(
+        tmp_app_with_data_client,
+        grumpy_token):  # NOQA
+
+    headers = dict(Authorization="Bearer " + grumpy_token)
+    uri = "s3://snow-white/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+    url = "/manifests/{}".format(uri_to_url_suffix(uri))
+
+    r = tmp_app_with_data_client.get(
+        url, headers=headers, query_string={"limit": 1})
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == {"items": {
+        "e4cc3a7dc281c3d89ed4553293c4b4b110dc9bf3": {
+            "hash": "d89117c9da2cc34586e183017cb14851",
+            "relpath": "U00096.3.rev.1.bt2",
+            "size_in_bytes": 5741810,
+            "utc_timestamp": 1536832115.0
+        }
+    }}
+
+    r = tmp_app_with_data_client.get(
+        url, headers=headers, query_string={"offset": 1})
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == {"items": {}}
+
+
 def test_dataset_readme_route(
         tmp_app_with_data_client,
         grumpy_token,
@@ -0,0 +1,80 @@
+"""Test routing of read-only queries to a read replica."""
+
+import pytest
+
+from sqlalchemy import insert
+
+from dservercore import sql_db
+from dservercore.read_replica import READ_REPLICA_BIND_KEY, read_replica
+from dservercore.sql_models import User
+from dservercore.utils import (
+    get_user_info,
+    list_users,
+    register_user,
+    register_users,
+    user_exists,
+)
+
+
+@pytest.fixture
+def app_with_replica(tmp_path, monkeypatch):
+    import dservercore
+
+    monkeypatch.setattr(dservercore, "search_entrypoints_iterator", [])
+    monkeypatch.setattr(dservercore, "retrieve_entrypoints_iterator", [])
+
+    app = dservercore.create_app({
+        "API_TITLE": "dservercore API",
+        "API_VERSION": "v1",
+        "OPENAPI_VERSION": "3.0.2",
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///{}".format(
+            tmp_path / "primary.sqlite"),
+        "SQLALCHEMY_READ_REPLICA_URI": "sqlite:///{}".format(
+            tmp_path / "replica.sqlite"),
+    })
+
+    with app.app_context():
+        replica = sql_db.engines[READ_REPLICA_BIND_KEY]
+        sql_db.create_all()
+        sql_db.Model.metadata.create_all(replica)
+
+        # The replica lags behind and still knows the old display name.
+        register_user("grumpy", {"display_name": "Primary"})
+        with replica.begin() as connection:
+            connection.execute(insert(User), [
+                {"username": "grumpy", "display_name": "Replica"}])
+        sql_db.session.remove()
+
+        yield app
+
+        sql_db.session.remove()
+
+
+def test_read_only_helpers_query_replica(app_with_replica):  # NOQA
+    assert get_user_info("grumpy")["display_name"] == "Replica"
+    assert [user["display_name"] for user in list_users()] == ["Replica"]
+    sql_db.session.remove()
+
+    # Helpers not marked read-only query the primary.
+    assert user_exists("grumpy")
+    assert User.query.one().display_name == "Primary"
+    sql_db.session.remove()
+
+    with read_replica():
+        assert User.query.one().display_name == "Replica"
+
+
+def test_session_sticks_to_primary_after_write(app_with_replica):  # NOQA
+    register_users([{"username": "sleepy"}])
+    assert get_user_info("grumpy")["display_name"] == "Primary"
+    assert get_user_info("sleepy") is not None
+
+    # Reads in a fresh session, i.e. a following request, use the replica.
+    sql_db.session.remove()
+    assert get_user_info("sleepy") is None
+
+
+def test_without_replica_queries_go_to_primary(tmp_app_with_users):  # NOQA
+    assert READ_REPLICA_BIND_KEY not in sql_db.engines
+    with read_replica():
+        assert get_user_info("grumpy")["username"] == "grumpy"
@@ -0,0 +1,145 @@
+"""Test caching of search results."""
+
+import json
+
+import pytest
+
+from flask import current_app
+from flask_smorest.pagination import PaginationParameters
+
+from dservercore.search_cache import SearchResultCache
+from dservercore.sort import SortParameters
+from dservercore.utils import (
+    add_tags_for_uri_by_user,
+    delete_dataset,
+    register_permissions,
+    search_datasets_by_user,
+)
+
+
+APPLES = "s3://snow-white/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+
+
+@pytest.fixture
+def plugin_queries(tmp_app_with_data, monkeypatch):
+    """Enable the search cache and record queries sent to the plugin."""
+    tmp_app_with_data.config["SEARCH_CACHE_SIZE"] = 2
+    tmp_app_with_data.config["SEARCH_CACHE_TTL"] = 60.0
+    queries = []
+    search = tmp_app_with_data.search.search
+
+    def recording_search(query, **kwargs):
+        queries.append(dict(query))
+        return search(query, **kwargs)
+
+    monkeypatch.setattr(tmp_app_with_data.search, "search", recording_search)
+    return queries
+
+
+def test_search_cache_key():
+    key = SearchResultCache.key
+    assert key({"base_uris": ["s3://a", "s3://b"], "free_text": " apple  pie"}) \
+        == key({"free_text": "apple pie", "base_uris": ["s3://b", "s3://a"]})
+    assert key({"tags": ["good"]}) != key({"tags": ["evil"]})
+    assert key({}, PaginationParameters(page=1, page_size=10)) \
+        != key({}, PaginationParameters(page=2, page_size=10))
+    assert key({}, sort_parameters=SortParameters(["+name"])) \
+        == key({}, sort_parameters=SortParameters(["name"]))
+    assert key({}, sort_parameters=SortParameters(["+name", "-uri"])) \
+        != key({}, sort_parameters=SortParameters(["-uri", "+name"]))
+
+
+def test_search_cache_lru_and_ttl():
+    cache = SearchResultCache()
+    cache.put("a", 0, [{"uri": "a"}], None, maxsize=2)
+    cache.put("b", 0, [{"uri": "b"}], 1, maxsize=2)
+    assert cache.get("a", ttl=60) == ([{"uri": "a"}], None)
+    cache.put("c", 0, [], 0, maxsize=2)
+    assert cache.get("b", ttl=60) is None
+    assert len(cache) == 2
+
+    # Hits are copied in and out of the cache.
+    hits, _ = cache.get("a", ttl=60)
+    hits[0]["uri"] = "changed"
+    assert cache.get("a", ttl=60) == ([{"uri": "a"}], None)
+
+    assert cache.get("a", ttl=0) is None
+    assert len(cache) == 1
+
+    # Results computed before an invalidation are not cached.
+    generation = cache.generation
+    cache.invalidate()
+    cache.put("a", generation, [{"uri": "a"}], None, maxsize=2)
+    assert len(cache) == 0
+
+
+def test_repeated_search_answered_from_cache(
+        plugin_queries, tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    headers = dict(Authorization="Bearer " + grumpy_token)
+    query_string = {"tags": "fruit", "page_size": 2}
+    r = tmp_app_with_data_client.get(
+        "/uris", headers=headers, query_string=query_string)
+    assert r.status_code == 200
+    first_page = json.loads(r.data.decode("utf-8"))
+    assert len(first_page) == 2
+    pagination = r.headers["X-Pagination"]
+
+    r = tmp_app_with_data_client.get(
+        "/uris", headers=headers, query_string=query_string)
+    assert json.loads(r.data.decode("utf-8")) == first_page
+    assert r.headers["X-Pagination"] == pagination
+    assert len(plugin_queries) == 1
+
+    # Another page is a separate entry.
+    r = tmp_app_with_data_client.get(
+        "/uris", headers=headers, query_string=dict(query_string, page=2))
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 1
+    assert len(plugin_queries) == 2
+
+
+def test_search_cache_shared_by_permission_set(plugin_queries):  # NOQA
+    # Sleepy may search snow-white only, grumpy's search restricted to
+    # snow-white yields the same preprocessed query.
+    register_permissions("s3://snow-white", {
+        "users_with_search_permissions": ["grumpy", "sleepy"],
+        "users_with_register_permissions": ["grumpy"]})
+    hits = search_datasets_by_user("sleepy", {})
+    assert len(hits) == 2
+    assert search_datasets_by_user(
+        "grumpy", {"base_uris": ["s3://snow-white"]}) == hits
+    assert len(plugin_queries) == 1
+
+    # Permission changes lead to a different query.
+    register_permissions("s3://snow-white", {
+        "users_with_search_permissions": [],
+        "users_with_register_permissions": []})
+    assert search_datasets_by_user("sleepy", {}) == []
+    assert len(plugin_queries) == 1
+
+
+def test_search_cache_invalidated_by_changes(plugin_queries):  # NOQA
+    current_app.config["STORAGE_WRITE_BEHIND"] = True
+
+    assert len(search_datasets_by_user("grumpy", {"tags": ["good"]})) == 1
+    assert len(search_datasets_by_user("grumpy", {"tags": ["good"]})) == 1
+    assert len(plugin_queries) == 1
+
+    add_tags_for_uri_by_user("grumpy", APPLES, ["good"])
+    search_datasets_by_user("grumpy", {"tags": ["good"]})
+    assert len(plugin_queries) == 2
+
+    search_datasets_by_user("grumpy", {"tags": ["good"]})
+    assert len(plugin_queries) == 2
+    delete_dataset(APPLES)
+    search_datasets_by_user("grumpy", {"tags": ["good"]})
+    assert len(plugin_queries) == 3
+
+
+def test_search_cache_disabled(plugin_queries):  # NOQA
+    current_app.config["SEARCH_CACHE_SIZE"] = 0
+    search_datasets_by_user("grumpy", {})
+    search_datasets_by_user("grumpy", {})
+    assert len(plugin_queries) == 2
+    assert len(current_app.search_cache) == 0
@@ -0,0 +1,266 @@
+"""Test routing of search queries between the SQL database and the plugin."""
+
+import json
+
+import pytest
+
+from flask import current_app
+from flask_smorest.pagination import PaginationParameters
+
+from dservercore import ValidationError
+from dservercore.sort import SortParameters
+from dservercore.utils import (
+    plan_search_query,
+    search_datasets_by_user,
+    summary_of_datasets_by_user,
+)
+
+
+APPLES_UUID = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+APPLES_ON_MR_MEN = "s3://mr-men/" + APPLES_UUID
+APPLES_ON_SNOW_WHITE = "s3://snow-white/" + APPLES_UUID
+ORANGES = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+
+
+@pytest.fixture
+def plugin_queries(tmp_app_with_data, monkeypatch):
+    """Enable the query planner and record queries sent to the plugin."""
+    tmp_app_with_data.config["SEARCH_QUERY_PLANNER"] = True
+    queries = []
+    search = tmp_app_with_data.search.search
+
+    def recording_search(query, **kwargs):
+        queries.append(dict(query))
+        return search(query, **kwargs)
+
+    monkeypatch.setattr(tmp_app_with_data.search, "search", recording_search)
+    return queries
+
+
+def test_plan_search_query(tmp_app_with_data):  # NOQA
+    assert plan_search_query({"creator_usernames": ["queen"]}) == "plugin"
+
+    current_app.config["SEARCH_QUERY_PLANNER"] = True
+    base_uris = ["s3://snow-white"]
+    assert plan_search_query({"base_uris": base_uris}) == "sql"
+    assert plan_search_query({"base_uris": base_uris,
+                              "uuids": [APPLES_UUID],
+                              "free_text": "",
+                              "tags": []}) == "sql"
+    assert plan_search_query({"base_uris": base_uris,
+                              "free_text": "apple"}) == "plugin"
+    assert plan_search_query({"base_uris": base_uris,
+                              "free_text": "apple",
+                              "creator_usernames": ["queen"],
+                              "uuids": [APPLES_UUID]}) == "plugin"
+    assert plan_search_query({"base_uris": base_uris,
+                              "tags": ["good"],
+                              "uploaded_by": ["grumpy"]}) == "intersect"
+
+
+def test_structured_query_answered_from_sql(
+        plugin_queries, tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    pagination = PaginationParameters(page=1, page_size=2)
+    hits = search_datasets_by_user(
+        "grumpy", {"creator_usernames": ["queen"]},
+        pagination_parameters=pagination,
+        sort_parameters=SortParameters(["-base_uri", "+name"]))
+    assert [hit["uri"] for hit in hits] == [APPLES_ON_SNOW_WHITE, ORANGES]
+    assert hits[0]["base_uri"] == "s3://snow-white"
+    assert pagination.item_count == 3
+
+    assert search_datasets_by_user(
+        "grumpy", {"uuids": [APPLES_UUID], "base_uris": ["s3://mr-men"]}
+    )[0]["uri"] == APPLES_ON_MR_MEN
+    assert search_datasets_by_user(
+        "grumpy", {"uploaded_by": ["nobody"]}) == []
+    assert plugin_queries == []
+
+    r = tmp_app_with_data_client.get(
+        "/uris",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        query_string={"creator_usernames": "queen", "sort": "-name,+uri"})
+    assert r.status_code == 200
+    hits = json.loads(r.data.decode("utf-8"))
+    assert [hit["uri"] for hit in hits] == [
+        ORANGES, APPLES_ON_MR_MEN, APPLES_ON_SNOW_WHITE]
+    # Timestamps come at full precision from the SQL database.
+    assert hits[0]["frozen_at"] == 1536238185.881941
+    assert r.headers["X-Pagination"] is not None
+    assert plugin_queries == []
+
+
+def test_mixed_query_paginated_by_plugin(plugin_queries, monkeypatch):  # NOQA
+    # Search plugins answer free text and tags along with creators and
+    # UUIDs in a single paginated call.
+    pagination = PaginationParameters(page=2, page_size=2)
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["fruit"], "creator_usernames": ["queen"]},
+        pagination_parameters=pagination,
+        sort_parameters=SortParameters(["+uri"]))
+    assert [hit["uri"] for hit in hits] == [APPLES_ON_SNOW_WHITE]
+    assert pagination.item_count == 3
+    assert plugin_queries == [{
+        "base_uris": ["s3://snow-white", "s3://mr-men"],
+        "tags": ["fruit"],
+        "creator_usernames": ["queen"]}]
+
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["evil"], "uuids": [APPLES_UUID]})
+    assert sorted(hit["uri"] for hit in hits) == [
+        APPLES_ON_MR_MEN, APPLES_ON_SNOW_WHITE]
+    assert len(plugin_queries) == 2
+
+    # The mocked Mongo database lacks text search, hence check the
+    # plugin's arguments for free text.
+    calls = []
+
+    def search(query, pagination_parameters=None, sort_parameters=None):
+        calls.append((dict(query), pagination_parameters.page,
+                      pagination_parameters.page_size))
+        return []
+
+    monkeypatch.setattr(current_app.search, "search", search)
+    search_datasets_by_user(
+        "grumpy", {"free_text": "apple", "creator_usernames": ["queen"]},
+        pagination_parameters=PaginationParameters(page=3, page_size=10))
+    assert calls == [({"base_uris": ["s3://snow-white", "s3://mr-men"],
+                       "free_text": "apple",
+                       "creator_usernames": ["queen"]}, 3, 10)]
+
+
+def test_mixed_query_pages_through_plugin_hits(
+        plugin_queries, tmp_app_with_data_client, grumpy_token):  # NOQA
+    current_app.config["SEARCH_QUERY_PLANNER_MAX_HITS"] = 2
+
+    # The three fruit datasets are fetched from the plugin in two pages.
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["fruit"], "size_in_bytes_max": 0})
+    assert [hit["uri"] for hit in hits] == [ORANGES]
+    assert plugin_queries == 2 * [{
+        "base_uris": ["s3://snow-white", "s3://mr-men"], "tags": ["fruit"]}]
+
+    # Criteria are never dropped, too many matches are an error.
+    with pytest.raises(ValidationError):
+        search_datasets_by_user(
+            "grumpy", {"tags": ["fruit"], "size_in_bytes_min": 0})
+
+    r = tmp_app_with_data_client.post(
+        "/uris",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        json={"tags": ["fruit"], "size_in_bytes_min": 0})
+    assert r.status_code == 400
+
+
+def test_summary_asks_plugin_for_tags(plugin_queries):  # NOQA
+    summary = summary_of_datasets_by_user("grumpy")
+    assert summary["datasets_per_tag"] == {"good": 1, "evil": 2, "fruit": 3}
+    assert len(plugin_queries) == 1
+
+
+def test_range_filters_answered_from_sql(
+        plugin_queries, tmp_app_with_data_client, grumpy_token):  # NOQA
+
+    assert plan_search_query({"base_uris": ["s3://snow-white"],
+                              "size_in_bytes_min": 1}) == "sql"
+    assert plan_search_query({"base_uris": ["s3://snow-white"],
+                              "free_text": "apple",
+                              "frozen_at_max": 0.0}) == "intersect"
+
+    hits = search_datasets_by_user(
+        "grumpy", {"size_in_bytes_min": 1},
+        sort_parameters=SortParameters(["+uri"]))
+    assert [hit["uri"] for hit in hits] == [
+        APPLES_ON_MR_MEN, APPLES_ON_SNOW_WHITE]
+    assert [hit["uri"] for hit in search_datasets_by_user(
+        "grumpy", {"size_in_bytes_max": 0})] == [ORANGES]
+    assert search_datasets_by_user(
+        "grumpy", {"frozen_at_min": 1536238185.881941,
+                   "frozen_at_max": 1536238185.881941,
+                   "number_of_items_min": 1,
+                   "number_of_items_max": 1,
+                   "uploaded_at_min": 0.0}) != []
+    assert search_datasets_by_user(
+        "grumpy", {"frozen_at_min": 1536238186.0}) == []
+    assert plugin_queries == []
+
+    # Free text is resolved by the plugin, the ranges in SQL.
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["fruit"], "size_in_bytes_max": 0})
+    assert [hit["uri"] for hit in hits] == [ORANGES]
+    assert plugin_queries == [{
+        "base_uris": ["s3://snow-white", "s3://mr-men"], "tags": ["fruit"]}]
+
+    r = tmp_app_with_data_client.get(
+        "/uris",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        query_string={"size_in_bytes_min": 1, "created_at_max": 1e10})
+    assert r.status_code == 200
+    assert len(json.loads(r.data.decode("utf-8"))) == 2
+
+    for query_string in [{"size_in_bytes_min": -1},
+                         {"created_at_max": 1e20},
+                         {"uploaded_at_min": -1e15},
+                         {"number_of_items_max": 2**64}]:
+        r = tmp_app_with_data_client.get(
+            "/uris",
+            headers=dict(Authorization="Bearer " + grumpy_token),
+            query_string=query_string)
+        assert r.status_code == 422
+
+
+def test_range_filters_applied_without_planner(plugin_queries):  # NOQA
+    current_app.config["SEARCH_QUERY_PLANNER"] = False
+
+    # Search plugins need not support ranges and uploaders.
+    assert plan_search_query({"base_uris": ["s3://snow-white"],
+                              "size_in_bytes_max": 0}) == "sql"
+    assert plan_search_query({"base_uris": ["s3://snow-white"],
+                              "tags": ["fruit"],
+                              "uploaded_by": ["grumpy"]}) == "intersect"
+
+    assert [hit["uri"] for hit in search_datasets_by_user(
+        "grumpy", {"size_in_bytes_max": 0})] == [ORANGES]
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["fruit"], "size_in_bytes_max": 0})
+    assert [hit["uri"] for hit in hits] == [ORANGES]
+    assert plugin_queries == [{
+        "base_uris": ["s3://snow-white", "s3://mr-men"], "tags": ["fruit"]}]
+
+
+def test_range_filters_forwarded_to_supporting_plugin(
+        plugin_queries, monkeypatch):  # NOQA
+    monkeypatch.setattr(current_app.search, "optional_query_keys",
+                        frozenset(["size_in_bytes_max"]))
+
+    assert plan_search_query({"base_uris": ["s3://snow-white"],
+                              "tags": ["fruit"],
+                              "size_in_bytes_max": 0}) == "plugin"
+    assert plan_search_query({"base_uris": ["s3://snow-white"],
+                              "tags": ["fruit"],
+                              "size_in_bytes_max": 0,
+                              "frozen_at_min": 0.0}) == "intersect"
+
+    # Supported bounds are forwarded, the others applied in SQL.
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["fruit"], "size_in_bytes_max": 0,
+                   "frozen_at_min": 0.0})
+    assert [hit["uri"] for hit in hits] == [ORANGES]
+    assert plugin_queries == [{
+        "base_uris": ["s3://snow-white", "s3://mr-men"], "tags": ["fruit"],
+        "size_in_bytes_max": 0}]
+
+
+def test_intersection_scans_limited_plugin_hits(plugin_queries):  # NOQA
+    current_app.config["SEARCH_QUERY_PLANNER_MAX_SCAN"] = 2
+
+    # The plugin reports three hits for the tag, more than may be scanned.
+    with pytest.raises(ValidationError):
+        search_datasets_by_user(
+            "grumpy", {"tags": ["fruit"], "size_in_bytes_max": 0})
+    assert len(plugin_queries) == 1
+
+    hits = search_datasets_by_user(
+        "grumpy", {"tags": ["evil"], "size_in_bytes_min": 1})
+    assert len(hits) == 2
@@ -0,0 +1,100 @@
+"""Test SQL engine options, SQLite pragmas and pool metrics."""
+
+import pytest
+
+from sqlalchemy import text
+
+from dservercore import sql_db
+from dservercore.config import Config
+from dservercore.sql_engine import (
+    MeteredQueuePool,
+    PoolMetrics,
+    _sqlite_pragmas,
+    engine_options,
+    pool_status,
+)
+
+
+CONFIG = {key: getattr(Config, key) for key in dir(Config)
+          if key.startswith(("SQLALCHEMY_POOL", "SQLALCHEMY_MAX", "SQLITE_"))}
+
+
+def test_engine_options():
+    assert engine_options(CONFIG, "sqlite:///:memory:") == {
+        "pool_pre_ping": True}
+    assert engine_options(dict(CONFIG, SQLALCHEMY_POOL_RECYCLE=3600),
+                          "postgresql://user@localhost/dserver") == {
+        "pool_pre_ping": True,
+        "pool_recycle": 3600,
+        "poolclass": MeteredQueuePool,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30.0,
+    }
+    assert engine_options({}, "sqlite:////tmp/dserver.sqlite") == {
+        "poolclass": MeteredQueuePool}
+
+
+def test_sqlite_pragmas():
+    assert _sqlite_pragmas(CONFIG) == [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA mmap_size=268435456",
+    ]
+    assert _sqlite_pragmas({}) == []
+    with pytest.raises(ValueError):
+        _sqlite_pragmas({"SQLITE_JOURNAL_MODE": "WAL; DROP TABLE user"})
+    with pytest.raises(ValueError):
+        _sqlite_pragmas({"SQLITE_SYNCHRONOUS": "sometimes"})
+
+
+def test_pool_metrics():
+    metrics = PoolMetrics()
+    for wait in [0.0005, 0.002, 0.002, 30.0]:
+        metrics.record(wait)
+    assert metrics.as_dict() == {
+        "checkouts": 4,
+        "checkout_wait_total": pytest.approx(30.0045),
+        "checkout_wait_max": 30.0,
+        "checkout_wait_buckets": {
+            "0.001": 1, "0.01": 3, "0.1": 3, "1.0": 3, "10.0": 3, "+Inf": 4},
+    }
+
+
+def test_file_database_with_pragmas_and_metered_pool(tmp_path, monkeypatch):
+    import dservercore
+
+    monkeypatch.setattr(dservercore, "search_entrypoints_iterator", [])
+    monkeypatch.setattr(dservercore, "retrieve_entrypoints_iterator", [])
+
+    app = dservercore.create_app(dict(
+        CONFIG,
+        API_TITLE="dservercore API",
+        API_VERSION="v1",
+        OPENAPI_VERSION="3.0.2",
+        SQLALCHEMY_DATABASE_URI="sqlite:///{}".format(
+            tmp_path / "dserver.sqlite"),
+        SQLALCHEMY_POOL_SIZE=2,
+        SQLALCHEMY_ENGINE_OPTIONS={"max_overflow": 1},
+    ))
+
+    with app.app_context():
+        # The built-in search plugin checks its full-text index at start.
+        checkouts = pool_status(sql_db.engine)["checkouts"]
+        connection = sql_db.session.connection()
+        assert connection.execute(
+            text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert connection.execute(
+            text("PRAGMA busy_timeout")).scalar() == 5000
+
+        status = pool_status(sql_db.engine)
+        assert status["pool"] == "MeteredQueuePool"
+        assert status["size"] == 2
+        assert status["checked_out"] == 1
+        assert status["checkouts"] == checkouts + 1
+        assert sql_db.engine.pool._max_overflow == 1
+
+        sql_db.session.remove()
+        assert pool_status(sql_db.engine)["checked_out"] == 0
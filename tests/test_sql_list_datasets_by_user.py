@@ -74,3 +74,59 @@ def test_list_datasets_by_user(tmp_app_client):  # NOQA
     expected_content = [admin_metadata_2]
     retrieved_content = [ds.as_dict() for ds in list_datasets_by_user(username_2)]
     assert retrieved_content == expected_content
+
+
+def test_list_datasets_by_user_sorted_by_size(tmp_app_client):  # NOQA
+
+    from flask_smorest.pagination import PaginationParameters
+
+    from dservercore.sort import SortParameters
+    from dservercore.utils import (
+        register_users,
+        register_base_uri,
+        register_permissions,
+        register_dataset_admin_metadata,
+        list_datasets_by_user,
+    )
+
+    base_uri = "s3://snow-white"
+    register_base_uri(base_uri)
+    register_users([{"username": "dopey"}])
+    register_permissions(base_uri, {
+        "users_with_search_permissions": ["dopey"],
+        "users_with_register_permissions": []
+    })
+
+    sizes = [(5741810, 7283), (574181, 392), (5741810, 12)]
+    for i, (size_in_bytes, number_of_items) in enumerate(sizes, start=1):
+        uuid = "{}".format(i) * 8 + "-1111-1111-1111-111111111111"
+        register_dataset_admin_metadata({
+            "base_uri": base_uri,
+            "uuid": uuid,
+            "uri": "{}/{}".format(base_uri, uuid),
+            "name": "ds_{}".format(i),
+            "creator_username": "olssont",
+            "frozen_at": 1536238185.881941,
+            "created_at": 1536236399.19497,
+            "number_of_items": number_of_items,
+            "size_in_bytes": size_in_bytes,
+            "uploaded_by": None,
+            "uploaded_at": None,
+        })
+
+    def names(sort, **kwargs):
+        return [ds.name for ds in list_datasets_by_user(
+            "dopey", sort_parameters=SortParameters(sort), **kwargs)]
+
+    # Ties are broken by id in the direction of the last sort field.
+    assert names(["-size_in_bytes"]) == ["ds_3", "ds_1", "ds_2"]
+    assert names(["+size_in_bytes"]) == ["ds_2", "ds_1", "ds_3"]
+    assert names(["+number_of_items"]) == ["ds_3", "ds_2", "ds_1"]
+    assert names(["-size_in_bytes", "+number_of_items"]) == [
+        "ds_3", "ds_1", "ds_2"]
+    assert names(["+uploaded_at"]) == ["ds_1", "ds_2", "ds_3"]
+
+    pagination_parameters = PaginationParameters(page=2, page_size=2)
+    assert names(["-size_in_bytes"],
+                 pagination_parameters=pagination_parameters) == ["ds_2"]
+    assert pagination_parameters.item_count == 3
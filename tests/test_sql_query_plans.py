@@ -0,0 +1,113 @@
+"""Test that permission-joined dataset queries use the indexes.
+
+The plans are those of SQLite, the database of the test suite.
+"""
+
+import inspect
+
+import pytest
+
+from sqlalchemy import event
+
+from dservercore import sql_db
+from dservercore.sort import SortParameters
+from dservercore.sql_models import BaseURI
+from dservercore.utils import (
+    get_dataset_by_user_and_uri,
+    get_datasets_by_user_and_uris,
+    list_datasets_by_user,
+    lookup_datasets_by_user_and_uuid,
+    lookup_datasets_by_user_and_uuids,
+    register_permissions,
+    search_datasets_by_user,
+)
+
+
+APPLES_UUID = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+APPLES = "s3://snow-white/" + APPLES_UUID
+
+
+def _query_plan(func, *args, **kwargs):
+    """Return query plan of the last SELECT statement issued by func."""
+    return _query_plans(func, *args, **kwargs)[-1]
+
+
+def _query_plans(func, *args, **kwargs):
+    """Return query plans of the SELECT statements issued by func."""
+    if sql_db.engine.dialect.name != "sqlite":
+        pytest.skip("query plans are pinned for SQLite only")
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(sql_db.engine, "before_cursor_execute", record)
+    try:
+        result = func(*args, **kwargs)
+        if inspect.isgenerator(result):
+            list(result)
+    finally:
+        event.remove(sql_db.engine, "before_cursor_execute", record)
+
+    plans = []
+    for statement, parameters in statements:
+        rows = sql_db.session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, parameters)
+        plans.append("\n".join(row[-1] for row in rows))
+    return plans
+
+
+def test_lookups_use_dataset_and_permission_indexes(tmp_app_with_data):  # NOQA
+    for plan in [
+        _query_plan(get_dataset_by_user_and_uri, "grumpy", APPLES),
+        _query_plan(get_datasets_by_user_and_uris, "grumpy", [APPLES]),
+    ]:
+        assert "ix_dataset_uri" in plan
+        assert "SCAN dataset" not in plan
+        assert "search_permissions" in plan
+
+    for plan in [
+        _query_plan(lookup_datasets_by_user_and_uuid, "grumpy", APPLES_UUID),
+        _query_plan(lookup_datasets_by_user_and_uuids, "grumpy",
+                    [APPLES_UUID]),
+    ]:
+        assert "ix_dataset_uuid" in plan
+        assert "SCAN dataset" not in plan
+
+
+def test_sorted_listing_reads_index_in_order(tmp_app_with_data):  # NOQA
+    register_permissions("s3://snow-white", {
+        "users_with_search_permissions": ["sleepy"],
+        "users_with_register_permissions": []})
+
+    plan = _query_plan(list_datasets_by_user, "sleepy",
+                       sort_parameters=SortParameters(["+uri"]))
+    assert "ix_dataset_base_uri_id_uri" in plan
+    assert "TEMP B-TREE" not in plan
+
+    for field in ["frozen_at", "size_in_bytes", "uploaded_at"]:
+        plan = _query_plan(list_datasets_by_user, "sleepy",
+                           sort_parameters=SortParameters(["-" + field]))
+        assert "ix_dataset_base_uri_id_{}_id".format(field) in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_range_filters_use_sort_indexes(tmp_app_with_data):  # NOQA
+    for field, query in [
+        ("size_in_bytes", {"size_in_bytes_max": 10}),
+        ("frozen_at", {"frozen_at_min": 1500000000}),
+    ]:
+        plans = _query_plans(search_datasets_by_user, "grumpy", query)
+        plan = next(plan for plan in plans if "dataset" in plan)
+        assert "ix_dataset_base_uri_id_{}_id".format(field) in plan
+        assert "SCAN dataset" not in plan
+
+
+def test_users_of_base_uri_use_reverse_index(tmp_app_with_data):  # NOQA
+    base_uri = BaseURI.query.filter_by(base_uri="s3://snow-white").one()
+    sql_db.session.expire(base_uri)
+
+    plan = _query_plan(lambda: base_uri.search_users)
+    assert "ix_search_permissions_base_uri_id_user_id" in plan
@@ -0,0 +1,215 @@
+"""Test the built-in SQL retrieve plugin."""
+
+import json
+
+import pytest
+
+from flask import current_app
+
+from dservercore import UnknownURIError, sql_db
+from dservercore.sql_retrieve import (
+    SQLRetrieve,
+    RetrieveDataset,
+    RetrieveManifest,
+    RetrieveManifestChunk,
+)
+from dservercore.utils import (
+    add_tags_for_uri_by_user,
+    delete_annotation_for_uri_by_user,
+    delete_dataset,
+    register_base_uri,
+    register_dataset,
+    register_permissions,
+    set_readme_for_uri_by_user,
+    uri_to_url_suffix,
+)
+
+
+UUID = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+SNOW_WHITE = "s3://snow-white/" + UUID
+MR_MEN = "s3://mr-men/" + UUID
+
+
+def _manifest(number_of_items):
+    return {
+        "dtoolcore_version": "3.18.0",
+        "hash_function": "md5sum_hexdigest",
+        "items": {
+            "{:040x}".format(i): {
+                "hash": "{:032x}".format(i),
+                "relpath": "data/file_{}.txt".format(i),
+                "size_in_bytes": i,
+                "utc_timestamp": 1536832115.0,
+            } for i in range(number_of_items)
+        },
+    }
+
+
+def _dataset_info(uri, manifest):
+    return {
+        "base_uri": uri.rsplit("/", 1)[0],
+        "type": "dataset",
+        "uuid": UUID,
+        "uri": uri,
+        "name": "bad-apples",
+        "readme": "---\ndescription: apples from queen",
+        "manifest": manifest,
+        "creator_username": "queen",
+        "frozen_at": 1536238185.881941,
+        "annotations": {"type": "fruit"},
+        "tags": ["evil", "fruit"],
+        "size_in_bytes": sum(
+            item["size_in_bytes"] for item in manifest["items"].values()),
+        "number_of_items": len(manifest["items"]),
+    }
+
+
+@pytest.fixture
+def tmp_app_with_sql_retrieve(tmp_app_with_users):
+    mongo_retrieve = tmp_app_with_users.retrieve
+    tmp_app_with_users.config["RETRIEVE_SQL_MANIFEST_CHUNK_SIZE"] = 2
+    tmp_app_with_users.retrieve = SQLRetrieve()
+    tmp_app_with_users.retrieve.init_app(tmp_app_with_users)
+    sql_db.Model.metadata.create_all(sql_db.engine)
+
+    register_base_uri("s3://mr-men")
+    register_permissions("s3://mr-men", {
+        "users_with_search_permissions": ["grumpy"],
+        "users_with_register_permissions": ["grumpy"]
+    })
+
+    yield tmp_app_with_users
+
+    # The fixture's teardown expects the Mongo retrieve plugin.
+    tmp_app_with_users.retrieve = mongo_retrieve
+
+
+def test_sql_retrieve_shares_identical_manifests(
+        tmp_app_with_sql_retrieve):  # NOQA
+
+    retrieve = current_app.retrieve
+    manifest = _manifest(5)
+
+    register_dataset(_dataset_info(SNOW_WHITE, manifest))
+    register_dataset(_dataset_info(MR_MEN, manifest))
+
+    assert RetrieveDataset.query.count() == 2
+    assert RetrieveManifest.query.count() == 1
+    assert RetrieveManifestChunk.query.count() == 3
+    stored = RetrieveManifest.query.one()
+    assert stored.encoding in ("zstd", "gzip")
+    assert stored.number_of_items == 5
+    assert stored.size_in_bytes == 10
+
+    for uri in [SNOW_WHITE, MR_MEN]:
+        assert retrieve.get_manifest(uri) == manifest
+        assert retrieve.get_readme(uri) == "---\ndescription: apples from queen"
+        assert retrieve.get_annotations(uri) == {"type": "fruit"}
+        assert retrieve.get_tags(uri) == ["evil", "fruit"]
+        assert retrieve.get_manifest_summary(uri) == {
+            "hash_function": "md5sum_hexdigest",
+            "dtoolcore_version": "3.18.0",
+            "number_of_items": 5,
+            "size_in_bytes": 10,
+        }
+
+    # A diverging manifest is stored apart.
+    register_dataset(_dataset_info(MR_MEN, _manifest(1)))
+    assert RetrieveManifest.query.count() == 2
+    assert retrieve.get_manifest(MR_MEN) == _manifest(1)
+    assert retrieve.get_manifest(SNOW_WHITE) == manifest
+
+    # Manifests no dataset refers to any more are dropped.
+    register_dataset(_dataset_info(MR_MEN, manifest))
+    assert RetrieveManifest.query.count() == 1
+    delete_dataset(SNOW_WHITE)
+    assert RetrieveManifest.query.count() == 1
+    delete_dataset(MR_MEN)
+    assert RetrieveManifest.query.count() == 0
+    assert RetrieveManifestChunk.query.count() == 0
+
+    with pytest.raises(UnknownURIError):
+        retrieve.get_manifest(MR_MEN)
+
+
+def test_sql_retrieve_manifest_range_reads(
+        tmp_app_with_sql_retrieve,
+        tmp_app_with_users_client,
+        grumpy_token):  # NOQA
+
+    manifest = _manifest(5)
+    register_dataset(_dataset_info(SNOW_WHITE, manifest))
+    items = list(manifest["items"].items())
+
+    retrieve = current_app.retrieve
+    assert retrieve.get_manifest_items(SNOW_WHITE) == manifest["items"]
+    assert retrieve.get_manifest_items(SNOW_WHITE, 1, 2) == dict(items[1:3])
+    assert retrieve.get_manifest_items(SNOW_WHITE, 4, 10) == dict(items[4:])
+    assert retrieve.get_manifest_items(SNOW_WHITE, 5) == {}
+
+    url = "/manifests/{}".format(uri_to_url_suffix(SNOW_WHITE))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_users_client.get(
+        url, headers=headers, query_string={"offset": 3, "limit": 1})
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == {"items": dict(items[3:4])}
+
+    r = tmp_app_with_users_client.get(url, headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == manifest
+
+    r = tmp_app_with_users_client.get(
+        url, headers=headers, query_string={"limit": 0})
+    assert r.status_code == 422
+
+
+def test_sql_retrieve_updates(tmp_app_with_sql_retrieve):  # NOQA
+
+    tmp_app_with_sql_retrieve.config["STORAGE_WRITE_BEHIND"] = True
+    register_dataset(_dataset_info(SNOW_WHITE, _manifest(0)))
+    register_dataset(_dataset_info(MR_MEN, _manifest(0)))
+
+    assert add_tags_for_uri_by_user(
+        "grumpy", SNOW_WHITE, ["good"]) == ["evil", "fruit", "good"]
+    assert delete_annotation_for_uri_by_user(
+        "grumpy", SNOW_WHITE, "type") == {}
+    set_readme_for_uri_by_user("grumpy", SNOW_WHITE, "---\nedited: true")
+
+    retrieve = current_app.retrieve
+    assert retrieve.get_readmes_by_uris([SNOW_WHITE, MR_MEN, "s3://x/y"]) == {
+        SNOW_WHITE: "---\nedited: true",
+        MR_MEN: "---\ndescription: apples from queen",
+    }
+    assert retrieve.get_tags_by_uris([SNOW_WHITE]) == {
+        SNOW_WHITE: ["evil", "fruit", "good"]}
+    assert retrieve.get_annotations_by_uris([SNOW_WHITE, MR_MEN]) == {
+        SNOW_WHITE: {}, MR_MEN: {"type": "fruit"}}
+
+
+def test_create_app_falls_back_to_sql_plugins(monkeypatch):  # NOQA
+    import dservercore
+    from dservercore.sql_search import SQLSearch
+
+    monkeypatch.setattr(dservercore, "search_entrypoints_iterator", [])
+    monkeypatch.setattr(dservercore, "retrieve_entrypoints_iterator", [])
+
+    app = dservercore.create_app({
+        "API_TITLE": "dservercore API",
+        "API_VERSION": "v1",
+        "OPENAPI_VERSION": "3.0.2",
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+    })
+    assert isinstance(app.search, SQLSearch)
+    assert isinstance(app.retrieve, SQLRetrieve)
+
+    with app.app_context():
+        sql_db.Model.metadata.create_all(sql_db.engine)
+        register_base_uri("s3://snow-white")
+        register_dataset(_dataset_info(SNOW_WHITE, _manifest(3)))
+
+        assert app.search.search({
+            "base_uris": ["s3://snow-white"], "free_text": "apples"
+        })[0]["uri"] == SNOW_WHITE
+        assert app.retrieve.get_manifest(SNOW_WHITE) == _manifest(3)
+        sql_db.session.remove()
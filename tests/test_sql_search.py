@@ -0,0 +1,232 @@
+"""Test the built-in SQL search plugin."""
+
+import json
+
+import pytest
+
+from flask import current_app
+from flask_smorest.pagination import PaginationParameters
+
+from dservercore import sql_db
+from dservercore.sort import SortParameters
+from dservercore.sql_search import SQLSearch, SearchDataset
+from dservercore.utils import (
+    register_dataset,
+    set_annotation_for_uri_by_user,
+    add_tags_for_uri_by_user,
+    set_readme_for_uri_by_user,
+    delete_dataset,
+    plan_search_query,
+)
+
+
+BASE_URI = "s3://snow-white"
+APPLES = BASE_URI + "/af6727bf-29c7-43dd-b42f-a5d7ede28337"
+ORANGES = BASE_URI + "/a2218059-5bd0-4690-b090-062faf08e046"
+PEARS = BASE_URI + "/3f4e2b8c-6b0d-4f5a-9d1e-7c2a9b8e1f00"
+
+
+def _dataset_info(uri, name, readme, creator, annotations, tags, frozen_at):
+    return {
+        "base_uri": BASE_URI,
+        "type": "dataset",
+        "uuid": uri.rsplit("/", 1)[1],
+        "uri": uri,
+        "name": name,
+        "readme": readme,
+        "manifest": {
+            "dtoolcore_version": "3.7.0",
+            "hash_function": "md5sum_hexdigest",
+            "items": {}
+        },
+        "creator_username": creator,
+        "frozen_at": frozen_at,
+        "annotations": annotations,
+        "tags": tags,
+        "size_in_bytes": 0,
+        "number_of_items": 0,
+    }
+
+
+@pytest.fixture
+def tmp_app_with_sql_search(tmp_app_with_users):
+    mongo_search = tmp_app_with_users.search
+    tmp_app_with_users.search = SQLSearch()
+    tmp_app_with_users.search.init_app(tmp_app_with_users)
+    sql_db.Model.metadata.create_all(sql_db.engine)
+
+    for dataset_info in [
+            _dataset_info(APPLES, "bad-apples",
+                          "---\ndescription: apples from queen", "queen",
+                          {"type": "fruit"}, ["evil", "fruit"], 1536238185.0),
+            _dataset_info(ORANGES, "oranges",
+                          "---\ndescription: oranges from queen", "queen",
+                          {"type": "fruit", "only_here": "crazystuff"},
+                          ["good", "fruit"], 1536238186.0),
+            _dataset_info(PEARS, "pears",
+                          "---\ndescription: pears from the dwarfs", "grumpy",
+                          {"type": {"kind": "fruit", "variety": "conference"}},
+                          ["good"], 1536238187.0)]:
+        register_dataset(dataset_info)
+
+    yield tmp_app_with_users
+
+    # The fixture's teardown expects the Mongo search plugin.
+    tmp_app_with_users.search = mongo_search
+
+
+def _search(query, **kwargs):
+    query = dict(query, base_uris=query.get("base_uris", [BASE_URI]))
+    return [hit["uri"] for hit in current_app.search.search(query, **kwargs)]
+
+
+def test_sql_search_uses_fts5(tmp_app_with_sql_search):  # NOQA
+    assert current_app.search._fulltext_backend() == "fts5"
+
+
+def test_sql_search_init_db_creates_missing_fts_table(tmp_app_with_sql_search):  # NOQA
+    # Tables created by migrations lack the FTS5 table and its triggers.
+    with sql_db.engine.begin() as connection:
+        for statement in [
+                "DROP TRIGGER search_dataset_ai",
+                "DROP TRIGGER search_dataset_au",
+                "DROP TABLE search_dataset_fts"]:
+            connection.exec_driver_sql(statement)
+
+    current_app.search.init_db()
+    assert _search({"free_text": "apple"}) == [APPLES]
+
+    set_readme_for_uri_by_user("grumpy", PEARS, "---\ndescription: apple")
+    assert sorted(_search({"free_text": "apple"})) == sorted([APPLES, PEARS])
+
+    # Repeated calls leave the index untouched.
+    current_app.search.init_db()
+    assert sorted(_search({"free_text": "apple"})) == sorted([APPLES, PEARS])
+
+
+def test_sql_search_applies_optional_query_keys(tmp_app_with_sql_search):  # NOQA
+    # Ranges and uploaders are applied by the plugin along with free text.
+    assert plan_search_query({"base_uris": [BASE_URI],
+                              "free_text": "queen",
+                              "frozen_at_min": 1536238186.0,
+                              "uploaded_by": ["nobody"]}) == "plugin"
+    assert _search({"free_text": "queen", "frozen_at_min": 1536238186.0}) == [
+        ORANGES]
+
+
+def test_sql_search_falls_back_to_like(tmp_app_with_sql_search):  # NOQA
+    current_app.search._fulltext_backends[sql_db.engine.url] = "like"
+
+    assert _search({"free_text": "apple"}) == [APPLES]
+    assert _search({"free_text": "CRAZY dwarfs"},
+                   sort_parameters=SortParameters(["+name"])) == [
+        ORANGES, PEARS]
+    assert _search({"free_text": "100%"}) == []
+
+
+def test_sql_search_filters(tmp_app_with_sql_search):  # NOQA
+    sort = SortParameters(["+name"])
+
+    assert _search({}, sort_parameters=sort) == [APPLES, ORANGES, PEARS]
+    assert _search({"base_uris": []}) == []
+    assert _search({"base_uris": ["s3://mr-men"]}) == []
+
+    assert _search({"creator_usernames": ["queen"]},
+                   sort_parameters=sort) == [APPLES, ORANGES]
+    assert _search({"uuids": [PEARS.rsplit("/", 1)[1]]}) == [PEARS]
+    assert _search({"tags": ["fruit"]}, sort_parameters=sort) == [
+        APPLES, ORANGES]
+    assert _search({"tags": ["good", "fruit"]}) == [ORANGES]
+    assert _search({"tags": ["good", "evil"]}) == []
+    assert _search({"uploaded_by": ["nobody"]}) == []
+
+    # Free text in name, readme and annotation keys and values, stemmed.
+    assert _search({"free_text": "apple"}) == [APPLES]
+    assert _search({"free_text": "crazystuff"}) == [ORANGES]
+    assert _search({"free_text": "conference"}) == [PEARS]
+    assert _search({"free_text": "dwarf"}) == [PEARS]
+    assert _search({"free_text": "apples pears"},
+                   sort_parameters=sort) == [APPLES, PEARS]
+    assert _search({"free_text": "fruit", "tags": ["good"]},
+                   sort_parameters=sort) == [ORANGES, PEARS]
+    assert _search({"free_text": "\"unknown"}) == []
+
+
+def test_sql_search_sort_and_pagination(tmp_app_with_sql_search):  # NOQA
+    sort = SortParameters(["-frozen_at"])
+    assert _search({"free_text": "queen dwarfs"}, sort_parameters=sort) == [
+        PEARS, ORANGES, APPLES]
+
+    pagination = PaginationParameters(page=2, page_size=2)
+    assert _search({}, sort_parameters=sort,
+                   pagination_parameters=pagination) == [APPLES]
+    assert pagination.item_count == 3
+
+    sort = SortParameters(["+creator_username", "-name"])
+    assert _search({}, sort_parameters=sort) == [PEARS, ORANGES, APPLES]
+
+
+def test_sql_search_follows_updates(
+        tmp_app_with_sql_search, tmp_app_with_users_client,
+        grumpy_token):  # NOQA
+
+    tmp_app_with_sql_search.config["STORAGE_WRITE_BEHIND"] = True
+
+    add_tags_for_uri_by_user("grumpy", APPLES, ["good"])
+    assert _search({"tags": ["good", "evil"]}) == [APPLES]
+
+    set_annotation_for_uri_by_user("grumpy", PEARS, "colour", "green")
+    assert _search({"free_text": "green"}) == [PEARS]
+
+    set_readme_for_uri_by_user("grumpy", ORANGES, "---\ndescription: lemons")
+    assert _search({"free_text": "oranges lemon"}) == [ORANGES]
+    assert _search({"free_text": "queen"}) == [APPLES]
+
+    # The search route serializes hits of the SQL search plugin.
+    r = tmp_app_with_users_client.get(
+        "/uris",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        query_string={"free_text": "green"})
+    assert r.status_code == 200
+    hits = json.loads(r.data.decode("utf-8"))
+    assert [(hit["uri"], hit["name"], hit["frozen_at"]) for hit in hits] == [
+        (PEARS, "pears", 1536238187.0)]
+
+    r = tmp_app_with_users_client.get(
+        "/me/summary",
+        headers=dict(Authorization="Bearer " + grumpy_token))
+    assert r.status_code == 200
+    summary = json.loads(r.data.decode("utf-8"))
+    assert summary["datasets_per_tag"] == {"evil": 1, "fruit": 2, "good": 3}
+
+    delete_dataset(APPLES)
+    assert _search({"free_text": "apples"}) == []
+    assert SearchDataset.query.count() == 2
+
+
+def test_sql_search_facets(tmp_app_with_sql_search):  # NOQA
+    fields = ["tags", "creator_username", "base_uri", "uploaded_by"]
+    assert current_app.search.facets(
+        {"base_uris": [BASE_URI], "free_text": "queen"}, fields) == {
+        "tags": {"evil": 1, "fruit": 2, "good": 1},
+        "creator_username": {"queen": 2},
+        "base_uri": {BASE_URI: 2},
+        "uploaded_by": {},
+    }
+    assert current_app.search.facets(
+        {"base_uris": [BASE_URI], "tags": ["good"]}, ["creator_username"]) == {
+        "creator_username": {"queen": 1, "grumpy": 1}}
+
+
+def test_sql_search_range_filters(tmp_app_with_sql_search):  # NOQA
+    sort = SortParameters(["+name"])
+
+    assert _search({"frozen_at_min": 1536238186.0},
+                   sort_parameters=sort) == [ORANGES, PEARS]
+    assert _search({"frozen_at_min": 1536238185.5,
+                    "frozen_at_max": 1536238186.5}) == [ORANGES]
+    assert _search({"free_text": "queen",
+                    "frozen_at_max": 1536238185.0}) == [APPLES]
+    assert _search({"size_in_bytes_min": 1}) == []
+    assert len(_search({"number_of_items_max": 0,
+                        "uploaded_at_min": 0.0})) == 3
@@ -0,0 +1,222 @@
+"""Test the write-behind queue of storage-side metadata updates."""
+
+import json
+import time
+
+import dtoolcore
+
+from flask import current_app
+
+from dservercore import sql_db
+from dservercore.sql_models import Dataset, StorageWrite
+from dservercore.utils import uri_to_url_suffix
+
+
+URI = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+
+
+def _local_dataset(tmp_path):
+    proto_dataset = dtoolcore.create_proto_dataset(
+        "local", tmp_path.as_uri())
+    proto_dataset.put_annotation("removed", 1)
+    proto_dataset.put_tag("old")
+    proto_dataset.freeze()
+    return proto_dataset.uri
+
+
+def test_successive_writes_are_coalesced(tmp_app_with_data):  # NOQA
+
+    queue = current_app.storage_writes
+
+    queue.enqueue(URI, "tag_delta", {"add": ["a", "b"], "remove": []})
+    queue.enqueue(URI, "tag_delta", {"add": [], "remove": ["a", "c"]})
+    queue.enqueue(URI, "annotation_delta", {"set": {"x": 1}, "delete": []})
+    queue.enqueue(URI, "annotation_delta", {"set": {}, "delete": ["y"]})
+    queue.enqueue(URI, "annotation_delta", {"set": {"y": 2}, "delete": []})
+    queue.enqueue(URI, "readme", {"readme": "first"})
+    queue.enqueue(URI, "readme", {"readme": "second"})
+
+    entries = StorageWrite.query.order_by(StorageWrite.id).all()
+    assert [(e.kind, e.payload) for e in entries] == [
+        ("tag_delta", {"add": ["b"], "remove": ["a", "c"]}),
+        ("annotation_delta", {"set": {"x": 1, "y": 2}, "delete": []}),
+        ("readme", {"readme": "second"}),
+    ]
+
+
+def test_process_due_applies_writes_in_order(
+        tmp_app_with_data, tmp_path):  # NOQA
+
+    uri = _local_dataset(tmp_path)
+    queue = current_app.storage_writes
+
+    queue.enqueue(uri, "tag_delta", {"add": ["new"], "remove": ["old"]})
+    queue.enqueue(uri, "annotation_delta",
+                  {"set": {"added": {"a": 1}}, "delete": ["removed"]})
+    queue.enqueue(uri, "readme", {"readme": "---\ndescription: updated"})
+    queue.enqueue(uri, "tags", {"tags": ["final"]})
+
+    assert queue.process_due() == 1
+    assert StorageWrite.query.count() == 0
+
+    dataset = dtoolcore.DataSet.from_uri(uri)
+    assert dataset.list_tags() == ["final"]
+    assert dataset.list_annotation_names() == ["added"]
+    assert dataset.get_annotation("added") == {"a": 1}
+    assert dataset.get_readme_content() == "---\ndescription: updated"
+
+
+def test_failed_writes_are_retried_with_backoff(tmp_app_with_data):  # NOQA
+
+    tmp_app_with_data.config["STORAGE_WRITE_MAX_ATTEMPTS"] = 2
+    tmp_app_with_data.config["STORAGE_WRITE_RETRY_BACKOFF"] = 3600
+
+    queue = current_app.storage_writes
+    calls = []
+
+    def failing_apply(uri, kind, payload):
+        calls.append(kind)
+        raise RuntimeError("storage unavailable")
+
+    original_apply = queue.apply_func
+    queue.apply_func = failing_apply
+    try:
+        queue.enqueue(URI, "readme", {"readme": "first"})
+        queue.enqueue(URI, "tags", {"tags": ["a"]})
+
+        assert queue.process_due() == 1
+        assert calls == ["readme"]
+
+        # Both entries wait for the retry, the later one must not overtake.
+        entries = StorageWrite.query.order_by(StorageWrite.id).all()
+        assert [e.status for e in entries] == ["pending", "pending"]
+        assert entries[0].attempts == 1
+        assert entries[0].last_error == "storage unavailable"
+        assert entries[1].next_attempt_at >= entries[0].next_attempt_at
+        assert queue.process_due() == 0
+
+        # Give up after the maximum number of attempts.
+        tmp_app_with_data.config["STORAGE_WRITE_RETRY_BACKOFF"] = 0
+        for entry in entries:
+            entry.next_attempt_at = entry.created_at
+        sql_db.session.commit()
+        queue.process_due()
+        entries = StorageWrite.query.order_by(StorageWrite.id).all()
+        assert [e.status for e in entries] == ["failed", "failed"]
+        assert calls == ["readme", "readme", "tags", "tags"]
+    finally:
+        queue.apply_func = original_apply
+
+
+def test_routes_enqueue_storage_writes(
+        tmp_app_with_data,
+        tmp_app_with_data_client,
+        grumpy_token,
+        snowwhite_token):  # NOQA
+
+    tmp_app_with_data.config["STORAGE_WRITE_BEHIND"] = True
+
+    url_suffix = uri_to_url_suffix(URI)
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_data_client.post(
+        "/tags/{}/veg".format(url_suffix), headers=headers)
+    assert r.status_code == 200
+    r = tmp_app_with_data_client.delete(
+        "/tags/{}/good".format(url_suffix), headers=headers)
+    assert r.status_code == 200
+    r = tmp_app_with_data_client.put(
+        "/readmes/{}".format(url_suffix),
+        headers=headers,
+        data=json.dumps({"readme": "---\ndescription: juicy"}),
+        content_type="application/json"
+    )
+    assert r.status_code == 200
+
+    entries = StorageWrite.query.order_by(StorageWrite.id).all()
+    assert [(e.kind, e.payload) for e in entries] == [
+        ("tag_delta", {"add": ["veg"], "remove": ["good"]}),
+        ("readme", {"readme": "---\ndescription: juicy"}),
+    ]
+
+    # Only admins may inspect the queue.
+    r = tmp_app_with_data_client.get("/storage-writes", headers=headers)
+    assert r.status_code == 403
+
+    admin_headers = dict(Authorization="Bearer " + snowwhite_token)
+    r = tmp_app_with_data_client.get("/storage-writes", headers=admin_headers)
+    assert r.status_code == 200
+    listed = json.loads(r.data.decode("utf-8"))
+    assert [(e["uri"], e["kind"], e["status"]) for e in listed] == [
+        (URI, "tag_delta", "pending"),
+        (URI, "readme", "pending"),
+    ]
+    assert "payload" not in listed[0]
+
+    r = tmp_app_with_data_client.get(
+        "/storage-writes?status=failed", headers=admin_headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == []
+
+
+def _wait_for_storage_writes(timeout=10):
+    """Wait until the worker threads have drained the queue."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        sql_db.session.remove()
+        if StorageWrite.query.count() == 0:
+            return
+        time.sleep(0.01)
+    raise AssertionError("storage writes not applied within timeout")
+
+
+def test_routes_write_behind_to_storage(
+        tmp_app_with_write_behind, grumpy_token):  # NOQA
+
+    client = tmp_app_with_write_behind.test_client()
+    uri = Dataset.query.one().uri
+    url_suffix = uri_to_url_suffix(uri)
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = client.post("/tags/{}/good".format(url_suffix), headers=headers)
+    assert r.status_code == 200
+    r = client.delete("/tags/{}/evil".format(url_suffix), headers=headers)
+    assert r.status_code == 200
+    r = client.put(
+        "/annotations/{}/colour".format(url_suffix),
+        headers=headers,
+        data=json.dumps({"value": "red"}),
+        content_type="application/json")
+    assert r.status_code == 200
+    r = client.put(
+        "/readmes/{}".format(url_suffix),
+        headers=headers,
+        data=json.dumps({"readme": "---\ndescription: juicy"}),
+        content_type="application/json")
+    assert r.status_code == 200
+
+    # The first request has started the workers, which drain the queue.
+    assert len(tmp_app_with_write_behind.storage_writes.workers) == 2
+    _wait_for_storage_writes()
+
+    dataset = dtoolcore.DataSet.from_uri(uri)
+    assert dataset.list_tags() == ["good"]
+    assert dataset.get_annotation("type") == "fruit"
+    assert dataset.get_annotation("colour") == "red"
+    assert dataset.get_readme_content() == "---\ndescription: juicy"
+
+    # Replacing all tags and deleting annotations is written back as well.
+    r = client.put(
+        "/tags/{}".format(url_suffix),
+        headers=headers,
+        data=json.dumps({"tags": ["fresh", "fruit"]}),
+        content_type="application/json")
+    assert r.status_code == 200
+    r = client.delete(
+        "/annotations/{}/colour".format(url_suffix), headers=headers)
+    assert r.status_code == 200
+    _wait_for_storage_writes()
+
+    dataset = dtoolcore.DataSet.from_uri(uri)
+    assert sorted(dataset.list_tags()) == ["fresh", "fruit"]
+    assert dataset.list_annotation_names() == ["type"]
@@ -0,0 +1,130 @@
+"""Test adding and removing single tags via delta operations."""
+
+import json
+
+from flask import current_app
+
+from dservercore.utils import uri_to_url_suffix
+
+
+URI = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+
+
+def test_add_and_delete_tag_routes_without_plugin_hooks(
+        tmp_app_with_data_client,
+        grumpy_token,
+        sleepy_token):  # NOQA
+
+    url = "/tags/{}".format(uri_to_url_suffix(URI))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_data_client.post(url + "/veg", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["tags"] == [
+        "good", "fruit", "veg"]
+
+    # Without any write hooks, the plugins still hold the original tags.
+    # Adding an existing tag is a no-op.
+    r = tmp_app_with_data_client.post(url + "/good", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["tags"] == ["good", "fruit"]
+
+    r = tmp_app_with_data_client.delete(url + "/good", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["tags"] == ["fruit"]
+
+    # sleepy has got no register permissions
+    r = tmp_app_with_data_client.post(
+        url + "/veg", headers=dict(Authorization="Bearer " + sleepy_token))
+    assert r.status_code == 403
+
+
+def test_add_and_delete_tag_routes_with_plugin_hooks(
+        tmp_app_with_data_client,
+        grumpy_token,
+        monkeypatch):  # NOQA
+
+    calls = []
+    stored_tags = ["good", "fruit"]
+
+    def search_add_tags(uri, tags):
+        calls.append(("search", "add_tags", uri, tags))
+
+    def search_remove_tags(uri, tags):
+        calls.append(("search", "remove_tags", uri, tags))
+
+    def retrieve_add_tags(uri, tags):
+        calls.append(("retrieve", "add_tags", uri, tags))
+        stored_tags.extend(t for t in tags if t not in stored_tags)
+        return list(stored_tags)
+
+    def retrieve_remove_tags(uri, tags):
+        calls.append(("retrieve", "remove_tags", uri, tags))
+        for tag in tags:
+            stored_tags.remove(tag)
+        return list(stored_tags)
+
+    def fail(*args):
+        raise AssertionError("Full tag list must not be read or written.")
+
+    monkeypatch.setattr(current_app.search, "add_tags",
+                        search_add_tags, raising=False)
+    monkeypatch.setattr(current_app.search, "remove_tags",
+                        search_remove_tags, raising=False)
+    monkeypatch.setattr(current_app.search, "set_tags", fail, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "add_tags",
+                        retrieve_add_tags, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "remove_tags",
+                        retrieve_remove_tags, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "set_tags", fail, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "get_tags", fail)
+
+    url = "/tags/{}".format(uri_to_url_suffix(URI))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_data_client.post(url + "/veg", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["tags"] == [
+        "good", "fruit", "veg"]
+
+    r = tmp_app_with_data_client.delete(url + "/good", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["tags"] == ["fruit", "veg"]
+
+    assert calls == [
+        ("search", "add_tags", URI, ["veg"]),
+        ("retrieve", "add_tags", URI, ["veg"]),
+        ("search", "remove_tags", URI, ["good"]),
+        ("retrieve", "remove_tags", URI, ["good"]),
+    ]
+
+
+def test_add_tag_falls_back_to_set_tags(
+        tmp_app_with_data_client,
+        grumpy_token,
+        monkeypatch):  # NOQA
+
+    written = {}
+
+    def search_set_tags(uri, tags):
+        written["search"] = tags
+
+    def retrieve_set_tags(uri, tags):
+        written["retrieve"] = tags
+
+    monkeypatch.setattr(current_app.search, "set_tags",
+                        search_set_tags, raising=False)
+    monkeypatch.setattr(current_app.retrieve, "set_tags",
+                        retrieve_set_tags, raising=False)
+
+    url = "/tags/{}".format(uri_to_url_suffix(URI))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+    r = tmp_app_with_data_client.post(url + "/veg", headers=headers)
+    assert r.status_code == 200
+    assert written == {"search": ["good", "fruit", "veg"],
+                       "retrieve": ["good", "fruit", "veg"]}
+
+    r = tmp_app_with_data_client.delete(url + "/good", headers=headers)
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8"))["tags"] == ["fruit"]
+    assert written == {"search": ["fruit"], "retrieve": ["fruit"]}
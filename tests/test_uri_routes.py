@@ -207,6 +207,54 @@ def test_get_dataset_by_uri_route(
     assert r.status_code == 404  # not found
 
 
+def test_get_dataset_by_uri_route_with_include(
+        tmp_app_with_data_client,
+        grumpy_token,
+        sleepy_token):  # NOQA
+
+    uri = "s3://snow-white/a2218059-5bd0-4690-b090-062faf08e046"
+    url = "/uris/{}".format(uri_to_url_suffix(uri))
+    headers = dict(Authorization="Bearer " + grumpy_token)
+
+    r = tmp_app_with_data_client.get(
+        url + "?include=readme,tags,annotations,manifest_summary",
+        headers=headers
+    )
+    assert r.status_code == 200
+    dataset = json.loads(r.data.decode("utf-8"))
+    assert dataset["uri"] == uri
+    assert dataset["name"] == "oranges"
+    assert dataset["readme"] == "---\ndescripton: oranges from queen"
+    assert set(dataset["tags"]) == set(["good", "fruit"])
+    assert dataset["annotations"] == {
+        "type": "fruit", "only_here": "crazystuff"}
+    assert dataset["manifest_summary"] == {
+        "dtoolcore_version": "3.7.0",
+        "hash_function": "md5sum_hexdigest",
+        "number_of_items": 0,
+        "size_in_bytes": 0,
+    }
+
+    # single expansion, other fields are omitted
+    r = tmp_app_with_data_client.get(url + "?include=tags", headers=headers)
+    assert r.status_code == 200
+    dataset = json.loads(r.data.decode("utf-8"))
+    assert set(dataset["tags"]) == set(["good", "fruit"])
+    for key in ["readme", "annotations", "manifest_summary"]:
+        assert key not in dataset
+
+    # unknown expansion
+    r = tmp_app_with_data_client.get(url + "?include=manifest", headers=headers)
+    assert r.status_code == 422
+
+    # permissions are checked before any content is retrieved
+    r = tmp_app_with_data_client.get(
+        url + "?include=readme",
+        headers=dict(Authorization="Bearer " + sleepy_token)
+    )
+    assert r.status_code == 403
+
+
 def test_put_dataset_by_uri_route(
         tmp_app_with_users_client,
         grumpy_token,
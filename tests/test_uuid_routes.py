@@ -30,4 +30,52 @@ def test_uuid_lookup_route(
         "/uuids/{}".format(uuid),
         headers=dict(Authorization="Bearer " + dopey_token)
     )
-    assert r.status_code == 401
\ No newline at end of file
+    assert r.status_code == 401
+
+
+def test_uuids_batch_lookup_route(
+        tmp_app_with_data_client,
+        grumpy_token,
+        sleepy_token,
+        dopey_token):  # NOQA
+
+    apples = "af6727bf-29c7-43dd-b42f-a5d7ede28337"
+    oranges = "a2218059-5bd0-4690-b090-062faf08e046"
+    unknown = "00000000-0000-0000-0000-000000000000"
+
+    r = tmp_app_with_data_client.post(
+        "/uuids",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        json={"uuids": [oranges, unknown, apples.upper(), apples]}
+    )
+    assert r.status_code == 200
+    assert r.is_streamed
+    datasets = json.loads(r.data.decode("utf-8"))["datasets"]
+    assert list(datasets) == [oranges, unknown, apples]
+    assert [d["uri"] for d in datasets[apples]] == [
+        "s3://mr-men/" + apples, "s3://snow-white/" + apples]
+    assert datasets[apples][0]["base_uri"] == "s3://mr-men"
+    assert len(datasets[oranges]) == 1
+    assert datasets[unknown] == []
+
+    r = tmp_app_with_data_client.post(
+        "/uuids",
+        headers=dict(Authorization="Bearer " + sleepy_token),
+        json={"uuids": [apples]}
+    )
+    assert r.status_code == 200
+    assert json.loads(r.data.decode("utf-8")) == {"datasets": {apples: []}}
+
+    r = tmp_app_with_data_client.post(
+        "/uuids",
+        headers=dict(Authorization="Bearer " + grumpy_token),
+        json={"uuids": ["not-a-uuid"]}
+    )
+    assert r.status_code == 422
+
+    r = tmp_app_with_data_client.post(
+        "/uuids",
+        headers=dict(Authorization="Bearer " + dopey_token),
+        json={"uuids": [apples]}
+    )
+    assert r.status_code == 401